@@ -0,0 +1,66 @@
+"""
+Batch inference throughput benchmark
+
+Trains a forest on a synthetic dataset, stores it in a local S3 stand-in (see LocalS3ClientClass)
+and scores a synthetic csv with BatchInferenceClass for every combination of chunk size and
+number of worker processes. Reports rows/sec (pool start and model loading included).
+
+Run from the project root:
+    python -m benchmarks.benchmark_batch_inference
+    python -m benchmarks.benchmark_batch_inference --rows 500000 --chunk-sizes 10000 50000 --workers 1 4 8
+"""
+import os
+import shutil
+import argparse
+import tempfile
+
+# everything below must use the local S3 stand-in, set before the project modules read the environment
+work_dir = tempfile.mkdtemp(prefix="batch_inference_benchmark_")
+os.environ["S3_LOCAL_ROOT"] = os.path.join(work_dir, "s3")
+os.environ["S3_BUCKET_NAME"] = "benchmark-bucket"
+os.makedirs(os.path.join(work_dir, "s3", "benchmark-bucket"))
+
+from benchmarks.benchmark_dataset_cache import write_synthetic_csv
+from model.load_data import LoaderClass
+from model.model_class import ModelClass
+from model.batch_inference import BatchInferenceClass
+from ec2_s3_managment.s3_class import S3ManagerClass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200_000, help="rows to score")
+    parser.add_argument("--features", type=int, default=20)
+    parser.add_argument("--trees", type=int, default=100)
+    parser.add_argument("--chunk-sizes", type=int, nargs="+", default=[1_000, 10_000, 50_000])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, os.cpu_count()])
+    args = parser.parse_args()
+
+    try:
+        train_path = os.path.join(work_dir, "train.csv")
+        input_path = os.path.join(work_dir, "to_score.csv")
+        output_path = os.path.join(work_dir, "predictions.csv")
+        write_synthetic_csv(train_path, 10_000, args.features)
+        write_synthetic_csv(input_path, args.rows, args.features, seed=1)
+
+        # run index of the benchmark model comes from the stand-in's manifest, like any other run
+        X_train, y_train = LoaderClass(train_path, train_path).load_dataset_chunked(train_path)
+        model_instance = ModelClass(n_estimators=args.trees)
+        model_instance.train_model(X_train, y_train)
+        s3_manager = S3ManagerClass()
+        s3_manager.upload_model_to_s3(model_instance.model)
+
+        header = f"{'chunk size':>10} {'workers':>8} {'seconds':>9} {'rows/sec':>11}"
+        print(header)
+        print("-" * len(header))
+        for chunk_size in args.chunk_sizes:
+            for max_workers in sorted(set(args.workers)):
+                batch_inference = BatchInferenceClass(s3_manager.upload_index, chunk_size=chunk_size, max_workers=max_workers, s3_manager=s3_manager)
+                stats = batch_inference.run(input_path, output_path)
+                print(f"{chunk_size:>10} {max_workers:>8} {stats['seconds']:>8.2f}s {stats['rows_per_sec']:>11.0f}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
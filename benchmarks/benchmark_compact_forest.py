@@ -0,0 +1,92 @@
+"""
+Compact forest benchmark
+
+Compares joblib pickle of RandomForestClassifier with the compact array-backed format
+(CompactForestClass) for forests of several sizes:
+    size            artifact size on disk
+    load            joblib.load vs CompactForestClass.load (memory-mapped)
+    predict 1       latency of predict_proba for a single row
+    predict batch   latency of predict_proba for --batch rows
+and checks that compact predictions are exactly equal to sklearn predictions.
+
+Run from the project root:
+    python -m benchmarks.benchmark_compact_forest
+    python -m benchmarks.benchmark_compact_forest --trees 100 500 --rows 50000 --batch 10000
+"""
+import os
+import time
+import shutil
+import argparse
+import tempfile
+
+import joblib
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+
+from model.compact_forest import CompactForestClass
+
+
+def timed(function, repeat=1):
+    # best of repeat runs
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start_time)
+    return best, result
+
+
+def benchmark_forest(work_dir, n_trees, X_train, y_train, X_batch):
+    model = RandomForestClassifier(n_estimators=n_trees, random_state=0, n_jobs=-1).fit(X_train, y_train)
+    model.set_params(n_jobs=None) # single thread prediction, same as compact forest
+    joblib_path = os.path.join(work_dir, f"model_{n_trees}.joblib")
+    compact_path = os.path.join(work_dir, f"model_{n_trees}.bin")
+    joblib.dump(model, joblib_path)
+    CompactForestClass.from_sklearn(model).save_to_path(compact_path)
+
+    results = {"trees": n_trees, "joblib_mb": os.path.getsize(joblib_path) / 1e6, "compact_mb": os.path.getsize(compact_path) / 1e6}
+    results["joblib_load"], loaded_model = timed(lambda: joblib.load(joblib_path), repeat=3)
+    results["compact_load"], compact_model = timed(lambda: CompactForestClass.load(compact_path), repeat=3)
+    results["joblib_predict_1"], _ = timed(lambda: loaded_model.predict_proba(X_batch[:1]), repeat=5)
+    results["compact_predict_1"], _ = timed(lambda: compact_model.predict_proba(X_batch[:1]), repeat=5)
+    results["joblib_predict_batch"], expected = timed(lambda: loaded_model.predict_proba(X_batch), repeat=3)
+    results["compact_predict_batch"], actual = timed(lambda: compact_model.predict_proba(X_batch), repeat=3)
+    results["exact"] = np.array_equal(expected, actual)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--trees", type=int, nargs="+", default=[10, 100, 300])
+    parser.add_argument("--rows", type=int, default=20_000, help="training rows")
+    parser.add_argument("--features", type=int, default=20)
+    parser.add_argument("--batch", type=int, default=10_000, help="rows per prediction batch")
+    args = parser.parse_args()
+
+    random_generator = np.random.default_rng(0)
+    X_train = random_generator.random((args.rows, args.features), dtype=np.float32)
+    y_train = (X_train[:, 0] + X_train[:, 1] * X_train[:, 2] + random_generator.normal(0, 0.2, args.rows) > 0.8).astype(np.int16)
+    y_train += (X_train[:, 3] > 0.7)
+    X_batch = random_generator.random((args.batch, args.features), dtype=np.float32)
+
+    work_dir = tempfile.mkdtemp(prefix="compact_forest_benchmark_")
+    try:
+        header = (
+            f"{'trees':>6} {'joblib MB':>10} {'compact MB':>11} {'joblib load':>12} {'compact load':>13} "
+            f"{'joblib 1 row':>13} {'compact 1 row':>14} {'joblib batch':>13} {'compact batch':>14} {'exact':>6}"
+        )
+        print(header)
+        print("-" * len(header))
+        for n_trees in args.trees:
+            r = benchmark_forest(work_dir, n_trees, X_train, y_train, X_batch)
+            print(
+                f"{r['trees']:>6} {r['joblib_mb']:>10.2f} {r['compact_mb']:>11.2f} {r['joblib_load'] * 1e3:>10.1f}ms {r['compact_load'] * 1e3:>11.2f}ms "
+                f"{r['joblib_predict_1'] * 1e3:>11.2f}ms {r['compact_predict_1'] * 1e3:>12.2f}ms "
+                f"{r['joblib_predict_batch'] * 1e3:>11.1f}ms {r['compact_predict_batch'] * 1e3:>12.1f}ms {str(r['exact']):>6}"
+            )
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
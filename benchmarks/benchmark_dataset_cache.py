@@ -0,0 +1,86 @@
+"""
+Dataset loading benchmark
+
+Compares, for synthetic datasets of several sizes:
+    csv parse       pd.read_csv of the whole file (LoaderClass.load_training_data)
+    chunked parse   compact float32 chunks (LoaderClass streaming mode)
+    cache build     first run with dataset cache - parse once into .npy files
+    warm cache      next runs - memory-map the cache (no parsing, no copy)
+    mmap access     warm cache + one full pass over X (pages actually read from disk)
+
+Run from the project root:
+    python -m benchmarks.benchmark_dataset_cache
+    python -m benchmarks.benchmark_dataset_cache --rows 10000 100000 --features 20
+"""
+import os
+import time
+import shutil
+import argparse
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from model.load_data import LoaderClass
+from model.dataset_cache import DatasetCacheClass
+
+
+def write_synthetic_csv(path, n_rows, n_features, n_classes=3, seed=0):
+    random_generator = np.random.default_rng(seed)
+    chunk_rows = 100_000
+    columns = [f"feature_{i}" for i in range(n_features)] + ["label"]
+    for start in range(0, n_rows, chunk_rows):
+        rows = min(chunk_rows, n_rows - start)
+        data = pd.DataFrame(random_generator.random((rows, n_features)), columns=columns[:-1])
+        data["label"] = random_generator.integers(0, n_classes, rows)
+        data.to_csv(path, mode="a" if start else "w", header=start == 0, index=False, float_format="%.6f")
+
+
+def timed(function):
+    start_time = time.perf_counter()
+    result = function()
+    return time.perf_counter() - start_time, result
+
+
+def benchmark_size(work_dir, n_rows, n_features):
+    csv_path = os.path.join(work_dir, f"dataset_{n_rows}.csv")
+    write_synthetic_csv(csv_path, n_rows, n_features)
+    loader = LoaderClass(csv_path, csv_path)
+    cache = DatasetCacheClass(os.path.join(work_dir, "cache"))
+
+    def csv_parse():
+        data = pd.read_csv(csv_path)
+        return data.iloc[:, :-1], data.iloc[:, -1]
+
+    results = {"rows": n_rows, "csv_mb": os.path.getsize(csv_path) / 1e6}
+    results["csv_parse"], _ = timed(csv_parse)
+    results["chunked_parse"], _ = timed(lambda: loader.load_dataset_chunked(csv_path))
+    results["cache_build"], _ = timed(lambda: cache.load(csv_path, loader))
+    results["warm_cache"], (X, y) = timed(lambda: cache.load(csv_path, loader))
+    results["mmap_access"], _ = timed(lambda: (cache.load(csv_path, loader)[0].sum(dtype=np.float64)))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--features", type=int, default=20)
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="dataset_cache_benchmark_")
+    try:
+        header = f"{'rows':>10} {'csv MB':>8} {'csv parse':>10} {'chunked':>10} {'cache build':>12} {'warm cache':>11} {'mmap access':>12}"
+        print(header)
+        print("-" * len(header))
+        for n_rows in args.rows:
+            r = benchmark_size(work_dir, n_rows, args.features)
+            print(
+                f"{r['rows']:>10} {r['csv_mb']:>8.1f} {r['csv_parse']:>9.3f}s {r['chunked_parse']:>9.3f}s "
+                f"{r['cache_build']:>11.3f}s {r['warm_cache']:>10.4f}s {r['mmap_access']:>11.4f}s"
+            )
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+"""
+End-to-end training pipeline benchmark
+
+Runs the stages of run_local_training_pipeline (the first six are what run_cloud_training_pipeline
+does on the EC2 instance) against the local S3 stand-in (see LocalS3ClientClass):
+    load            LoaderClass.load_training_data
+    train           ModelClass.train_model
+    evaluate        ModelClass.evaluate_model_static
+    upload_metrics  S3ManagerClass.upload_metrics_to_s3
+    upload_model    S3ManagerClass.upload_model_to_s3
+    upload_log      S3ManagerClass.upload_log_to_s3
+    download        S3ManagerClass.download_experiment_files_from_s3
+    reload          S3ManagerClass.load_model_localy
+for every combination of synthetic dataset size and tree count. Every combination runs in a fresh
+process (in its own temporary working directory), for every stage it reports wall time, peak RSS
+during the stage and bytes sent to / received from S3.
+
+Results can be saved as a baseline, later runs are compared against it and stages that got slower,
+bigger or moved more bytes than the tolerance allows are flagged (exit code 1 if anything regressed).
+
+Run from the project root:
+    python -m benchmarks.benchmark_pipeline --save-baseline
+    python -m benchmarks.benchmark_pipeline                       # compare with the saved baseline
+    python -m benchmarks.benchmark_pipeline --rows 10000 100000 --trees 10 100 --baseline my_baseline.json
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+DEFAULT_BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines", "pipeline.json")
+BUCKET_NAME = "benchmark-bucket"
+STAGES = ("load", "train", "evaluate", "upload_metrics", "upload_model", "upload_log", "download", "reload")
+
+# noise floors - differences smaller than these are never regressions
+MIN_SECONDS_DIFFERENCE = 0.05
+MIN_RSS_MB_DIFFERENCE = 10
+MIN_BYTES_DIFFERENCE = 1024
+
+
+def _counting_s3_client_class():
+    from ec2_s3_managment.local_s3_client import LocalS3ClientClass
+
+    class CountingS3ClientClass(LocalS3ClientClass):
+        """
+        Local S3 stand-in which counts object bytes sent and received
+        """
+        def __init__(self, root):
+            super().__init__(root)
+            self.bytes_sent = 0
+            self.bytes_received = 0
+
+        def get_object(self, Bucket, Key, **kwargs):
+            response = super().get_object(Bucket, Key, **kwargs)
+            self.bytes_received += response['ContentLength']
+            return response
+
+        def download_file(self, Bucket, Key, Filename, **kwargs):
+            super().download_file(Bucket, Key, Filename, **kwargs)
+            self.bytes_received += os.path.getsize(Filename)
+
+        def put_object(self, Bucket, Key, Body=b"", **kwargs):
+            self.bytes_sent += len(Body) if isinstance(Body, (bytes, bytearray, memoryview)) else 0
+            return super().put_object(Bucket, Key, Body=Body, **kwargs)
+
+        def upload_file(self, Filename, Bucket, Key, **kwargs):
+            self.bytes_sent += os.path.getsize(Filename)
+            return super().upload_file(Filename, Bucket, Key, **kwargs)
+
+        def upload_part(self, Bucket, Key, UploadId, PartNumber, Body, **kwargs):
+            self.bytes_sent += len(Body)
+            return super().upload_part(Bucket, Key, UploadId, PartNumber, Body, **kwargs)
+
+    return CountingS3ClientClass
+
+
+def run_pipeline(work_dir, n_rows, n_features, n_trees):
+    """
+    Runs all STAGES once in this process
+
+    Returns:
+        dict: stage -> {"seconds", "peak_rss_mb", "bytes_sent", "bytes_received"}
+    """
+    # project modules read .env / environment and write relative paths (log file, LocalOutput) -
+    # everything is pointed at work_dir before they are used
+    os.chdir(work_dir)
+    os.environ["S3_LOCAL_ROOT"] = os.path.join(work_dir, "s3")
+    os.environ["S3_BUCKET_NAME"] = BUCKET_NAME
+    os.makedirs(os.path.join(work_dir, "s3", BUCKET_NAME))
+
+    import logging
+    from benchmarks.benchmark_dataset_cache import write_synthetic_csv
+    from model.load_data import LoaderClass
+    from model.model_class import ModelClass
+    from ec2_s3_managment.s3_class import S3ManagerClass
+    from ec2_s3_managment.tracing import PeakRssSamplerClass, current_rss_mb
+    from ec2_s3_managment import logger_config
+
+    # upload_log stage needs the log file, only the table goes to the console
+    logger_config.configure_logging()
+    logger_config.console_handler.setLevel(logging.WARNING)
+
+    train_path, test_path = os.path.join(work_dir, "train.csv"), os.path.join(work_dir, "test.csv")
+    write_synthetic_csv(train_path, n_rows, n_features)
+    write_synthetic_csv(test_path, max(n_rows // 4, 1), n_features, seed=1)
+
+    s3_client = _counting_s3_client_class()(os.environ["S3_LOCAL_ROOT"])
+    s3_manager_instance = S3ManagerClass(s3_client=s3_client)
+    loader_instance = LoaderClass(train_path, test_path)
+    model_instance = ModelClass(n_estimators=n_trees)
+    data = {}
+
+    def load():
+        data["X_train"], data["y_train"], data["X_test"], data["y_test"] = loader_instance.load_training_data()
+
+    stage_functions = {
+        "load": load,
+        "train": lambda: model_instance.train_model(data["X_train"], data["y_train"]),
+        "evaluate": lambda: data.update(metrics=ModelClass.evaluate_model_static(model_instance.model, data["X_test"], data["y_test"])),
+        "upload_metrics": lambda: s3_manager_instance.upload_metrics_to_s3(data["metrics"]),
+        "upload_model": lambda: s3_manager_instance.upload_model_to_s3(model_instance.model),
+        "upload_log": lambda: s3_manager_instance.upload_log_to_s3(),
+        "download": lambda: s3_manager_instance.download_experiment_files_from_s3(),
+        "reload": lambda: s3_manager_instance.load_model_localy(),
+    }
+
+    results = {}
+    with PeakRssSamplerClass(interval=0.002) as rss_sampler:
+        for stage in STAGES:
+            bytes_sent, bytes_received = s3_client.bytes_sent, s3_client.bytes_received
+            rss_sampler.reset()
+            start_time = time.perf_counter()
+            stage_functions[stage]()
+            seconds = time.perf_counter() - start_time
+            results[stage] = {
+                "seconds": seconds,
+                "peak_rss_mb": max(rss_sampler.peak_mb, current_rss_mb()),
+                "bytes_sent": s3_client.bytes_sent - bytes_sent,
+                "bytes_received": s3_client.bytes_received - bytes_received,
+            }
+    return results
+
+
+def config_name(n_rows, n_features, n_trees):
+    return f"rows={n_rows},features={n_features},trees={n_trees}"
+
+
+def find_regressions(current, baseline, time_tolerance, rss_tolerance, bytes_tolerance):
+    """
+    Returns:
+        dict: stage -> list of regressed metrics, e.g. {"train": ["seconds +42%"]}
+    """
+    regressions = {}
+    checks = (
+        ("seconds", time_tolerance, MIN_SECONDS_DIFFERENCE),
+        ("peak_rss_mb", rss_tolerance, MIN_RSS_MB_DIFFERENCE),
+        ("bytes_sent", bytes_tolerance, MIN_BYTES_DIFFERENCE),
+        ("bytes_received", bytes_tolerance, MIN_BYTES_DIFFERENCE),
+    )
+    for stage, values in current.items():
+        if stage not in baseline:
+            continue
+        for metric, tolerance, min_difference in checks:
+            new_value, old_value = values[metric], baseline[stage][metric]
+            if new_value - old_value > max(old_value * tolerance, min_difference):
+                change = f"+{(new_value / old_value - 1) * 100:.0f}%" if old_value else f"+{new_value - old_value:g}"
+                regressions.setdefault(stage, []).append(f"{metric} {change}")
+    return regressions
+
+
+def print_results(name, results, regressions):
+    print(f"\n{name}")
+    header = f"{'stage':<16} {'seconds':>9} {'peak RSS MB':>12} {'sent MB':>9} {'received MB':>12}  regressions"
+    print(header)
+    print("-" * len(header))
+    for stage, values in results.items():
+        print(
+            f"{stage:<16} {values['seconds']:>9.3f} {values['peak_rss_mb']:>12.1f} {values['bytes_sent'] / 1e6:>9.3f} "
+            f"{values['bytes_received'] / 1e6:>12.3f}  {', '.join(regressions.get(stage, []))}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--features", type=int, default=20)
+    parser.add_argument("--trees", type=int, nargs="+", default=[10, 100])
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE_PATH, help="baseline file to compare with / save to")
+    parser.add_argument("--save-baseline", action="store_true", help="save results of this run as the baseline")
+    parser.add_argument("--time-tolerance", type=float, default=0.25, help="allowed relative increase of stage time")
+    parser.add_argument("--rss-tolerance", type=float, default=0.15, help="allowed relative increase of peak RSS")
+    parser.add_argument("--bytes-tolerance", type=float, default=0.01, help="allowed relative increase of bytes moved")
+    args = parser.parse_args()
+
+    baseline = {}
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as file:
+            baseline = json.load(file)["results"]
+        print(f"Comparing with baseline {args.baseline}")
+
+    project_root = os.getcwd()
+    all_results, any_regression = {}, False
+    for n_rows in args.rows:
+        for n_trees in args.trees:
+            name = config_name(n_rows, args.features, n_trees)
+            work_dir = tempfile.mkdtemp(prefix="pipeline_benchmark_")
+            try:
+                # fresh interpreter for every configuration - peak RSS of one doesn't leak into the next
+                with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+                    results = executor.submit(run_pipeline, work_dir, n_rows, args.features, n_trees).result()
+            finally:
+                os.chdir(project_root)
+                shutil.rmtree(work_dir, ignore_errors=True)
+
+            regressions = find_regressions(results, baseline.get(name, {}), args.time_tolerance, args.rss_tolerance, args.bytes_tolerance)
+            any_regression = any_regression or bool(regressions)
+            all_results[name] = results
+            print_results(name, results, regressions)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, "w") as file:
+            json.dump({
+                "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "machine": {"python": platform.python_version(), "platform": platform.platform(), "cpu_count": os.cpu_count()},
+                "results": all_results,
+            }, file, indent=4)
+        print(f"\nBaseline saved to {args.baseline}")
+    elif baseline:
+        print("\nRegressions found" if any_regression else "\nNo regressions")
+
+    sys.exit(1 if any_regression else 0)
+
+
+if __name__ == "__main__":
+    main()
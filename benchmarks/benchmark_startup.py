@@ -0,0 +1,131 @@
+"""
+Startup benchmark - import time and side effects of the entry points
+
+Every entry module is imported in a fresh interpreter (repeats times, median is reported) from an
+empty temporary working directory, for each it reports:
+    import      seconds spent importing the module
+    process     wall time of the whole interpreter run (python startup + import)
+    heavy       which of pandas, sklearn, joblib, boto3 got imported
+    files       files the import created in the working directory (log file, caches...), should be none
+Then S3ManagerClass() and Ec2ManagerClass() are constructed, with S3 requests counted on the local
+S3 stand-in (see LocalS3ClientClass) - constructors shouldn't touch AWS at all.
+
+Run from the project root:
+    python -m benchmarks.benchmark_startup
+    python -m benchmarks.benchmark_startup --repeats 10 --modules main main_cloud
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+ENTRY_MODULES = ("main", "main_cloud", "main_local", "main_inference", "timings_report", "ec2_s3_managment.s3_class")
+HEAVY_MODULES = ("pandas", "sklearn", "joblib", "boto3")
+
+IMPORT_SNIPPET = """
+import sys, time, json
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+print(json.dumps({{"seconds": seconds, "heavy": [name for name in {heavy!r} if name in sys.modules]}}))
+"""
+
+CONSTRUCT_SNIPPET = """
+import sys, time, json
+from ec2_s3_managment.local_s3_client import LocalS3ClientClass
+
+requests = []
+for name in ("get_object", "put_object", "head_object", "list_objects_v2"):
+    def counted(self, *args, _original=getattr(LocalS3ClientClass, name), _name=name, **kwargs):
+        requests.append(_name)
+        return _original(self, *args, **kwargs)
+    setattr(LocalS3ClientClass, name, counted)
+
+from ec2_s3_managment.s3_class import S3ManagerClass
+from ec2_s3_managment.ec2_class import Ec2ManagerClass
+
+start = time.perf_counter()
+s3_manager = S3ManagerClass()
+s3_seconds = time.perf_counter() - start
+s3_requests = len(requests)
+s3_manager.download_index # first path access reads the run manifest
+path_requests = len(requests) - s3_requests
+
+start = time.perf_counter()
+Ec2ManagerClass()
+ec2_seconds = time.perf_counter() - start
+print(json.dumps({
+    "s3_seconds": s3_seconds, "s3_requests": s3_requests, "path_requests": path_requests,
+    "ec2_seconds": ec2_seconds, "boto3_imported": "boto3" in sys.modules,
+}))
+"""
+
+
+def run_snippet(snippet, work_dir, env):
+    """
+    Returns:
+        tuple: (parsed json printed by the snippet, wall seconds of the interpreter run)
+    """
+    start = time.perf_counter()
+    completed = subprocess.run([sys.executable, "-c", snippet], cwd=work_dir, env=env, capture_output=True, text=True)
+    seconds = time.perf_counter() - start
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr)
+    return json.loads(completed.stdout.strip().splitlines()[-1]), seconds
+
+
+def benchmark_import(module, repeats, env):
+    import_seconds, process_seconds, created_files, heavy = [], [], set(), []
+    for _ in range(repeats):
+        work_dir = tempfile.mkdtemp(prefix="startup_benchmark_")
+        try:
+            result, seconds = run_snippet(IMPORT_SNIPPET.format(module=module, heavy=HEAVY_MODULES), work_dir, env)
+            import_seconds.append(result["seconds"])
+            process_seconds.append(seconds)
+            heavy = result["heavy"]
+            created_files.update(os.listdir(work_dir))
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    return statistics.median(import_seconds), statistics.median(process_seconds), heavy, sorted(created_files)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modules", nargs="+", default=list(ENTRY_MODULES))
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    project_root = os.getcwd()
+    env = {**os.environ, "PYTHONPATH": project_root + os.pathsep + os.environ.get("PYTHONPATH", "")}
+
+    interpreter_seconds = statistics.median(
+        run_snippet("print('{}')", tempfile.gettempdir(), env)[1] for _ in range(args.repeats)
+    )
+    print(f"python startup (no imports): {interpreter_seconds:.3f}s\n")
+
+    header = f"{'module':<28} {'import':>8} {'process':>8}  {'heavy modules':<28} files created"
+    print(header)
+    print("-" * len(header))
+    for module in args.modules:
+        import_seconds, process_seconds, heavy, created_files = benchmark_import(module, args.repeats, env)
+        print(f"{module:<28} {import_seconds:>7.3f}s {process_seconds:>7.3f}s  {', '.join(heavy) or '-':<28} {', '.join(created_files) or '-'}")
+
+    work_dir = tempfile.mkdtemp(prefix="startup_benchmark_")
+    try:
+        os.makedirs(os.path.join(work_dir, "s3", "benchmark-bucket"))
+        local_env = {**env, "S3_LOCAL_ROOT": os.path.join(work_dir, "s3"), "S3_BUCKET_NAME": "benchmark-bucket"}
+        result, _ = run_snippet(CONSTRUCT_SNIPPET, work_dir, local_env)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    print(f"\nS3ManagerClass():  {result['s3_seconds'] * 1000:.2f}ms, {result['s3_requests']} S3 requests "
+          f"({result['path_requests']} on first download path access)")
+    print(f"Ec2ManagerClass(): {result['ec2_seconds'] * 1000:.2f}ms, boto3 imported: {result['boto3_imported']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Experiment catalog - best runs and run comparisons from the catalog index (see ExperimentCatalogClass)
+
+Every query downloads only the catalog index (one small object) into the local SQLite mirror,
+no Output_N folder is opened.
+
+Run from the project root:
+    python catalog_report.py rebuild                          # catalog runs made before the catalog existed
+    python catalog_report.py rebuild --full                   # re-read every run folder
+    python catalog_report.py best                             # best run by accuracy
+    python catalog_report.py best --metric f1:2 --top 5       # macro_f1, wall_seconds, peak_rss_mb, recall:<class>...
+    python catalog_report.py compare 3 8                      # runs Output_3 .. Output_8
+"""
+import argparse
+
+from ec2_s3_managment.s3_class import S3ManagerClass
+from ec2_s3_managment.experiment_catalog import METRICS, CLASS_METRICS
+
+COLUMNS = ("accuracy", "macro_f1", "wall_seconds", "peak_rss_mb", "artifact_bytes")
+
+
+def format_value(column, value):
+    if value is None:
+        return "-"
+    if column == "artifact_bytes":
+        return f"{value / 1e6:.2f}MB"
+    if column == "peak_rss_mb":
+        return f"{value:.0f}MB"
+    if column.endswith("seconds"):
+        return f"{value:.1f}s"
+    return f"{value:.4f}"
+
+
+def metric_value(entry, metric):
+    if ":" in metric:
+        class_metric, class_label = metric.split(":", 1)
+        return entry["class_scores"].get(class_label, {}).get(class_metric)
+    return entry.get(metric)
+
+
+def print_entries(entries, extra_metric=None):
+    columns = COLUMNS + ((extra_metric,) if extra_metric and extra_metric not in COLUMNS else ())
+    header = f"{'run':<11}{'mode':<13}" + "".join(f"{column:>15}" for column in columns) + "  hyperparameters"
+    print(header)
+    print("-" * len(header))
+    for entry in entries:
+        hyperparameters = entry["hyperparameters"] or {}
+        # defaults of RandomForestClassifier are noise in a table, the ones a sweep varies are what matters
+        shown = {name: hyperparameters[name] for name in ("n_estimators", "max_depth", "min_samples_leaf", "n_workers") if name in hyperparameters}
+        print(f"{'Output_' + str(entry['run_index']):<11}{entry['training_mode']:<13}"
+              + "".join(f"{format_value(column, metric_value(entry, column)):>15}" for column in columns)
+              + f"  {shown or '-'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    rebuild_parser = commands.add_parser("rebuild", help="add runs missing from the catalog")
+    rebuild_parser.add_argument("--full", action="store_true", help="re-read all runs, not only the missing ones")
+    best_parser = commands.add_parser("best", help="best runs by a metric")
+    best_parser.add_argument("--metric", default="accuracy", help=f"{', '.join(METRICS)} or <{'|'.join(CLASS_METRICS)}>:<class>")
+    best_parser.add_argument("--top", type=int, default=1)
+    compare_parser = commands.add_parser("compare", help="runs first..last side by side")
+    compare_parser.add_argument("first", type=int)
+    compare_parser.add_argument("last", type=int)
+    args = parser.parse_args()
+
+    experiment_catalog = S3ManagerClass().experiment_catalog
+    if args.command == "rebuild":
+        added = experiment_catalog.rebuild(full=args.full)
+        print(f"cataloged {len(added)} runs: {added}" if added else "catalog is up to date")
+        return
+    if args.command == "best":
+        entries = experiment_catalog.best_runs(args.metric, args.top)
+        extra_metric = args.metric
+    else:
+        entries = experiment_catalog.compare_runs(args.first, args.last)
+        extra_metric = None
+    if not entries:
+        print("no cataloged runs, try: python catalog_report.py rebuild")
+        return
+    print_entries(entries, extra_metric)
+
+
+if __name__ == "__main__":
+    main()
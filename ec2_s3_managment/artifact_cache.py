@@ -0,0 +1,160 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import uuid
+import threading
+
+from ec2_s3_managment.ec2_s3_constants import ARTIFACT_CACHE_DIR, ARTIFACT_CACHE_MAX_BYTES
+from ec2_s3_managment.logger_config import logger
+
+
+class ArtifactCacheClass:
+    """
+    Local content addressed cache for files downloaded from S3, shared by all Output_i folders.
+
+    Every cached file is keyed by (ETag, Size) of the S3 object - list_objects_v2 already returns
+    both, so checking the cache costs no extra request. Same object downloaded again (new evaluation
+    of the same run, or identical file in another run) is linked from the cache instead of downloaded.
+
+    Cache layout:
+        <cache_dir>/objects/<key>   cached files
+        <cache_dir>/index.json      size and last access time of every entry
+
+    When total size goes over max_bytes, least recently used entries are evicted.
+    Files are hard linked into LocalOutput (copied if linking is not possible), so evicting
+    an entry never breaks an already downloaded Output_i folder.
+
+    Example usage:
+        cache = ArtifactCacheClass()
+        if not cache.materialize(obj, local_path):
+            s3_client.download_file(bucket, obj['Key'], tmp_path)
+            cache.add(obj, tmp_path)
+            cache.materialize(obj, local_path)
+    """
+    def __init__(self, cache_dir=ARTIFACT_CACHE_DIR, max_bytes=ARTIFACT_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.objects_dir = os.path.join(cache_dir, "objects")
+        self.index_path = os.path.join(cache_dir, "index.json")
+        self.max_bytes = max_bytes
+        os.makedirs(self.objects_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._index = self._load_index()
+        self.hits = 0
+        self.misses = 0
+        with self._lock:
+            self._evict() # budget may have been lowered since last run
+
+    # index
+    def _load_index(self):
+        try:
+            with open(self.index_path, "r") as file:
+                index = json.load(file)
+        except (OSError, ValueError):
+            return {}
+        # entries whose file is gone (deleted by hand) are dropped
+        return {key: entry for key, entry in index.items() if os.path.isfile(os.path.join(self.objects_dir, key))}
+
+    def _save_index(self):
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(self._index, file)
+        os.replace(tmp_path, self.index_path)
+
+    @staticmethod
+    def entry_key(obj):
+        """
+        Cache key of an S3 object (dict from list_objects_v2 / head_object with ETag and Size)
+        """
+        return hashlib.sha256(f"{obj['ETag'].strip(chr(34))}-{obj['Size']}".encode("utf-8")).hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.objects_dir, key)
+
+    def total_bytes(self):
+        return sum(entry["size"] for entry in self._index.values())
+
+    # lookup
+    def materialize(self, obj, local_path, count_access=True):
+        """
+        Puts cached copy of obj to local_path
+
+        count_access=False - used right after add(), doesn't count as hit/miss
+
+        Returns:
+            bool: True on cache hit, False if obj is not in the cache
+        """
+        key = self.entry_key(obj)
+        with self._lock:
+            entry = self._index.get(key)
+            if entry is None:
+                self.misses += count_access
+                return False
+            entry["last_access"] = time.time()
+            self.hits += count_access
+
+        entry_path = self._entry_path(key)
+        if os.path.exists(local_path):
+            if os.path.exists(entry_path) and os.path.samefile(entry_path, local_path):
+                return True # already linked by previous download
+            os.remove(local_path)
+        try:
+            os.link(entry_path, local_path)
+        except FileNotFoundError:
+            # evicted by another thread in the meantime
+            with self._lock:
+                self._index.pop(key, None)
+                self.hits -= count_access
+                self.misses += count_access
+            return False
+        except OSError:
+            shutil.copyfile(entry_path, local_path)
+        return True
+
+    def add(self, obj, downloaded_path):
+        """
+        Moves freshly downloaded file into the cache and evicts old entries if over budget
+
+        Returns:
+            bool: False if the file is bigger than the whole cache (file is left where it is)
+        """
+        key = self.entry_key(obj)
+        size = os.path.getsize(downloaded_path)
+        if size > self.max_bytes:
+            return False
+        os.replace(downloaded_path, self._entry_path(key))
+        with self._lock:
+            self._index[key] = {"size": size, "last_access": time.time(), "s3_key": obj['Key']}
+            self._evict()
+        return True
+
+    def new_download_path(self):
+        """
+        Temporary path in the cache folder (same filesystem, so add() is a rename)
+        """
+        return os.path.join(self.cache_dir, f"{uuid.uuid4().hex}.part")
+
+    def _evict(self):
+        total = self.total_bytes()
+        for key, entry in sorted(self._index.items(), key=lambda item: item[1]["last_access"]):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(self._entry_path(key))
+            except FileNotFoundError:
+                pass
+            total -= entry["size"]
+            del self._index[key]
+            logger.info(f"Artifact cache: evicted {entry['s3_key']} ({entry['size']} bytes)")
+
+    def flush(self):
+        """
+        Saves index (access times) and logs hit/miss counts
+        """
+        with self._lock:
+            self._save_index()
+        logger.info(
+            f"Artifact cache: {self.hits} hits, {self.misses} misses, "
+            f"{len(self._index)} entries, {self.total_bytes()} / {self.max_bytes} bytes"
+        )
@@ -0,0 +1,118 @@
+import os
+import time
+import threading
+
+from ec2_s3_managment.ec2_s3_constants import (
+    DOWNLOAD_MAX_WORKERS, CREDENTIALS_WAIT_TIMEOUT, CREDENTIALS_INITIAL_DELAY, CREDENTIALS_MAX_DELAY)
+from ec2_s3_managment.logger_config import logger
+
+_lock = threading.Lock()
+_environment_loaded = False
+_session = None
+_clients = {}
+
+
+def load_environment():
+    """
+    Loads .env into the environment once, on first use - variables already set in the environment win
+    """
+    global _environment_loaded
+    if not _environment_loaded:
+        from dotenv import load_dotenv
+        load_dotenv(".env")
+        _environment_loaded = True
+
+
+def get_bucket_name():
+    load_environment()
+    return os.getenv('S3_BUCKET_NAME')
+
+
+def get_local_root():
+    """
+    Returns:
+        str: root folder of the local S3 stand-in (see LocalS3ClientClass), None - real S3
+    """
+    load_environment()
+    return os.getenv('S3_LOCAL_ROOT')
+
+
+def get_client(service_name):
+    """
+    boto3 client of service_name, shared by the whole process (EC2, S3, IAM managers and S3 transfers)
+
+    All clients come from one boto3 session (credentials are resolved once) and have a connection pool
+    big enough for all download workers. boto3 clients are thread safe, sessions are not - session and
+    clients are only created under the lock. Processes forked after the first call get their own
+    session and clients, connections are never shared between processes.
+
+    Example usage:
+        s3_client = get_client('s3')
+    """
+    global _session
+    with _lock:
+        if service_name not in _clients:
+            if _session is None:
+                load_environment()
+                import boto3
+                _session = boto3.session.Session()
+            from botocore.config import Config
+            _clients[service_name] = _session.client(service_name, config=Config(max_pool_connections=DOWNLOAD_MAX_WORKERS))
+        return _clients[service_name]
+
+
+def _probe_credentials(bucket_name):
+    """
+    Returns:
+        str: None if credentials are there and the bucket is reachable, otherwise what is missing
+    """
+    import boto3
+    from botocore.exceptions import BotoCoreError, ClientError
+    # fresh session every probe - a session that found no credentials keeps a client without them
+    session = boto3.session.Session()
+    if session.get_credentials() is None:
+        return "no credentials (instance profile not available yet)"
+    try:
+        session.client('s3').head_bucket(Bucket=bucket_name)
+    except (BotoCoreError, ClientError) as e:
+        return f"bucket {bucket_name} not reachable: {e}"
+    return None
+
+
+def wait_for_credentials(timeout=CREDENTIALS_WAIT_TIMEOUT, initial_delay=CREDENTIALS_INITIAL_DELAY, max_delay=CREDENTIALS_MAX_DELAY):
+    """
+    Readiness probe of the training container - waits until S3 credentials work (instance profile
+    credentials come from the instance metadata service), probes with exponential backoff.
+    On an instance launched with its instance profile the first probe passes, nothing is waited for.
+
+    Local S3 stand-in (S3_LOCAL_ROOT) needs no credentials, returns at once.
+
+    Returns:
+        float: seconds waited
+    """
+    if get_local_root():
+        return 0.0
+    bucket_name = get_bucket_name()
+    start_time, delay = time.perf_counter(), initial_delay
+    while True:
+        problem = _probe_credentials(bucket_name)
+        waited = time.perf_counter() - start_time
+        if problem is None:
+            logger.info(f"S3 credentials ready after {waited:.1f}s")
+            return waited
+        if waited + delay > timeout:
+            raise RuntimeError(f"S3 credentials not ready after {waited:.0f}s: {problem}")
+        logger.info(f"Waiting {delay:.1f}s for S3 credentials: {problem}")
+        time.sleep(delay)
+        delay = min(delay * 2, max_delay)
+
+
+def _reset_after_fork():
+    # lock may be held by another thread of the parent at fork time, connections of the parent's pools must not be reused
+    global _lock, _session
+    _lock = threading.Lock()
+    _session = None
+    _clients.clear()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
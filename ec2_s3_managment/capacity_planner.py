@@ -0,0 +1,188 @@
+import math
+
+from ec2_s3_managment.ec2_s3_constants import (
+    INSTANCE_TYPES, TREE_FIT_SECONDS, TREE_LEAVES_PER_ROW, TREE_NODE_BYTES, PROCESS_BASE_GIB, MEMORY_HEADROOM,
+    TARGET_TRAINING_SECONDS, INSTANCE_SETUP_SECONDS, BURSTABLE_MAX_CPU_SECONDS, DOCKER_IMAGE_GIB, MIN_VOLUME_GIB,
+    USE_SPOT, CAPACITY_FALLBACK_TYPES)
+
+GIB = 1024 ** 3
+
+
+class WorkloadClass:
+    """
+    What one instance has to train - dataset shape and the forests trained on it
+
+    models - one dict per forest {"n_estimators": 100, "max_depth": None, "min_samples_leaf": 1},
+             "fitted_estimators" - trees already in the forest (incremental training), memory only
+    parallel_models - False: one forest at a time, its trees on n_jobs cores (single, incremental, distributed worker)
+                      True: whole forests on a process pool, one core each (sweep)
+
+    Estimates are rough on purpose, the planner only needs to tell t3.micro jobs from 64GB jobs:
+        cpu     per tree TREE_FIT_SECONDS * rows * log2(rows) * sqrt(features) (sqrt features tried per split)
+        memory  dataset (float64 frame + float32 copy sklearn makes) + forests being fitted
+                + per core working arrays (bootstrap indices, sample weights, sorted feature values)
+
+    Example usage:
+        workload = WorkloadClass(n_rows=2_000_000, n_features=40, n_classes=3, models=[{"n_estimators": 300}])
+        workload.memory_gib(concurrency=8), workload.wall_seconds(concurrency=8)
+    """
+    def __init__(self, n_rows, n_features, n_classes=2, models=None, parallel_models=False, dataset_bytes=None):
+        self.n_rows = max(int(n_rows), 1)
+        self.n_features = max(int(n_features), 1)
+        self.n_classes = max(int(n_classes), 2)
+        self.models = models or [{"n_estimators": 100}]
+        self.parallel_models = parallel_models
+        # csv size on disk, by default ~10 bytes per value
+        self.dataset_bytes = dataset_bytes if dataset_bytes is not None else self.n_rows * (self.n_features + 1) * 10
+
+    def tree_cpu_seconds(self):
+        return TREE_FIT_SECONDS * self.n_rows * math.log2(self.n_rows + 1) * math.sqrt(self.n_features)
+
+    def model_cpu_seconds(self, model):
+        return model.get("n_estimators", 100) * self.tree_cpu_seconds()
+
+    def cpu_seconds(self):
+        return sum(self.model_cpu_seconds(model) for model in self.models)
+
+    def tree_bytes(self, model):
+        # bootstrap sample has ~63% distinct rows, leaves are capped by min_samples_leaf and max_depth
+        leaves = TREE_LEAVES_PER_ROW * 0.632 * self.n_rows / model.get("min_samples_leaf", 1)
+        if model.get("max_depth") is not None:
+            leaves = min(leaves, 2 ** model["max_depth"])
+        return (2 * max(leaves, 1) - 1) * (TREE_NODE_BYTES + 8 * self.n_classes)
+
+    def forest_bytes(self, model):
+        return (model.get("n_estimators", 100) + model.get("fitted_estimators", 0)) * self.tree_bytes(model)
+
+    def parallelism(self):
+        """
+        Returns:
+            int: cores the workload can keep busy
+        """
+        if self.parallel_models:
+            return len(self.models)
+        return max(model.get("n_estimators", 100) for model in self.models)
+
+    def memory_gib(self, concurrency):
+        data_bytes = self.n_rows * self.n_features * (8 + 4)
+        working_bytes = self.n_rows * 24 # per core: indices, weights, feature values of one node split
+        concurrency = max(min(concurrency, self.parallelism()), 1)
+        if self.parallel_models:
+            # every process holds the biggest forest it may be fitting
+            models_bytes = concurrency * max(self.forest_bytes(model) for model in self.models)
+        else:
+            models_bytes = max(self.forest_bytes(model) for model in self.models)
+        return PROCESS_BASE_GIB + (data_bytes + models_bytes + concurrency * working_bytes) / GIB
+
+    def wall_seconds(self, concurrency):
+        concurrency = max(min(concurrency, self.parallelism()), 1)
+        wall_seconds = self.cpu_seconds() / concurrency
+        if self.parallel_models:
+            # sweep can't finish before its biggest candidate
+            wall_seconds = max(wall_seconds, max(self.model_cpu_seconds(model) for model in self.models))
+        return wall_seconds
+
+
+class CapacityPlannerClass:
+    """
+    Chooses instance type, n_jobs, volume size and spot/on-demand for a WorkloadClass, no AWS calls
+
+    1. types without enough memory for the workload (at their core count) are dropped,
+       burstable (t3) types only stay for jobs their CPU credits cover (BURSTABLE_MAX_CPU_SECONDS)
+    2. every remaining type gets estimated wall time (setup + training on min(vcpus, parallelism) cores)
+       and cost of the job (price * wall time, per second billing)
+    3. cheapest type finishing within TARGET_TRAINING_SECONDS wins - small jobs get small instances
+       (setup dominates, more cores only cost more), big jobs get the cores they need.
+       If no type makes the target, the fastest one wins
+    4. next CAPACITY_FALLBACK_TYPES - 1 types in the same order are fallbacks when AWS has no capacity
+
+    Plan:
+        {"instance_type": "c6i.2xlarge", "fallback_types": [...], "vcpus": 8, "n_jobs": 8, "volume_gib": 20,
+         "spot": True, "memory_gib": 5.2, "estimated_seconds": 1510.0, "estimated_cost": 0.14}
+    n_jobs goes to the container as N_JOBS (see environment), sweep workloads get 1 - their process pool
+    already uses every core.
+
+    Example usage:
+        planner = CapacityPlannerClass()
+        plan = planner.plan(WorkloadClass(n_rows=500_000, n_features=30, models=[{"n_estimators": 200}]))
+        for instance_type, spot in planner.launch_attempts(plan):
+            ...
+    """
+    def __init__(self, instance_types=INSTANCE_TYPES, use_spot=USE_SPOT, target_seconds=TARGET_TRAINING_SECONDS,
+                 setup_seconds=INSTANCE_SETUP_SECONDS, fallback_types=CAPACITY_FALLBACK_TYPES):
+        self.instance_types = instance_types
+        self.use_spot = use_spot
+        self.target_seconds = target_seconds
+        self.setup_seconds = setup_seconds
+        self.fallback_types = fallback_types
+
+    def evaluate(self, workload):
+        """
+        Returns:
+            list: (instance_type, wall_seconds, cost, memory_gib) of every type the workload fits on, best first
+        """
+        cpu_seconds = workload.cpu_seconds()
+        options = []
+        for instance_type, spec in self.instance_types.items():
+            if spec["burstable"] and cpu_seconds > BURSTABLE_MAX_CPU_SECONDS:
+                continue
+            memory_gib = workload.memory_gib(spec["vcpus"])
+            if memory_gib > spec["memory_gib"] * MEMORY_HEADROOM:
+                continue
+            wall_seconds = self.setup_seconds + workload.wall_seconds(spec["vcpus"])
+            options.append((instance_type, wall_seconds, spec["price"] * wall_seconds / 3600, memory_gib))
+        if not options:
+            raise ValueError(f"No instance type has memory for this workload ({workload.memory_gib(1):.1f} GiB on one core), "
+                             f"limit max_depth / min_samples_leaf or split the trees across N_WORKERS instances")
+        in_target = [option for option in options if option[1] - self.setup_seconds <= self.target_seconds]
+        if in_target:
+            # cheapest, same cost - fewer cores
+            in_target.sort(key=lambda option: (option[2], self.instance_types[option[0]]["vcpus"]))
+            rest = sorted((option for option in options if option not in in_target), key=lambda option: option[1])
+            return in_target + rest
+        return sorted(options, key=lambda option: (option[1], option[2]))
+
+    def volume_gib(self, workload):
+        # csv, dataset cache of the same size, model and logs
+        return max(MIN_VOLUME_GIB, math.ceil(DOCKER_IMAGE_GIB + 2.5 * workload.dataset_bytes / GIB))
+
+    def plan(self, workload, spot=None):
+        """
+        spot - None: USE_SPOT, False for instances that are stopped and started again (spot one-time can't be)
+        """
+        options = self.evaluate(workload)
+        instance_type, wall_seconds, cost, memory_gib = options[0]
+        vcpus = self.instance_types[instance_type]["vcpus"]
+        return {
+            "instance_type": instance_type,
+            "fallback_types": [option[0] for option in options[1:self.fallback_types]],
+            "vcpus": vcpus,
+            "n_jobs": 1 if workload.parallel_models else min(vcpus, workload.parallelism()),
+            "volume_gib": self.volume_gib(workload),
+            "spot": self.use_spot if spot is None else spot,
+            "memory_gib": round(memory_gib, 2),
+            "estimated_seconds": round(wall_seconds, 1),
+            "estimated_cost": round(cost, 4),
+        }
+
+    @staticmethod
+    def launch_attempts(plan):
+        """
+        Returns:
+            list: (instance_type, spot) in the order run_instances should try them -
+                  spot then on-demand of the chosen type, then the same for every fallback type
+        """
+        attempts = []
+        for instance_type in [plan["instance_type"]] + plan["fallback_types"]:
+            if plan["spot"]:
+                attempts.append((instance_type, True))
+            attempts.append((instance_type, False))
+        return attempts
+
+    @staticmethod
+    def environment(plan):
+        """
+        Returns:
+            dict: container environment of the plan (see build_user_data)
+        """
+        return {"N_JOBS": plan["n_jobs"]}
@@ -1,11 +1,26 @@
-import boto3
 import os
 import time
 import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from botocore.exceptions import ClientError
 
-from ec2_s3_managment.ec2_s3_constants import (KEY_DIR, INSTANCE_AMI, SECURITY_GROUP_NAME, DESCIPTION, EC2_KEY_NAME, ROLE_NAME)
-from ec2_s3_managment.user_data import user_data
+from ec2_s3_managment.ec2_s3_constants import (
+    KEY_DIR, INSTANCE_AMI, SECURITY_GROUP_NAME, DESCIPTION, EC2_KEY_NAME, ROLE_NAME,
+    IAM_PROPAGATION_INITIAL_DELAY, IAM_PROPAGATION_MAX_DELAY, IAM_PROPAGATION_MAX_RETRIES,
+    INSTANCE_RUNNING_TIMEOUT, INSTANCE_TERMINATED_TIMEOUT, POOL_SIZE, POOL_TAG)
+from ec2_s3_managment.user_data import user_data, build_user_data, build_pool_user_data
+from ec2_s3_managment.aws_session import get_client
+from ec2_s3_managment.resource_cache import ResourceCacheClass
+from ec2_s3_managment.fleet_waiter import FleetWaiterClass
+from ec2_s3_managment.capacity_planner import CapacityPlannerClass, WorkloadClass
+
+# no capacity for this type/market right now - next launch attempt (see CapacityPlannerClass.launch_attempts)
+CAPACITY_ERRORS = ("InsufficientInstanceCapacity", "InsufficientCapacity", "SpotMaxPriceTooLow",
+                   "MaxSpotInstanceCountExceeded", "Unsupported")
+# launch failed on a cached resource deleted behind our back - resource cache entry to invalidate
+# (deleted instance profile fails with InvalidParameterValue, see __stale_launch_resource)
+STALE_RESOURCE_ERRORS = {"InvalidGroup.NotFound": "security_group_id", "InvalidKeyPair.NotFound": "key_pair"}
 
 class Ec2ManagerClass:
     """
@@ -16,11 +31,62 @@ class Ec2ManagerClass:
         ec2_manager = Ec2ManagerClass()
         ec2_manager.create_key_pair()
         instance_id = ec2_manager.start_instance()
-        ec2_manager.wait_for_instance_target_status(instance_id, 'terminated')
+        ec2_manager.wait_for_termination([instance_id])  # spot interruptions are relaunched on-demand
+
+        # distributed training, n workers writing into Output_<run_index>
+        instance_ids = ec2_manager.start_training_workers(n_workers, run_index)
+        ec2_manager.wait_for_termination(instance_ids)
+
+        # warm pool - stopped pool instances are started (new ones launched) for jobs waiting in the queue
+        ec2_manager.ensure_pool(jobs_waiting=len(job_queue.unclaimed_jobs()), jobs_running=0)
+
+    Key pair, security group id and instance profile ARN are resolved once (concurrently, with
+    filtered describe calls) and cached localy (see ResourceCacheClass) - warm launches don't ask AWS.
+    A launch failing on a cached resource deleted meanwhile drops it from the cache and resolves it again.
     """
-    def __init__(self):
-        self.ec2_client = boto3.client('ec2')
-        self.iam_client = boto3.client('iam')
+    def __init__(self, resource_cache=None, ec2_client=None, iam_client=None, capacity_planner=None):
+        """
+        ec2_client, iam_client - default clients of the shared boto3 session, stubs in tests
+        capacity_planner - chooses instance type, volume and spot/on-demand of launches (see CapacityPlannerClass)
+        """
+        self.capacity_planner = capacity_planner or CapacityPlannerClass()
+        self._resource_cache = resource_cache
+        self._resource_cache_lock = threading.Lock()
+        self._key_pair_ready = False # create_key_pair already done by this manager
+        self._ec2_client = ec2_client
+        self._iam_client = iam_client
+        self._fleet_waiter = None
+        self._launches = {} # instance_id -> run arguments, to relaunch it on-demand after a spot interruption
+
+    @property
+    def resource_cache(self):
+        # cache is per region, region is only known once the client exists;
+        # created under the lock - prepare_launch_resources threads may ask for it at once
+        with self._resource_cache_lock:
+            if self._resource_cache is None:
+                self._resource_cache = ResourceCacheClass(scope=self.ec2_client.meta.region_name)
+            return self._resource_cache
+
+    @property
+    def fleet_waiter(self):
+        # one waiter per manager - it keeps launch -> running -> terminated history of every launched instance
+        if self._fleet_waiter is None:
+            self._fleet_waiter = FleetWaiterClass(self.ec2_client, on_transition=self.__print_transition)
+        return self._fleet_waiter
+
+    @staticmethod
+    def __print_transition(instance_id, old_state, new_state, record):
+        print(f"{instance_id}: {old_state or 'launched'} -> {new_state}")
+
+    # clients come from the boto3 session shared with S3ManagerClass (see get_client),
+    # they are created on first use - constructing the manager doesn't touch AWS
+    @property
+    def ec2_client(self):
+        return self._ec2_client or get_client('ec2')
+
+    @property
+    def iam_client(self):
+        return self._iam_client or get_client('iam')
     
     # key pair creation
     def __create_new_key_pair(self):
@@ -31,14 +97,15 @@ class Ec2ManagerClass:
         print("new key pair created")
 
     def __check_if_key_pair_exists(self):
-        # checking if key-pair already exist
-        all_key_pairs = self.ec2_client.describe_key_pairs()
-
-        for key_pair in all_key_pairs.get('KeyPairs', []):
-            if key_pair['KeyName'] == EC2_KEY_NAME:
-                print(f"Key pair '{EC2_KEY_NAME}' elready exists.")
-                return True
-        return False
+        # checking if key-pair already exist, only our key pair is described (not all of them)
+        try:
+            self.ec2_client.describe_key_pairs(KeyNames=[EC2_KEY_NAME])
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'InvalidKeyPair.NotFound':
+                return False
+            raise
+        print(f"Key pair '{EC2_KEY_NAME}' elready exists.")
+        return True
     
     def create_key_pair(self):
         """
@@ -50,7 +117,20 @@ class Ec2ManagerClass:
         
         This ensures you always have access to the private key material needed
         for SSH connections to EC2 instances.
+
+        If the key pair is in the resource cache and the .pem file exists, AWS is not asked at all.
+        Done once per manager - entry points call it before launching, launches only repeat it after
+        a launch found the key pair deleted.
         """
+        if self._key_pair_ready:
+            return
+        local_key_path = f"{KEY_DIR}/{EC2_KEY_NAME}.pem"
+        if not (os.path.isfile(local_key_path) and self.resource_cache.get("key_pair", lambda _: self.__check_if_key_pair_exists())):
+            self.__create_key_pair_if_needed()
+            self.resource_cache.set("key_pair", EC2_KEY_NAME)
+        self._key_pair_ready = True
+
+    def __create_key_pair_if_needed(self):
         if self.__check_if_key_pair_exists():
             #check if there is .pem with specific name localy
             local_key_path = f"{KEY_DIR}/{EC2_KEY_NAME}.pem"
@@ -65,84 +145,173 @@ class Ec2ManagerClass:
             self.__create_new_key_pair()
     
     #creating instance
-    def __run_ec2_instance(self):
+    def __run_ec2_instance(self, instance_user_data=user_data, launch_resources=None, shutdown_behavior='terminate', tags=None, capacity_plan=None):
         """
         Launch a new EC2 instance with predefined configuration settings.
         
         This method creates a new EC2 instance with specific configurations including:
-        - t2.micro instance type for cost-effective computing
+        - instance type and EBS volume size sized for the workload (see CapacityPlannerClass)
+        - spot capacity first, on-demand when spot is not available, then fallback types
         - Custom user data script for instance initialization
         - Automatic termination upon shutdown
-        - 20GB EBS volume with automatic deletion
+        - EBS volume with automatic deletion
         - Custom tagging for easy identification
         
-        After launching the instance, this method also:
-        1. Configures a security group to control network access
-        2. Ensures the instance has proper IAM role for S3 access
+        Security group (network access) and instance profile (IAM role for S3 access) are passed
+        to run_instances, so the instance boots with them - credentials are there when the container
+        starts, nothing is attached afterwards.
+
+        A just created instance profile isn't visible to EC2 for a few seconds (IAM is eventually
+        consistent), run_instances is retried with exponential backoff only in that case.
+        Cached key pair, security group or instance profile may have been deleted meanwhile - if the
+        launch fails on one of them, its cache entry is invalidated, launch resources are resolved
+        again and the launch is retried once.
+
+        Parameters:
+            instance_user_data (str): startup script, default runs the training container once
+            launch_resources (dict): result of prepare_launch_resources, resolved here if not given
+            shutdown_behavior (str): 'terminate' - one run per instance, 'stop' - pool instances
+            tags (dict): extra instance tags, e.g. {"Pool": POOL_TAG}
+            capacity_plan (dict): result of CapacityPlannerClass.plan, default - smallest instance (empty workload)
         
         Returns:
             str: The ID of the newly created EC2 instance, which can be used
                  for future operations like termination or status checks
         """
-        run_response = self.ec2_client.run_instances(
-            ImageId = INSTANCE_AMI,
-            MinCount = 1,
-            MaxCount = 1,
-            InstanceType = 't2.micro',
-            UserData=user_data,
-            KeyName = EC2_KEY_NAME,
-            InstanceInitiatedShutdownBehavior='terminate',
-            BlockDeviceMappings = [
-                {
-                    "DeviceName": "/dev/xvda",
-                    'Ebs':{
-                        'DeleteOnTermination':True,
-                        'VolumeSize':20
-                    }
-                }
-            ],
-            TagSpecifications=[
-                {
-                    'ResourceType': 'instance',
-                    'Tags': [
+        launch_resources = launch_resources or self.prepare_launch_resources()
+        capacity_plan = capacity_plan or self.capacity_planner.plan(WorkloadClass(n_rows=1, n_features=1), spot=shutdown_behavior == 'terminate')
+        for attempt in range(2):
+            try:
+                run_response = self.__run_instances_with_capacity_fallback(
+                    capacity_plan,
+                    ImageId = INSTANCE_AMI,
+                    MinCount = 1,
+                    MaxCount = 1,
+                    UserData=instance_user_data,
+                    KeyName = launch_resources["key_name"],
+                    SecurityGroupIds = [launch_resources["security_group_id"]],
+                    IamInstanceProfile = {'Arn': launch_resources["instance_profile_arn"]},
+                    InstanceInitiatedShutdownBehavior=shutdown_behavior,
+                    BlockDeviceMappings = [
+                        {
+                            "DeviceName": "/dev/xvda",
+                            'Ebs':{
+                                'DeleteOnTermination':True,
+                                'VolumeSize':capacity_plan["volume_gib"]
+                            }
+                        }
+                    ],
+                    TagSpecifications=[
                         {
-                            'Key': 'Name',
-                            'Value': 'Model-Training-Instance'
+                            'ResourceType': 'instance',
+                            'Tags': [
+                                {
+                                    'Key': 'Name',
+                                    'Value': 'Model-Training-Instance'
+                                }
+                            ] + [{'Key': key, 'Value': value} for key, value in (tags or {}).items()]
                         }
-                    ]
+                    ],
+                )
+                break
+            except ClientError as e:
+                stale_resource = self.__stale_launch_resource(e)
+                if stale_resource is None or attempt == 1:
+                    raise
+                print(f"cached {stale_resource} no longer exists in AWS ({e.response['Error']['Code']}), resolving launch resources again")
+                self.resource_cache.invalidate(stale_resource)
+                if stale_resource == "key_pair":
+                    self._key_pair_ready = False
+                launch_resources = self.prepare_launch_resources()
+        instance = run_response["Instances"][0]
+        instance_id = instance["InstanceId"]
+        self.fleet_waiter.track(instance_id)
+        self._launches[instance_id] = {"instance_user_data": instance_user_data, "launch_resources": launch_resources,
+                                       "shutdown_behavior": shutdown_behavior, "tags": tags, "capacity_plan": capacity_plan}
+        print(f"Launched EC2 {instance_id} ({instance['InstanceType']}, {'spot' if instance.get('InstanceLifecycle') == 'spot' else 'on-demand'}) "
+              f"with security group {launch_resources['security_group_id']} and instance profile '{ROLE_NAME}'")
+
+        return instance_id #important, we need this for termination, or stoping...
+    
+    def __run_instances_with_capacity_fallback(self, capacity_plan, **run_arguments):
+        """
+        Tries instance types and markets of the plan in order (see CapacityPlannerClass.launch_attempts),
+        moves to the next attempt only when AWS has no capacity for the current one
+        """
+        attempts = CapacityPlannerClass.launch_attempts(capacity_plan)
+        for attempt_index, (instance_type, spot) in enumerate(attempts):
+            market_arguments = {}
+            if spot:
+                # one-time request, interrupted instance is terminated like a finished one (see wait_for_termination)
+                market_arguments["InstanceMarketOptions"] = {
+                    "MarketType": "spot",
+                    "SpotOptions": {"SpotInstanceType": "one-time", "InstanceInterruptionBehavior": "terminate"},
                 }
-            ],
-        )
-        instance_id = run_response["Instances"][0]["InstanceId"]
+            try:
+                return self.__run_instances_with_retry(InstanceType=instance_type, **market_arguments, **run_arguments)
+            except ClientError as e:
+                if e.response['Error']['Code'] not in CAPACITY_ERRORS or attempt_index == len(attempts) - 1:
+                    raise
+                print(f"no {'spot' if spot else 'on-demand'} capacity for {instance_type} ({e.response['Error']['Code']}), trying next option")
 
-        security_group_id = self.__create_security_group()
-        self.ec2_client.modify_instance_attribute(InstanceId = instance_id, Groups=[security_group_id])
+    def __run_instances_with_retry(self, **run_arguments):
+        delay = IAM_PROPAGATION_INITIAL_DELAY
+        for attempt in range(IAM_PROPAGATION_MAX_RETRIES):
+            try:
+                return self.ec2_client.run_instances(**run_arguments)
+            except ClientError as e:
+                # profile was created seconds ago, not propagated yet
+                if not self.__is_instance_profile_error(e):
+                    raise
+                # deleted profile fails the same way, waiting won't help - caller resolves it again
+                if not self.__instance_profile_exists(run_arguments['IamInstanceProfile']['Arn']):
+                    raise
+                print(f"instance profile not visible to EC2 yet, retrying launch in {delay:.0f} seconds")
+                time.sleep(delay)
+                delay = min(delay * 2, IAM_PROPAGATION_MAX_DELAY)
+        return self.ec2_client.run_instances(**run_arguments)
 
-        self.__ensure_s3_role(instance_id)
+    @staticmethod
+    def __is_instance_profile_error(error):
+        # "Invalid IAM Instance Profile ..." - not propagated yet or deleted
+        return error.response['Error']['Code'] == 'InvalidParameterValue' and 'iam' in error.response['Error'].get('Message', '').lower()
 
-        return instance_id #important, we need this for termination, or stoping...
-    
-    def __check_if_security_group_name_exists(self):
-        response = self.ec2_client.describe_security_groups()
-        for security_group in response['SecurityGroups']:
-            if security_group['GroupName'] == SECURITY_GROUP_NAME:
-                print(f"Security group '{SECURITY_GROUP_NAME}' already exists.")
-                return True
-        return False
+    def __stale_launch_resource(self, error):
+        """
+        Returns:
+            str: resource cache name of the launch resource run_instances failed on because it doesn't exist, None for other errors
+        """
+        if self.__is_instance_profile_error(error):
+            return "instance_profile_arn"
+        return STALE_RESOURCE_ERRORS.get(error.response['Error']['Code'])
 
     def __get_group_id_by_name(self):
-        response = self.ec2_client.describe_security_groups()
+        """
+        Returns:
+            str: id of the security group named SECURITY_GROUP_NAME, None if it doesn't exist
+        """
+        # filtered on the server - one call, only our group comes back
+        response = self.ec2_client.describe_security_groups(Filters=[{"Name": "group-name", "Values": [SECURITY_GROUP_NAME]}])
         for security_group in response['SecurityGroups']:
-            if security_group['GroupName'] == SECURITY_GROUP_NAME:
-                return security_group['GroupId']
-        raise f"ERROR no security group named {SECURITY_GROUP_NAME}"
+            print(f"Security group '{SECURITY_GROUP_NAME}' already exists.")
+            return security_group['GroupId']
+        return None
+
+    def __security_group_exists(self, security_group_id):
+        try:
+            self.ec2_client.describe_security_groups(GroupIds=[security_group_id])
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'InvalidGroup.NotFound':
+                return False
+            raise
+        return True
 
 
     def __create_security_group(self):
         """
         Create or retrieve a security group for EC2 instance access control.
         
-        1. First checks if a security group with the predefined name exists
+        1. First checks if a security group with the predefined name exists (resource cache, then AWS)
         2. If it exists, returns its ID without creating a duplicate
         3. If it doesn't exist, creates a new security group with SSH access (port 22) open to all IP addresses
         
@@ -151,8 +320,12 @@ class Ec2ManagerClass:
         Returns:
             str: The ID of the security group (either existing or newly created)
         """
-        if self.__check_if_security_group_name_exists():
-            return self.__get_group_id_by_name()
+        return self.resource_cache.resolve("security_group_id", self.__find_or_create_security_group, validate=self.__security_group_exists)
+
+    def __find_or_create_security_group(self):
+        security_group_id = self.__get_group_id_by_name()
+        if security_group_id is not None:
+            return security_group_id
 
         response = self.ec2_client.create_security_group(
             GroupName = SECURITY_GROUP_NAME,
@@ -172,20 +345,16 @@ class Ec2ManagerClass:
         )
         return security_group_id
     
-    def __ensure_s3_role(self, instance_id):
+    def __create_instance_profile(self):
         """
-        Create and attach an IAM role to the EC2 instance for S3 access.
+        Create an IAM role with S3 access wrapped in an instance profile.
         
         1. Creates an IAM role with S3 full access (if it doesn't exist)
         2. Creates an instance profile (if it doesn't exist)
         3. Attaches the role to the instance profile
-        4. Associates the instance profile with the EC2 instance
-        
-        The method includes retry logic to handle potential race conditions
-        when attaching the profile to a newly created instance.
-        
-        Parameters:
-            instance_id (str): The ID of the EC2 instance to attach the role to
+
+        Returns:
+            str: ARN of the instance profile
         """
         role_name = ROLE_NAME
         trust_policy = {
@@ -197,12 +366,24 @@ class Ec2ManagerClass:
             }]
         }
         s3_policy_arn = "arn:aws:iam::aws:policy/AmazonS3FullAccess"
+        instance_profile_name = role_name
 
+        # usual case - profile with the role exists, one call
         try:
-            response = self.iam_client.get_role(RoleName=role_name)
+            instance_profile = self.iam_client.get_instance_profile(InstanceProfileName=instance_profile_name)['InstanceProfile']
+            if any(role['RoleName'] == role_name for role in instance_profile['Roles']):
+                print(f"Instance profile '{instance_profile_name}' with IAM role '{role_name}' already exists")
+                return instance_profile['Arn']
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'NoSuchEntity':
+                raise
+            instance_profile = None
+
+        try:
+            self.iam_client.get_role(RoleName=role_name)
             print(f"IAM role '{role_name}' already exists")
         except ClientError as e:
-            response = self.iam_client.create_role(
+            self.iam_client.create_role(
                 RoleName=role_name,
                 AssumeRolePolicyDocument=json.dumps(trust_policy),
                 Description="EC2 role granting full S3 access"
@@ -211,44 +392,49 @@ class Ec2ManagerClass:
             self.iam_client.attach_role_policy(RoleName=role_name, PolicyArn=s3_policy_arn)
             print(f"Attached policy {s3_policy_arn} to '{role_name}'")
 
-        # role_arn = response["Role"]["Arn"]
-        # print("Role ARN:", role_arn)
-
-        instance_profile_name = role_name
         # This is critical: EC2 cannot directly use IAM roles - it needs the role to be wrapped in an "instance profile"
+        if instance_profile is None:
+            instance_profile = self.iam_client.create_instance_profile(InstanceProfileName=instance_profile_name)['InstanceProfile']
+        self.iam_client.add_role_to_instance_profile(
+            InstanceProfileName=instance_profile_name,
+            RoleName=role_name
+        )
+        return instance_profile['Arn']
+
+    def __instance_profile_exists(self, instance_profile_arn):
         try:
-            self.iam_client.get_instance_profile(InstanceProfileName=instance_profile_name)
+            instance_profile = self.iam_client.get_instance_profile(InstanceProfileName=ROLE_NAME)['InstanceProfile']
         except ClientError as e:
-            self.iam_client.create_instance_profile(InstanceProfileName=instance_profile_name)
-            self.iam_client.add_role_to_instance_profile(
-                InstanceProfileName=instance_profile_name,
-                RoleName=role_name
-            )
+            if e.response['Error']['Code'] == 'NoSuchEntity':
+                return False
+            raise
+        return instance_profile['Arn'] == instance_profile_arn and len(instance_profile['Roles']) > 0
+
+    def __get_instance_profile_arn(self):
+        return self.resource_cache.resolve("instance_profile_arn", self.__create_instance_profile, validate=self.__instance_profile_exists)
+
+    def prepare_launch_resources(self):
+        """
+        Resolves everything an instance launch needs - key pair, security group, instance profile.
+        The three are independent, they are resolved concurrently, each from the resource cache
+        if possible (warm cache - no AWS calls at all)
+
+        Returns:
+            dict: {"key_name", "security_group_id", "instance_profile_arn"}
+        """
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            key_pair_future = executor.submit(self.create_key_pair)
+            security_group_future = executor.submit(self.__create_security_group)
+            instance_profile_future = executor.submit(self.__get_instance_profile_arn)
+            key_pair_future.result()
+            return {
+                "key_name": EC2_KEY_NAME,
+                "security_group_id": security_group_future.result(),
+                "instance_profile_arn": instance_profile_future.result(),
+            }
 
-        instance_profile = self.iam_client.get_instance_profile(InstanceProfileName=instance_profile_name)['InstanceProfile']
-        instance_profile_arn = instance_profile['Arn']
-        for _ in range(10):
-            try:
-                # Try to associate the instance profile with the EC2 instance, with retry logic
-                # This is necessary because there's often a propagation delay between:
-                #   1. When an instance is created and
-                #   2. When AWS allows IAM profiles to be attached to it
-
-                self.ec2_client.associate_iam_instance_profile(
-                    InstanceId=instance_id,
-                    IamInstanceProfile={'Arn': instance_profile_arn}
-                )
-                break
-            except ClientError as e:
-                wait_period = 30 # 30 seconds between retry attempts
-                print(f"waiting for {wait_period} seconds")
-                time.sleep(wait_period)
-        else:
-            raise RuntimeError("Failed to associate instance profile after multiple retries")
-        print(f"Associated Instance Profile '{instance_profile_name}' with EC2 {instance_id}")
-    
     #status, start, stop, delete
-    def wait_for_instance_target_status(self, instance_id, target_status):
+    def wait_for_instance_target_status(self, instance_id, target_status, timeout=None):
         """
         Wait for an EC2 instance to reach a specified status through polling.
         
@@ -260,23 +446,193 @@ class Ec2ManagerClass:
             instance_id (str): The ID of the EC2 instance to monitor
             target_status (str): The desired instance status to wait for
                                  (e.g., 'running', 'stopped', 'terminated')
+            timeout (float): seconds, default INSTANCE_TERMINATED_TIMEOUT for 'terminated', INSTANCE_RUNNING_TIMEOUT otherwise
         """
-        while True:
-            response = self.ec2_client.describe_instances(InstanceIds = [instance_id])
-            
-            status = response["Reservations"][0]['Instances'][0]["State"]["Name"]
-            if status == target_status:
-                print(f"Instance is in {target_status} state!")
-                break
-            else:
-                time.sleep(10)
+        return self.wait_for_instances([instance_id], target_status, timeout)[instance_id]
+
+    def wait_for_instances(self, instance_ids, target_status, timeout=None):
+        """
+        Waits for all instance_ids at once (see FleetWaiterClass) - one describe_instances call per poll
+        for the whole fleet, poll interval backs off while nothing changes
+
+        Raises:
+            RuntimeError: an instance ended in a state from which target_status can't be reached
+            TimeoutError: some instances didn't reach target_status in time
+
+        Returns:
+            dict: instance_id -> InstanceRecordClass (state history and latencies)
+        """
+        if timeout is None:
+            timeout = INSTANCE_TERMINATED_TIMEOUT if target_status == 'terminated' else INSTANCE_RUNNING_TIMEOUT
+        records = self.fleet_waiter.wait_for(instance_ids, target_status, timeout)
+
+        for instance_id, record in records.items():
+            if record.outcome == "reached":
+                latencies = ", ".join(f"{name} {seconds:.0f}s" for name, seconds in record.latencies().items() if seconds is not None)
+                print(f"Instance {instance_id} is in {target_status} state! {latencies}")
+        unexpected = [f"{instance_id} ({record.state})" for instance_id, record in records.items() if record.outcome == "unexpected"]
+        if unexpected:
+            raise RuntimeError(f"Instances can't reach {target_status} any more: {', '.join(unexpected)}")
+        timed_out = [f"{instance_id} ({record.state})" for instance_id, record in records.items() if record.outcome == "timeout"]
+        if timed_out:
+            raise TimeoutError(f"Instances not {target_status} after {timeout}s: {', '.join(timed_out)}")
+        return records
 
-    def start_instance(self):
+    def wait_for_termination(self, instance_ids, timeout=None):
+        """
+        Waits until the runs of instance_ids are over (instances terminate themselves when they finish).
+
+        A spot instance AWS took back is 'terminated' too, but its run didn't finish - it is told apart by
+        StateReason (Server.SpotInstanceTermination), relaunched on-demand with the same user data and
+        waited for in its place. Distributed workers retrain their slice, scoring workers skip shards already scored.
+
+        Returns:
+            list: instance ids which finished the runs, same order as instance_ids
+        """
+        instance_ids = list(instance_ids)
+        waiting = list(instance_ids)
+        while waiting:
+            records = self.wait_for_instances(waiting, 'terminated', timeout)
+            waiting = []
+            for position, instance_id in enumerate(instance_ids):
+                if instance_id not in records or not records[instance_id].spot_interrupted:
+                    continue
+                launch = self._launches.get(instance_id)
+                if launch is None:
+                    raise RuntimeError(f"Spot instance {instance_id} was interrupted and it wasn't launched by this manager, its run didn't finish")
+                print(f"spot instance {instance_id} was interrupted before its run finished, relaunching it on-demand")
+                new_instance_id = self.__run_ec2_instance(**{**launch, "capacity_plan": {**launch["capacity_plan"], "spot": False}})
+                instance_ids[position] = new_instance_id
+                waiting.append(new_instance_id)
+        return instance_ids
+
+    def start_instance(self, environment=None, capacity_plan=None):
+        """
+        environment - variables passed to the training container, e.g. {"TRAINING_MODE": "sweep"}
+        capacity_plan - instance sizing of the job (see CapacityPlannerClass), its N_JOBS goes to the container
+        """
         print("starting instance")
-        instance_id = self.__run_ec2_instance()
+        if capacity_plan is not None:
+            environment = {**CapacityPlannerClass.environment(capacity_plan), **(environment or {})}
+        instance_id = self.__run_ec2_instance(build_user_data(environment), capacity_plan=capacity_plan)
         self.wait_for_instance_target_status(instance_id, "running")
         return instance_id #important, we need this for termination, or stoping...
     
+    def start_training_workers(self, n_workers, run_index, capacity_plan=None):
+        """
+        Launches n_workers instances for distributed training (see DistributedTrainingClass)
+
+        Every worker container gets RUN_INDEX, WORKER_INDEX and NUM_WORKERS, trains its slice of
+        the forest, uploads partial model to Output_<run_index> and terminates itself.
+        capacity_plan - sizing of one worker (its slice of the forest), same for all workers
+
+        Returns:
+            list: instance ids of the workers, in worker index order
+        """
+        print(f"starting {n_workers} training workers for run {run_index}")
+        launch_resources = self.prepare_launch_resources() # same for all workers
+        instance_ids = []
+        for worker_index in range(n_workers):
+            worker_environment = {"RUN_INDEX": run_index, "WORKER_INDEX": worker_index, "NUM_WORKERS": n_workers}
+            if capacity_plan is not None:
+                worker_environment.update(CapacityPlannerClass.environment(capacity_plan))
+            instance_ids.append(self.__run_ec2_instance(build_user_data(worker_environment), launch_resources, capacity_plan=capacity_plan))
+        return instance_ids
+
+    def start_scoring_workers(self, job_prefix, n_workers, capacity_plan=None):
+        """
+        Launches n_workers instances for distributed batch scoring (see DistributedScoringClass)
+
+        Every worker container gets SCORING_JOB (job folder with plan.json) and WORKER_INDEX, scores
+        its shards, uploads their predictions to the job folder and terminates itself.
+
+        Returns:
+            list: instance ids of the workers, in worker index order
+        """
+        print(f"starting {n_workers} scoring workers for {job_prefix}")
+        launch_resources = self.prepare_launch_resources() # same for all workers
+        instance_ids = []
+        for worker_index in range(n_workers):
+            worker_environment = {"SCORING_JOB": job_prefix, "WORKER_INDEX": worker_index, "NUM_WORKERS": n_workers}
+            if capacity_plan is not None:
+                worker_environment.update(CapacityPlannerClass.environment(capacity_plan))
+            instance_ids.append(self.__run_ec2_instance(build_user_data(worker_environment), launch_resources, capacity_plan=capacity_plan))
+        return instance_ids
+
+    # warm pool
+    def describe_pool_instances(self):
+        """
+        Returns:
+            dict: instance_id -> state of all pool instances (tag Pool=POOL_TAG) which are not terminated
+        """
+        pool_states = {}
+        describe_kwargs = {"Filters": [
+            {"Name": "tag:Pool", "Values": [POOL_TAG]},
+            {"Name": "instance-state-name", "Values": ["pending", "running", "stopping", "stopped"]},
+        ]}
+        while True:
+            response = self.ec2_client.describe_instances(**describe_kwargs)
+            for reservation in response["Reservations"]:
+                for instance in reservation["Instances"]:
+                    pool_states[instance["InstanceId"]] = instance["State"]["Name"]
+            if not response.get("NextToken"):
+                return pool_states
+            describe_kwargs["NextToken"] = response["NextToken"]
+
+    @staticmethod
+    def plan_pool(pool_states, jobs_waiting, jobs_running, pool_size=POOL_SIZE):
+        """
+        Decides which pool instances to start and how many to launch, no AWS calls
+
+        Running workers not busy with a job take waiting jobs themselves, only jobs beyond them
+        need more instances - stopped ones are started first (warm: docker and image are on the disk),
+        new ones are launched only while the pool is smaller than pool_size.
+        Stopping instances can't be started until they are stopped, they are left alone.
+
+        Parameters:
+            pool_states (dict): instance_id -> state (see describe_pool_instances)
+            jobs_waiting (int): unclaimed jobs in the queue
+            jobs_running (int): claimed jobs which are not done yet
+
+        Returns:
+            tuple: (list of stopped instance ids to start, number of instances to launch)
+        """
+        active = [instance_id for instance_id, state in pool_states.items() if state in ("pending", "running")]
+        stopped = sorted(instance_id for instance_id, state in pool_states.items() if state == "stopped")
+        idle_workers = max(len(active) - jobs_running, 0)
+        wanted = min(jobs_waiting - idle_workers, pool_size - len(active))
+        if wanted <= 0:
+            return [], 0
+        to_start = stopped[:wanted]
+        n_launch = min(wanted - len(to_start), pool_size - len(pool_states))
+        return to_start, max(n_launch, 0)
+
+    def ensure_pool(self, jobs_waiting, jobs_running, pool_size=POOL_SIZE, capacity_plan=None):
+        """
+        Starts stopped pool instances / launches new ones for jobs waiting in the queue (see plan_pool).
+        Pool workers run queued jobs, after POOL_IDLE_TIMEOUT without a job they stop again.
+        Pool instances are on-demand (stopped and started again), capacity_plan spot setting is ignored.
+
+        Returns:
+            list: ids of instances started or launched
+        """
+        to_start, n_launch = self.plan_pool(self.describe_pool_instances(), jobs_waiting, jobs_running, pool_size)
+        if to_start:
+            print(f"starting {len(to_start)} stopped pool instances: {', '.join(to_start)}")
+            self.ec2_client.start_instances(InstanceIds=to_start)
+            for instance_id in to_start:
+                self.fleet_waiter.track(instance_id)
+        launched = []
+        if n_launch:
+            print(f"launching {n_launch} new pool instances")
+            launch_resources = self.prepare_launch_resources()
+            for _ in range(n_launch):
+                pool_plan = None if capacity_plan is None else {**capacity_plan, "spot": False}
+                pool_environment = None if capacity_plan is None else CapacityPlannerClass.environment(capacity_plan)
+                launched.append(self.__run_ec2_instance(build_pool_user_data(pool_environment), launch_resources, shutdown_behavior='stop',
+                                                        tags={"Pool": POOL_TAG}, capacity_plan=pool_plan))
+        return to_start + launched
+
     def stop_instance(self, instance_id):
         print("stopping instance")
         self.ec2_client.stop_instances(InstanceIds = [instance_id])
@@ -9,16 +9,116 @@ DESCIPTION = "SSH"
 
 #IAM
 ROLE_NAME = "ec2-s3-full-access"
+# run_instances with a just created instance profile is retried until IAM propagates it
+IAM_PROPAGATION_INITIAL_DELAY = 2 # seconds, doubled after every failed attempt
+IAM_PROPAGATION_MAX_DELAY = 16
+IAM_PROPAGATION_MAX_RETRIES = 6
 
 #S3 constants
 METRICS_FILENAME = "metrics"
 LOGGER_FILENAME = "logger"
 MODEL_FILENAME = "model"
+PARTIAL_MODEL_FILENAME = "partial_model" # distributed training, one per worker
+COMPACT_MODEL_FILENAME = "model_compact" # array-backed copy of the forest (see CompactForestClass), .bin
+EXPORT_COMPACT_MODEL = True # upload compact copy next to model.joblib
 
 S3_PREFIX = "Output"
 
+#run index manifest
+RUN_MANIFEST_KEY = "run_manifest.json" # bucket root, outside Output_i folders
+RUN_INDEX_MAX_RETRIES = 20 # conditional write attempts before giving up
+
+#S3 transfer
+DOWNLOAD_MAX_WORKERS = 8 # parallel downloads, also size of the shared connection pool
+LIST_PAGE_SIZE = 1000 # max keys per list_objects_v2 page (S3 maximum)
+RANGE_BLOCK_SIZE = 8 * 1024 * 1024 # bytes per ranged GET when streaming datasets from S3
+RANGE_READ_WORKERS = 8 # parallel ranged GETs, 2x as many blocks are prefetched
+UPLOAD_PART_SIZE = 8 * 1024 * 1024 # multipart upload buffer, S3 minimum part size is 5MB
+MODEL_COMPRESSION = None # joblib compress argument for uploaded model, e.g. ("zlib", 3) or ("lz4", 3)
+
 #local output
 LOCAL_OUTPUT_PATH = "LocalOutput"
 LOGGER_OUT_PATH = "logger_output"
 LOGGER_NAME = "training_logger"
+RUN_INDEX_CACHE_PATH = LOCAL_OUTPUT_PATH + "/.run_index_cache.json"
+ARTIFACT_CACHE_DIR = LOCAL_OUTPUT_PATH + "/.artifact_cache" # shared by all downloaded Output_i folders
+ARTIFACT_CACHE_MAX_BYTES = 2 * 1024 ** 3 # disk budget, least recently used files are evicted above it
+
+#tracing
+TRACE_SAMPLE_INTERVAL = 0.01 # seconds between RSS samples while a span is open
+
+#logging
+LOG_QUEUE_SIZE = 10_000 # records buffered for the logging thread, newer records are dropped when it is full
+LOG_STREAM_INTERVAL = 60 # seconds between log segment uploads to the run folder
+
+#AWS resource cache (key pair, security group, instance profile)
+RESOURCE_CACHE_PATH = LOCAL_OUTPUT_PATH + "/.aws_resource_cache.json"
+RESOURCE_CACHE_TTL = 24 * 3600 # seconds an entry is used without asking AWS, older entries are validated first
+
+#container start - S3 credentials readiness probe (see wait_for_credentials)
+CREDENTIALS_WAIT_TIMEOUT = 300 # seconds before the container gives up
+CREDENTIALS_INITIAL_DELAY = 0.5 # seconds, doubled after every failed probe
+CREDENTIALS_MAX_DELAY = 10
+
+#instance state waiting (see FleetWaiterClass)
+FLEET_POLL_MIN_INTERVAL = 2 # seconds between describe_instances calls right after a state change
+FLEET_POLL_MAX_INTERVAL = 30 # interval grows up to this while nothing changes
+FLEET_POLL_BACKOFF = 1.5 # interval multiplier after a poll without state change
+FLEET_DESCRIBE_BATCH = 200 # instance ids per describe_instances call (filter values limit)
+INSTANCE_RUNNING_TIMEOUT = 15 * 60 # seconds to wait for 'running'
+INSTANCE_TERMINATED_TIMEOUT = 12 * 3600 # seconds to wait for 'terminated' (whole training)
+INSTANCE_LATENCY_LOG = LOCAL_OUTPUT_PATH + "/instance_latencies.jsonl" # launch -> running -> terminated of every instance
+
+#warm instance pool + S3 job queue (see JobQueueClass, PoolWorkerClass)
+POOL_SIZE = 0 # pool instances kept stopped/idle between runs, 0 - one new instance per run (terminated after it)
+POOL_TAG = "model-training-pool" # value of the "Pool" tag of pool instances
+POOL_IDLE_TIMEOUT = 10 * 60 # seconds a pool worker waits for a job before its instance stops
+POOL_POLL_INTERVAL = 10 # seconds between job queue polls of an idle worker
+POOL_JOB_LEASE = 5 * 60 # seconds a claim stays valid without a heartbeat, then another worker may take the job over
+POOL_HEARTBEAT_INTERVAL = 60 # seconds between claim heartbeats of a worker running a job
+POOL_JOB_TIMEOUT = INSTANCE_TERMINATED_TIMEOUT # seconds main_pool waits for the result of its job
+JOB_QUEUE_PREFIX = "job_queue" # bucket root, outside Output_i folders
+
+#capacity planning (see CapacityPlannerClass)
+# x86 types (INSTANCE_AMI is x86_64), on-demand $/hour - only used to compare types, keep them in the same region
+INSTANCE_TYPES = {
+    "t3.micro":    {"vcpus": 2,  "memory_gib": 1,   "price": 0.0104, "burstable": True},
+    "t3.small":    {"vcpus": 2,  "memory_gib": 2,   "price": 0.0208, "burstable": True},
+    "t3.medium":   {"vcpus": 2,  "memory_gib": 4,   "price": 0.0416, "burstable": True},
+    "t3.large":    {"vcpus": 2,  "memory_gib": 8,   "price": 0.0832, "burstable": True},
+    "c6i.large":   {"vcpus": 2,  "memory_gib": 4,   "price": 0.085,  "burstable": False},
+    "c6i.xlarge":  {"vcpus": 4,  "memory_gib": 8,   "price": 0.17,   "burstable": False},
+    "c6i.2xlarge": {"vcpus": 8,  "memory_gib": 16,  "price": 0.34,   "burstable": False},
+    "c6i.4xlarge": {"vcpus": 16, "memory_gib": 32,  "price": 0.68,   "burstable": False},
+    "c6i.8xlarge": {"vcpus": 32, "memory_gib": 64,  "price": 1.36,   "burstable": False},
+    "m6i.large":   {"vcpus": 2,  "memory_gib": 8,   "price": 0.096,  "burstable": False},
+    "m6i.xlarge":  {"vcpus": 4,  "memory_gib": 16,  "price": 0.192,  "burstable": False},
+    "m6i.2xlarge": {"vcpus": 8,  "memory_gib": 32,  "price": 0.384,  "burstable": False},
+    "m6i.4xlarge": {"vcpus": 16, "memory_gib": 64,  "price": 0.768,  "burstable": False},
+    "m6i.8xlarge": {"vcpus": 32, "memory_gib": 128, "price": 1.536,  "burstable": False},
+    "r6i.large":   {"vcpus": 2,  "memory_gib": 16,  "price": 0.126,  "burstable": False},
+    "r6i.xlarge":  {"vcpus": 4,  "memory_gib": 32,  "price": 0.252,  "burstable": False},
+    "r6i.2xlarge": {"vcpus": 8,  "memory_gib": 64,  "price": 0.504,  "burstable": False},
+    "r6i.4xlarge": {"vcpus": 16, "memory_gib": 128, "price": 1.008,  "burstable": False},
+    "r6i.8xlarge": {"vcpus": 32, "memory_gib": 256, "price": 2.016,  "burstable": False},
+}
+TREE_FIT_SECONDS = 5e-8 # one core, per tree, per rows * log2(rows) * sqrt(features) (measured on c6i / sklearn 1.x)
+TREE_LEAVES_PER_ROW = 0.25 # leaves of a fully grown tree per training row (noisy labels ~0.6, clean ~0.1)
+TREE_NODE_BYTES = 64 # sklearn node struct, class counts (8 bytes per class) come on top
+PROCESS_BASE_GIB = 0.6 # python + pandas + sklearn + OS share, before any data
+MEMORY_HEADROOM = 0.8 # fraction of instance memory the estimate may use
+TARGET_TRAINING_SECONDS = 30 * 60 # more cores are bought only while training would take longer than this
+INSTANCE_SETUP_SECONDS = 3 * 60 # boot + docker install + image pull, paid on every launch
+BURSTABLE_MAX_CPU_SECONDS = 10 * 60 # t3 types only for jobs their CPU credits cover
+DOCKER_IMAGE_GIB = 4 # OS + docker + pulled training image
+MIN_VOLUME_GIB = 20
+USE_SPOT = True # spot capacity first, on-demand of the same type when spot is not available
+CAPACITY_FALLBACK_TYPES = 3 # instance types tried (spot, then on-demand each) before run_instances gives up
+
+#experiment catalog (see ExperimentCatalogClass)
+CATALOG_KEY = "experiment_catalog.json" # bucket root, one entry per completed Output_i run
+CATALOG_MIRROR_PATH = LOCAL_OUTPUT_PATH + "/experiment_catalog.sqlite" # local mirror the queries run on
+CATALOG_MAX_RETRIES = 20 # conditional write attempts before giving up
 
+#distributed batch scoring (see DistributedScoringClass)
+SCORING_PREFIX = "scoring" # bucket root, one scoring_<job id> folder per job: plan, shard results, merged predictions
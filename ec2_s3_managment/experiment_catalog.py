@@ -0,0 +1,322 @@
+import os
+import json
+import time
+import random
+import sqlite3
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from botocore.exceptions import ClientError
+
+from ec2_s3_managment.ec2_s3_constants import (
+    S3_PREFIX, METRICS_FILENAME, MODEL_FILENAME, LIST_PAGE_SIZE, DOWNLOAD_MAX_WORKERS,
+    CATALOG_KEY, CATALOG_MIRROR_PATH, CATALOG_MAX_RETRIES)
+from ec2_s3_managment.run_index import CONDITIONAL_WRITE_ERRORS
+from ec2_s3_managment.logger_config import logger
+
+# metric -> True if bigger is better, "f1:<class>", "precision:<class>", "recall:<class>" are per class (bigger is better)
+METRICS = {
+    "accuracy": True, "macro_f1": True, "weighted_f1": True,
+    "wall_seconds": False, "cpu_seconds": False, "peak_rss_mb": False, "artifact_bytes": False,
+}
+CLASS_METRICS = ("precision", "recall", "f1")
+
+
+def training_mode_of(metrics):
+    for section, training_mode in (("sweep", "sweep"), ("incremental_training", "incremental"), ("distributed_training", "distributed")):
+        if section in metrics:
+            return training_mode
+    return "single"
+
+
+def hyperparameters_of(metrics):
+    """
+    Hyperparameters recorded in metrics.json itself - runs cataloged from S3 don't have the model at hand
+    """
+    if "sweep" in metrics:
+        return metrics["sweep"].get("best_params")
+    if "incremental_training" in metrics:
+        return {"n_estimators": metrics["incremental_training"].get("n_estimators")}
+    if "distributed_training" in metrics:
+        return dict(metrics["distributed_training"])
+    return None
+
+
+def catalog_entry(run_index, metrics, artifacts, hyperparameters=None):
+    """
+    Compact catalog entry of one run, built from its metrics.json (see EvaluationEngineClass) and artifact sizes
+
+    Returns:
+        dict: {"run_index", "training_mode", "hyperparameters", "accuracy", "macro_f1", "weighted_f1",
+               "class_scores": {class: {"precision", "recall", "f1", "support"}}, "artifacts": {name: bytes},
+               "artifact_bytes", "wall_seconds", "cpu_seconds", "peak_rss_mb", "recorded_at"}
+    """
+    report = metrics.get("classification_report", {})
+    class_scores = {
+        label: {"precision": scores["precision"], "recall": scores["recall"], "f1": scores["f1-score"], "support": scores["support"]}
+        for label, scores in report.items()
+        if isinstance(scores, dict) and label not in ("macro avg", "weighted avg")
+    }
+    timings = metrics.get("timings") or {}
+    peak_rss = [span["peak_rss_mb"] for span in timings.get("spans", {}).values() if span.get("peak_rss_mb") is not None]
+    if hyperparameters is not None:
+        # only what fits in json - estimator objects, callables... are left out
+        hyperparameters = {name: value for name, value in hyperparameters.items() if isinstance(value, (int, float, str, bool, type(None)))}
+    return {
+        "run_index": run_index,
+        "training_mode": training_mode_of(metrics),
+        "hyperparameters": hyperparameters if hyperparameters is not None else hyperparameters_of(metrics),
+        "accuracy": metrics.get("accuracy"),
+        "macro_f1": report.get("macro avg", {}).get("f1-score"),
+        "weighted_f1": report.get("weighted avg", {}).get("f1-score"),
+        "class_scores": class_scores,
+        "artifacts": artifacts,
+        "artifact_bytes": sum(artifacts.values()),
+        "wall_seconds": timings.get("total_wall_seconds"),
+        "cpu_seconds": timings.get("total_cpu_seconds"),
+        "peak_rss_mb": max(peak_rss) if peak_rss else None,
+        "recorded_at": time.time(),
+    }
+
+
+class ExperimentCatalogClass:
+    """
+    Catalog of all completed Output_i runs - one small index object in the bucket root, mirrored into
+    a local SQLite database, so "best run by metric" or "compare runs 3-8" is one GET, not N folder downloads.
+
+    Index (CATALOG_KEY):
+        {"runs": {"7": {"run_index": 7, "accuracy": 0.95, "hyperparameters": {...}, "class_scores": {...}, ...}}}
+    see catalog_entry for all fields.
+
+    1. every run is recorded when its model is uploaded (see S3ManagerClass.record_in_catalog)
+    2. index updates are conditional puts (IfMatch=<etag we read>, IfNoneMatch='*' when it is created),
+       runs finishing at once don't overwrite each other's entries - the loser re-reads and retries
+    3. rebuild() adds runs which are not in the index yet (older runs, runs whose record failed) from their
+       metrics.json and one listing of the run folder, full=True re-reads all of them
+    4. queries sync the mirror first - index is downloaded once, SQLite is rewritten only when its ETag changed
+
+    Example usage:
+        catalog = ExperimentCatalogClass(s3_client, bucket_name)
+        catalog.rebuild()                                   # once, for runs made before the catalog existed
+        catalog.best_runs("accuracy", top=3)
+        catalog.best_runs("f1:2")                           # best f1-score of class 2
+        catalog.compare_runs(3, 8)
+    """
+    def __init__(self, s3_client, bucket_name, index_key=CATALOG_KEY, mirror_path=CATALOG_MIRROR_PATH):
+        self.s3_client = s3_client
+        self.bucket_name = bucket_name
+        self.index_key = index_key
+        self.mirror_path = mirror_path
+
+    # index in S3
+    def _read_index(self):
+        """
+        Returns:
+            tuple: (index dict, etag), (None, None) if the index does not exist yet
+        """
+        try:
+            response = self.s3_client.get_object(Bucket=self.bucket_name, Key=self.index_key)
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('NoSuchKey', '404'):
+                return None, None
+            raise
+        return json.loads(response['Body'].read()), response['ETag']
+
+    def _conditional_put(self, index, etag):
+        """
+        Returns:
+            str: ETag of the new index, None if somebody changed it since we read it
+        """
+        condition = {'IfMatch': etag} if etag is not None else {'IfNoneMatch': '*'}
+        try:
+            response = self.s3_client.put_object(
+                Bucket=self.bucket_name,
+                Key=self.index_key,
+                Body=json.dumps(index, separators=(",", ":")).encode('utf-8'),
+                ContentType='application/json',
+                **condition
+            )
+        except ClientError as e:
+            if e.response['Error']['Code'] in CONDITIONAL_WRITE_ERRORS + ('NoSuchKey',):
+                return None
+            raise
+        return response['ETag']
+
+    def record(self, entries):
+        """
+        Adds (or replaces) entries of runs in the index
+
+        Returns:
+            dict: the new index
+        """
+        for attempt in range(CATALOG_MAX_RETRIES):
+            index, etag = self._read_index()
+            index = index or {"runs": {}}
+            index["runs"].update({str(entry["run_index"]): entry for entry in entries})
+            if self._conditional_put(index, etag) is not None:
+                logger.info(f"Experiment catalog: recorded runs {sorted(entry['run_index'] for entry in entries)}")
+                return index
+            time.sleep(random.uniform(0, 0.05 * 2 ** min(attempt, 5)))
+        raise RuntimeError(f"Failed to update {self.index_key} after {CATALOG_MAX_RETRIES} attempts")
+
+    # runs in S3
+    def run_artifacts(self, run_index):
+        """
+        Returns:
+            dict: file name -> bytes of files in the run folder, files of subfolders are summed up per subfolder ("sweep/")
+        """
+        run_prefix = f"{S3_PREFIX}_{run_index}/"
+        artifacts = {}
+        list_kwargs = {'Bucket': self.bucket_name, 'Prefix': run_prefix, 'MaxKeys': LIST_PAGE_SIZE}
+        while True:
+            response = self.s3_client.list_objects_v2(**list_kwargs)
+            for item in response.get('Contents', []):
+                name = item['Key'][len(run_prefix):]
+                if "/" in name:
+                    name = name.split("/", 1)[0] + "/"
+                artifacts[name] = artifacts.get(name, 0) + item['Size']
+            if not response.get('IsTruncated'):
+                return artifacts
+            list_kwargs['ContinuationToken'] = response['NextContinuationToken']
+
+    def read_run(self, run_index):
+        """
+        Returns:
+            dict: catalog entry built from the run folder, None if the run is not completed (no model or no metrics)
+        """
+        artifacts = self.run_artifacts(run_index)
+        if f"{MODEL_FILENAME}.joblib" not in artifacts or f"{METRICS_FILENAME}.json" not in artifacts:
+            return None
+        response = self.s3_client.get_object(Bucket=self.bucket_name, Key=f"{S3_PREFIX}_{run_index}/{METRICS_FILENAME}.json")
+        return catalog_entry(run_index, json.loads(response['Body'].read()), artifacts)
+
+    def list_run_indexes(self):
+        """
+        Returns:
+            list: indexes of all Output_i folders in the bucket (root listing, all pages)
+        """
+        run_indexes, prefix_length = [], len(S3_PREFIX) + 1
+        list_kwargs = {'Bucket': self.bucket_name, 'Delimiter': '/', 'MaxKeys': LIST_PAGE_SIZE}
+        while True:
+            response = self.s3_client.list_objects_v2(**list_kwargs)
+            for prefix in response.get('CommonPrefixes', []):
+                folder_name = prefix['Prefix'][:-1]
+                if folder_name.startswith(S3_PREFIX + "_") and folder_name[prefix_length:].isdigit():
+                    run_indexes.append(int(folder_name[prefix_length:]))
+            if not response.get('IsTruncated'):
+                return sorted(run_indexes)
+            list_kwargs['ContinuationToken'] = response['NextContinuationToken']
+
+    def rebuild(self, full=False, max_workers=DOWNLOAD_MAX_WORKERS):
+        """
+        Catalogs runs missing from the index (all runs with full=True), run folders are read in parallel
+
+        Returns:
+            list: run indexes added to the index
+        """
+        index, _ = self._read_index()
+        cataloged = set() if full or index is None else {int(run_index) for run_index in index["runs"]}
+        missing = [run_index for run_index in self.list_run_indexes() if run_index not in cataloged]
+        if not missing:
+            return []
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            entries = [entry for entry in executor.map(self.read_run, missing) if entry is not None]
+        if entries:
+            if full and index is not None:
+                # hyperparameters recorded at upload time are better than the ones metrics.json has
+                for entry in entries:
+                    old_entry = index["runs"].get(str(entry["run_index"]))
+                    if old_entry is not None and old_entry.get("hyperparameters"):
+                        entry["hyperparameters"] = old_entry["hyperparameters"]
+            self.record(entries)
+        return [entry["run_index"] for entry in entries]
+
+    # local SQLite mirror
+    @contextmanager
+    def _connect(self):
+        mirror_dir = os.path.dirname(self.mirror_path)
+        if mirror_dir:
+            os.makedirs(mirror_dir, exist_ok=True)
+        connection = sqlite3.connect(self.mirror_path)
+        connection.row_factory = sqlite3.Row
+        connection.executescript("""
+            CREATE TABLE IF NOT EXISTS runs (
+                run_index INTEGER PRIMARY KEY, training_mode TEXT, accuracy REAL, macro_f1 REAL, weighted_f1 REAL,
+                wall_seconds REAL, cpu_seconds REAL, peak_rss_mb REAL, artifact_bytes INTEGER,
+                hyperparameters TEXT, recorded_at REAL, entry TEXT);
+            CREATE TABLE IF NOT EXISTS class_scores (
+                run_index INTEGER, class_label TEXT, precision REAL, recall REAL, f1 REAL, support REAL,
+                PRIMARY KEY (run_index, class_label));
+            CREATE TABLE IF NOT EXISTS mirror_state (key TEXT PRIMARY KEY, value TEXT);
+        """)
+        try:
+            with connection: # one transaction, committed on success
+                yield connection
+        finally:
+            connection.close()
+
+    def sync_mirror(self):
+        """
+        Downloads the index (one GET) and rewrites the mirror if the index changed since the last sync
+
+        Returns:
+            int: number of runs in the catalog
+        """
+        index, etag = self._read_index()
+        runs = (index or {"runs": {}})["runs"]
+        with self._connect() as connection:
+            state = connection.execute("SELECT value FROM mirror_state WHERE key = 'etag'").fetchone()
+            if etag is not None and state is not None and state["value"] == etag:
+                return len(runs)
+            connection.execute("DELETE FROM runs")
+            connection.execute("DELETE FROM class_scores")
+            connection.executemany(
+                "INSERT INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(entry["run_index"], entry["training_mode"], entry["accuracy"], entry["macro_f1"], entry["weighted_f1"],
+                  entry["wall_seconds"], entry["cpu_seconds"], entry["peak_rss_mb"], entry["artifact_bytes"],
+                  json.dumps(entry["hyperparameters"]), entry["recorded_at"], json.dumps(entry)) for entry in runs.values()])
+            connection.executemany(
+                "INSERT INTO class_scores VALUES (?, ?, ?, ?, ?, ?)",
+                [(entry["run_index"], label, scores["precision"], scores["recall"], scores["f1"], scores["support"])
+                 for entry in runs.values() for label, scores in entry["class_scores"].items()])
+            connection.execute("INSERT OR REPLACE INTO mirror_state VALUES ('etag', ?)", (etag,))
+        logger.info(f"Experiment catalog mirror updated, {len(runs)} runs")
+        return len(runs)
+
+    def best_runs(self, metric="accuracy", top=1, sync=True):
+        """
+        metric - one of METRICS, or "<precision|recall|f1>:<class>" (e.g. "f1:2")
+
+        Returns:
+            list: catalog entries of the top runs, best first (runs without the metric are left out)
+        """
+        if sync:
+            self.sync_mirror()
+        if ":" in metric:
+            class_metric, class_label = metric.split(":", 1)
+            if class_metric not in CLASS_METRICS:
+                raise ValueError(f"Unknown class metric {class_metric}, expected one of {CLASS_METRICS}")
+            query = (f"SELECT runs.entry FROM runs JOIN class_scores USING (run_index) "
+                     f"WHERE class_label = ? AND class_scores.{class_metric} IS NOT NULL "
+                     f"ORDER BY class_scores.{class_metric} DESC, run_index DESC LIMIT ?")
+            parameters = (class_label, top)
+        else:
+            if metric not in METRICS:
+                raise ValueError(f"Unknown metric {metric}, expected one of {list(METRICS)} or <{'|'.join(CLASS_METRICS)}>:<class>")
+            # column name comes from METRICS, never from the caller
+            query = (f"SELECT entry FROM runs WHERE {metric} IS NOT NULL "
+                     f"ORDER BY {metric} {'DESC' if METRICS[metric] else 'ASC'}, run_index DESC LIMIT ?")
+            parameters = (top,)
+        with self._connect() as connection:
+            return [json.loads(row["entry"]) for row in connection.execute(query, parameters)]
+
+    def compare_runs(self, first_index, last_index, sync=True):
+        """
+        Returns:
+            list: catalog entries of cataloged runs first_index..last_index (inclusive), by run index
+        """
+        if sync:
+            self.sync_mirror()
+        with self._connect() as connection:
+            rows = connection.execute("SELECT entry FROM runs WHERE run_index BETWEEN ? AND ? ORDER BY run_index",
+                                      (first_index, last_index))
+            return [json.loads(row["entry"]) for row in rows]
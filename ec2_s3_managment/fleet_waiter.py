@@ -0,0 +1,204 @@
+import os
+import json
+import time
+import asyncio
+import inspect
+
+from botocore.exceptions import ClientError
+
+from ec2_s3_managment.ec2_s3_constants import (
+    FLEET_POLL_MIN_INTERVAL, FLEET_POLL_MAX_INTERVAL, FLEET_POLL_BACKOFF, FLEET_DESCRIBE_BATCH, INSTANCE_LATENCY_LOG)
+
+# states from which the target state can't be reached any more
+UNREACHABLE_STATES = {
+    "running": {"shutting-down", "terminated", "stopping", "stopped"},
+    "stopped": {"shutting-down", "terminated"},
+    "terminated": set(),
+}
+THROTTLING_ERRORS = ("RequestLimitExceeded", "Throttling", "ThrottlingException")
+# StateReason code of a spot instance AWS took back - terminated like a finished run, but the run didn't finish
+SPOT_INTERRUPTION_REASON = "Server.SpotInstanceTermination"
+
+
+class InstanceRecordClass:
+    """
+    State history of one tracked instance
+
+    states - state -> wall time (time.time()) it was first seen in, "launched" is the launch itself
+    state_reason - StateReason code of the last state, e.g. "Client.InstanceInitiatedShutdown"
+    outcome - result of the last wait: "reached", "unexpected" (target became unreachable), "timeout"
+    """
+    def __init__(self, instance_id, launched_at=None):
+        self.instance_id = instance_id
+        self.state = None
+        self.state_reason = None
+        self.states = {"launched": launched_at} if launched_at is not None else {}
+        self.outcome = None
+
+    @property
+    def spot_interrupted(self):
+        return self.state_reason == SPOT_INTERRUPTION_REASON
+
+    def latency(self, from_state, to_state):
+        if from_state in self.states and to_state in self.states:
+            return self.states[to_state] - self.states[from_state]
+        return None
+
+    def latencies(self):
+        """
+        Returns:
+            dict: launch -> running, running -> terminated, launch -> terminated seconds (None if not observed)
+        """
+        return {
+            "launch_to_running": self.latency("launched", "running"),
+            "running_to_terminated": self.latency("running", "terminated"),
+            "launch_to_terminated": self.latency("launched", "terminated"),
+        }
+
+    def to_dict(self):
+        return {"instance_id": self.instance_id, "state": self.state, "state_reason": self.state_reason,
+                "states": self.states, "latencies": self.latencies()}
+
+
+class FleetWaiterClass:
+    """
+    Waits for many EC2 instances at once.
+
+    1. all tracked instances waiting for a state are described together, FLEET_DESCRIBE_BATCH ids per
+       describe_instances call (instance-id filter - instances not visible yet don't fail the call)
+    2. poll interval starts at min_interval, grows by backoff up to max_interval while nothing changes,
+       drops back to min_interval after any state change, doubles when AWS throttles
+    3. every state change calls on_transition(instance_id, old_state, new_state, record) - plain function
+       or coroutine function
+    4. instance is done when it reaches the target state, or ends in a state from which the target can't
+       be reached (e.g. terminated while waiting for running), the rest gives up after timeout
+
+    Records are kept across waits (launch -> running -> terminated of the same instance), finished
+    instances (terminated) are appended to INSTANCE_LATENCY_LOG.
+
+    Example usage:
+        fleet_waiter = FleetWaiterClass(ec2_client)
+        fleet_waiter.track(instance_id)           # right after run_instances
+        records = fleet_waiter.wait_for([instance_id, ...], 'running', timeout=900)
+        records[instance_id].latencies()          # {"launch_to_running": 41.2, ...}
+
+        # inside a running event loop
+        records = await fleet_waiter.wait([instance_id, ...], 'terminated')
+    """
+    def __init__(self, ec2_client, min_interval=FLEET_POLL_MIN_INTERVAL, max_interval=FLEET_POLL_MAX_INTERVAL,
+                 backoff=FLEET_POLL_BACKOFF, batch_size=FLEET_DESCRIBE_BATCH, on_transition=None, latency_log_path=INSTANCE_LATENCY_LOG):
+        self.ec2_client = ec2_client
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.batch_size = batch_size
+        self.on_transition = on_transition
+        self.latency_log_path = latency_log_path
+        self.records = {}
+        self.describe_calls = 0
+
+    def track(self, instance_id, launched_at=None):
+        """
+        launched_at - wall time of run_instances, default now
+        """
+        if instance_id not in self.records:
+            self.records[instance_id] = InstanceRecordClass(instance_id, launched_at if launched_at is not None else time.time())
+        return self.records[instance_id]
+
+    def _describe_states(self, instance_ids):
+        """
+        Returns:
+            dict: instance_id -> (state name, StateReason code or None), instances AWS doesn't know yet are missing
+        """
+        states = {}
+        for start in range(0, len(instance_ids), self.batch_size):
+            describe_kwargs = {"Filters": [{"Name": "instance-id", "Values": instance_ids[start:start + self.batch_size]}]}
+            while True:
+                response = self.ec2_client.describe_instances(**describe_kwargs)
+                self.describe_calls += 1
+                for reservation in response["Reservations"]:
+                    for instance in reservation["Instances"]:
+                        states[instance["InstanceId"]] = (instance["State"]["Name"], instance.get("StateReason", {}).get("Code"))
+                if not response.get("NextToken"):
+                    break
+                describe_kwargs["NextToken"] = response["NextToken"]
+        return states
+
+    async def _notify(self, instance_id, old_state, new_state):
+        if self.on_transition is None:
+            return
+        result = self.on_transition(instance_id, old_state, new_state, self.records[instance_id])
+        if inspect.isawaitable(result):
+            await result
+
+    def _write_latencies(self, record):
+        if not self.latency_log_path:
+            return
+        log_dir = os.path.dirname(self.latency_log_path)
+        if log_dir:
+            os.makedirs(log_dir, exist_ok=True)
+        with open(self.latency_log_path, "a") as file:
+            file.write(json.dumps(record.to_dict()) + "\n")
+
+    async def wait(self, instance_ids, target_status, timeout=None):
+        """
+        Returns:
+            dict: instance_id -> InstanceRecordClass, outcome of every record is set
+        """
+        for instance_id in instance_ids:
+            self.track(instance_id)
+            self.records[instance_id].outcome = None
+        pending = list(dict.fromkeys(instance_ids))
+        unreachable = UNREACHABLE_STATES.get(target_status, set())
+        deadline = None if timeout is None else time.monotonic() + timeout
+        interval = self.min_interval
+
+        while pending:
+            try:
+                states = await asyncio.to_thread(self._describe_states, pending)
+            except ClientError as e:
+                if e.response['Error']['Code'] not in THROTTLING_ERRORS:
+                    raise
+                states, interval = {}, min(interval * 2, self.max_interval)
+
+            changed = False
+            for instance_id, (state, state_reason) in states.items():
+                record = self.records[instance_id]
+                if state == record.state:
+                    continue
+                old_state, record.state, record.state_reason, changed = record.state, state, state_reason, True
+                record.states.setdefault(state, time.time())
+                await self._notify(instance_id, old_state, state)
+                if state == "terminated":
+                    self._write_latencies(record)
+
+            still_pending = []
+            for instance_id in pending:
+                record = self.records[instance_id]
+                if record.state == target_status:
+                    record.outcome = "reached"
+                elif record.state in unreachable:
+                    record.outcome = "unexpected"
+                else:
+                    still_pending.append(instance_id)
+            pending = still_pending
+            if not pending:
+                break
+
+            interval = self.min_interval if changed else min(interval * self.backoff, self.max_interval)
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    for instance_id in pending:
+                        self.records[instance_id].outcome = "timeout"
+                    break
+                interval = min(interval, remaining)
+            await asyncio.sleep(interval)
+
+        return {instance_id: self.records[instance_id] for instance_id in instance_ids}
+
+    def wait_for(self, instance_ids, target_status, timeout=None):
+        """
+        Blocking version of wait, for code without an event loop
+        """
+        return asyncio.run(self.wait(instance_ids, target_status, timeout))
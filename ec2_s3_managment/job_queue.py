@@ -0,0 +1,260 @@
+import json
+import time
+import uuid
+import threading
+
+from botocore.exceptions import ClientError
+
+from ec2_s3_managment.ec2_s3_constants import (
+    JOB_QUEUE_PREFIX, LIST_PAGE_SIZE, POOL_IDLE_TIMEOUT, POOL_POLL_INTERVAL, POOL_JOB_LEASE, POOL_HEARTBEAT_INTERVAL)
+from ec2_s3_managment.run_index import CONDITIONAL_WRITE_ERRORS
+from ec2_s3_managment.logger_config import logger
+
+
+class JobQueueClass:
+    """
+    Queue of training jobs kept in the bucket, consumed by pool workers (see PoolWorkerClass).
+
+        job_queue/pending/<job_id>.json     job spec, e.g. {"training_mode": "sweep"}, deleted when the job is done
+        job_queue/claims/<job_id>.json      which worker runs the job and its last heartbeat, deleted when the job is done
+        job_queue/done/<job_id>.json        result {"status": "succeeded" | "failed", ...}
+
+    A job is claimed with a conditional put of its claim (IfNoneMatch='*'), so when many workers
+    poll at once only one of them gets each job - the others get PreconditionFailed and try the next one.
+    Job ids start with the submit time, pending jobs are claimed oldest first.
+
+    A claim is a lease - the worker renews heartbeat_at every POOL_HEARTBEAT_INTERVAL (see heartbeat).
+    A claim without heartbeat for lease_seconds (worker died - OOM, stop, spot reclaim) is stale, its job
+    counts as unclaimed again and the next worker takes the claim over with a conditional put
+    (IfMatch=<etag of the stale claim>), so again only one worker gets it.
+    Only claims of unfinished jobs are kept, a poll costs the same no matter how many jobs ran before.
+
+    Works the same against the local S3 stand-in (see LocalS3ClientClass) - pool logic can be tested without AWS.
+
+    Example usage:
+        job_queue = JobQueueClass(s3_client, bucket_name)
+        job_id = job_queue.submit({"training_mode": "single"})
+        ...
+        result = job_queue.wait_for_result(job_id)
+    """
+    def __init__(self, s3_client, bucket_name, prefix=JOB_QUEUE_PREFIX, lease_seconds=POOL_JOB_LEASE):
+        self.s3_client = s3_client
+        self.bucket_name = bucket_name
+        self.prefix = prefix
+        self.lease_seconds = lease_seconds
+
+    def _key(self, folder, job_id):
+        return f"{self.prefix}/{folder}/{job_id}.json"
+
+    def _read_json(self, key):
+        return self._read_json_with_etag(key)[0]
+
+    def _read_json_with_etag(self, key):
+        """
+        Returns:
+            tuple: (dict, etag), (None, None) if the object does not exist
+        """
+        try:
+            response = self.s3_client.get_object(Bucket=self.bucket_name, Key=key)
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('NoSuchKey', '404'):
+                return None, None
+            raise
+        return json.loads(response['Body'].read()), response['ETag']
+
+    def _conditional_put(self, key, body, **condition):
+        """
+        Returns:
+            bool: False if the condition did not hold (another worker wrote the object first)
+        """
+        try:
+            self.s3_client.put_object(Bucket=self.bucket_name, Key=key, Body=json.dumps(body).encode('utf-8'), **condition)
+        except ClientError as e:
+            if e.response['Error']['Code'] in CONDITIONAL_WRITE_ERRORS:
+                return False
+            raise
+        return True
+
+    def _is_stale(self, claim):
+        return time.time() - claim["heartbeat_at"] > self.lease_seconds
+
+    def _list_job_ids(self, folder):
+        job_ids = []
+        list_kwargs = {'Bucket': self.bucket_name, 'Prefix': f"{self.prefix}/{folder}/", 'MaxKeys': LIST_PAGE_SIZE}
+        while True:
+            response = self.s3_client.list_objects_v2(**list_kwargs)
+            job_ids += [item['Key'].rsplit("/", 1)[1][:-len(".json")] for item in response.get('Contents', [])]
+            if not response.get('IsTruncated'):
+                return sorted(job_ids)
+            list_kwargs['ContinuationToken'] = response['NextContinuationToken']
+
+    def submit(self, spec):
+        """
+        Returns:
+            str: job id
+        """
+        job_id = f"{time.time_ns():020d}-{uuid.uuid4().hex[:8]}"
+        body = json.dumps({**spec, "job_id": job_id, "submitted_at": time.time()}).encode('utf-8')
+        self.s3_client.put_object(Bucket=self.bucket_name, Key=self._key("pending", job_id), Body=body)
+        logger.info(f"Submitted job {job_id}: {spec}")
+        return job_id
+
+    def pending_jobs(self):
+        """
+        Returns:
+            list: ids of submitted jobs which are not done yet (claimed or not), oldest first
+        """
+        return self._list_job_ids("pending")
+
+    def unclaimed_jobs(self):
+        """
+        Returns:
+            list: ids of jobs nobody has claimed yet or whose claim is stale, oldest first
+        """
+        live_claims = set()
+        for job_id in self._list_job_ids("claims"):
+            claim = self._read_json(self._key("claims", job_id))
+            if claim is not None and not self._is_stale(claim):
+                live_claims.add(job_id)
+        return [job_id for job_id in self.pending_jobs() if job_id not in live_claims]
+
+    def claim(self, job_id, worker_id):
+        """
+        Returns:
+            bool: True if this worker got the job (new claim, or took over a stale one)
+        """
+        now = time.time()
+        body = {"worker_id": worker_id, "claimed_at": now, "heartbeat_at": now}
+        if self._conditional_put(self._key("claims", job_id), body, IfNoneMatch='*'):
+            return True
+        claim, etag = self._read_json_with_etag(self._key("claims", job_id))
+        # claim gone - the job was just completed
+        if claim is None or not self._is_stale(claim):
+            return False
+        if not self._conditional_put(self._key("claims", job_id), body, IfMatch=etag):
+            return False
+        logger.warning(f"Worker {worker_id} took over job {job_id}, claim of {claim['worker_id']} "
+                       f"had no heartbeat for {now - claim['heartbeat_at']:.0f}s")
+        return True
+
+    def heartbeat(self, job_id, worker_id):
+        """
+        Renews the claim of a running job
+
+        Returns:
+            bool: False if the claim is gone or another worker took it over
+        """
+        claim, etag = self._read_json_with_etag(self._key("claims", job_id))
+        if claim is None or claim["worker_id"] != worker_id:
+            return False
+        return self._conditional_put(self._key("claims", job_id), {**claim, "heartbeat_at": time.time()}, IfMatch=etag)
+
+    def claim_next(self, worker_id):
+        """
+        Returns:
+            dict: spec of the job this worker claimed, None if there is no unclaimed job
+        """
+        for job_id in self.unclaimed_jobs():
+            if self.claim(job_id, worker_id):
+                spec = self._read_json(self._key("pending", job_id))
+                if spec is not None:
+                    logger.info(f"Worker {worker_id} claimed job {job_id}")
+                    return spec
+                # job was completed between listing and claiming, its claims folder stays live claims only
+                self.s3_client.delete_object(Bucket=self.bucket_name, Key=self._key("claims", job_id))
+        return None
+
+    def complete(self, job_id, result):
+        """
+        Stores result of the job (worker_id in it is the history), its spec and claim are deleted
+        """
+        body = json.dumps({**result, "job_id": job_id, "finished_at": time.time()}).encode('utf-8')
+        self.s3_client.put_object(Bucket=self.bucket_name, Key=self._key("done", job_id), Body=body)
+        self.s3_client.delete_object(Bucket=self.bucket_name, Key=self._key("pending", job_id))
+        self.s3_client.delete_object(Bucket=self.bucket_name, Key=self._key("claims", job_id))
+
+    def get_result(self, job_id):
+        return self._read_json(self._key("done", job_id))
+
+    def wait_for_result(self, job_id, poll_interval=POOL_POLL_INTERVAL, timeout=None):
+        """
+        Returns:
+            dict: result of the job (see complete)
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            result = self.get_result(job_id)
+            if result is not None:
+                return result
+            if deadline is not None and time.monotonic() > deadline:
+                raise TimeoutError(f"Job {job_id} not done after {timeout}s")
+            time.sleep(poll_interval)
+
+
+class PoolWorkerClass:
+    """
+    Job loop of a pool instance's container - claims jobs from the queue and runs them one after
+    another, returns when no job came for idle_timeout seconds (container exits, instance stops and
+    waits in the pool until the coordinator starts it again, see Ec2ManagerClass.ensure_pool)
+
+    run_job(spec) runs one job and returns a dict which becomes part of the job result,
+    exception in run_job marks the job failed, the worker goes on with the next one.
+    While a job runs, a background thread renews its claim every heartbeat_interval seconds.
+
+    Example usage:
+        worker = PoolWorkerClass(job_queue, run_job, worker_id=socket.gethostname())
+        jobs_done = worker.run()
+    """
+    def __init__(self, job_queue, run_job, worker_id, idle_timeout=POOL_IDLE_TIMEOUT, poll_interval=POOL_POLL_INTERVAL,
+                 heartbeat_interval=POOL_HEARTBEAT_INTERVAL):
+        self.job_queue = job_queue
+        self.run_job = run_job
+        self.worker_id = worker_id
+        self.idle_timeout = idle_timeout
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval
+
+    def _heartbeat(self, job_id, stop_event):
+        while not stop_event.wait(self.heartbeat_interval):
+            try:
+                if not self.job_queue.heartbeat(job_id, self.worker_id):
+                    logger.warning(f"Worker {self.worker_id} lost the claim of job {job_id}, another worker may run it too")
+                    return
+            except Exception:
+                # S3 hiccup - next heartbeat tries again, the lease is several intervals long
+                logger.exception(f"Heartbeat of job {job_id} failed")
+
+    def run_one(self, spec):
+        start_time = time.perf_counter()
+        stop_event = threading.Event()
+        heartbeat_thread = threading.Thread(target=self._heartbeat, args=(spec["job_id"], stop_event), daemon=True)
+        heartbeat_thread.start()
+        try:
+            result = {"status": "succeeded", **(self.run_job(spec) or {})}
+        except Exception as e:
+            logger.exception(f"Job {spec['job_id']} failed")
+            result = {"status": "failed", "error": repr(e)}
+        finally:
+            stop_event.set()
+            heartbeat_thread.join()
+        result.update(worker_id=self.worker_id, seconds=time.perf_counter() - start_time)
+        self.job_queue.complete(spec["job_id"], result)
+        logger.info(f"Job {spec['job_id']} {result['status']} in {result['seconds']:.1f}s")
+        return result
+
+    def run(self):
+        """
+        Returns:
+            int: number of jobs this worker ran
+        """
+        jobs_done, idle_since = 0, time.monotonic()
+        while True:
+            spec = self.job_queue.claim_next(self.worker_id)
+            if spec is not None:
+                self.run_one(spec)
+                jobs_done, idle_since = jobs_done + 1, time.monotonic()
+                continue
+            if time.monotonic() - idle_since >= self.idle_timeout:
+                logger.info(f"Worker {self.worker_id} idle for {self.idle_timeout}s after {jobs_done} jobs, stopping")
+                return jobs_done
+            time.sleep(self.poll_interval)
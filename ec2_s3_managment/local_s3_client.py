@@ -0,0 +1,290 @@
+"""
+Local S3 stand-in
+
+Filesystem backed replacement for the subset of the boto3 S3 client API used in this project.
+Objects are stored as plain files under <root>/<bucket>/<key>, so the whole pipeline
+(upload, listing, download) can be exercised without AWS credentials.
+
+Enable it by setting S3_LOCAL_ROOT in .env (or in the environment):
+    S3_LOCAL_ROOT=TestFiles/local_s3
+
+Key points:
+    list_objects_v2
+        Honours Prefix, Delimiter, MaxKeys and ContinuationToken, so pagination bugs
+        show up locally exactly like they would against S3 (1000 keys per page)
+    ETag
+        md5 of the object content in quotes, same as S3 for single part uploads
+    conditional writes
+        put_object supports IfMatch / IfNoneMatch='*' (PreconditionFailed on conflict),
+        checks and writes are serialized with a lock file so they are safe across processes
+    errors
+        raised as botocore ClientError with the same error codes S3 returns
+"""
+import os
+import io
+import shutil
+import hashlib
+import uuid
+import tempfile
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from botocore.exceptions import ClientError
+from botocore.response import StreamingBody
+
+try:
+    import fcntl # posix only, conditional writes are then atomic across processes too
+except ImportError:
+    fcntl = None
+
+
+def _client_error(code, message, operation_name, status_code):
+    return ClientError(
+        {
+            'Error': {'Code': code, 'Message': message},
+            'ResponseMetadata': {'HTTPStatusCode': status_code},
+        },
+        operation_name
+    )
+
+
+class LocalS3ClientClass:
+    """
+    Minimal, thread safe S3 client backed by a local directory.
+
+    Example usage:
+        s3_client = LocalS3ClientClass("TestFiles/local_s3")
+        s3_client.put_object(Bucket="bucket", Key="Output_1/metrics.json", Body=b"{}")
+        s3_client.list_objects_v2(Bucket="bucket", Prefix="Output_1")
+    """
+    def __init__(self, root):
+        self.root = root
+        self.tmp_dir = os.path.join(root, ".tmp")
+        self.multipart_dir = os.path.join(root, ".multipart")
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        os.makedirs(self.multipart_dir, exist_ok=True)
+        self._etag_cache = {}
+        self._lock = threading.Lock()
+        self._conditional_write_lock = threading.Lock()
+
+    # paths
+    def _bucket_dir(self, bucket):
+        bucket_dir = os.path.join(self.root, bucket)
+        os.makedirs(bucket_dir, exist_ok=True)
+        return bucket_dir
+
+    def _object_path(self, bucket, key):
+        return os.path.join(self._bucket_dir(bucket), *key.split("/"))
+
+    def _existing_object_path(self, bucket, key, operation_name):
+        path = self._object_path(bucket, key)
+        if not os.path.isfile(path):
+            raise _client_error('NoSuchKey', f"The specified key does not exist: {key}", operation_name, 404)
+        return path
+
+    def _etag(self, path):
+        stat = os.stat(path)
+        # every write replaces the file, so inode changes even if size and mtime don't
+        cache_key = (path, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            etag = self._etag_cache.get(cache_key)
+        if etag is None:
+            md5 = hashlib.md5()
+            with open(path, "rb") as file:
+                for block in iter(lambda: file.read(1024 * 1024), b""):
+                    md5.update(block)
+            etag = f'"{md5.hexdigest()}"'
+            with self._lock:
+                self._etag_cache[cache_key] = etag
+        return etag
+
+    def _write_object(self, bucket, key, fileobj):
+        # write to a temp file first, readers never see a half written object
+        path = self._object_path(bucket, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.tmp_dir)
+        with os.fdopen(fd, "wb") as tmp_file:
+            shutil.copyfileobj(fileobj, tmp_file, 1024 * 1024)
+        os.replace(tmp_path, path)
+        return self._etag(path)
+
+    def _all_keys(self, bucket, prefix):
+        bucket_dir = self._bucket_dir(bucket)
+        keys = []
+        for dir_path, _, file_names in os.walk(bucket_dir):
+            relative_dir = os.path.relpath(dir_path, bucket_dir)
+            for file_name in file_names:
+                key = file_name if relative_dir == "." else "/".join(relative_dir.split(os.sep) + [file_name])
+                if key.startswith(prefix):
+                    keys.append(key)
+        return sorted(keys)
+
+    @contextmanager
+    def _conditional_lock(self):
+        with self._conditional_write_lock:
+            if fcntl is None:
+                yield
+                return
+            with open(os.path.join(self.root, ".lock"), "w") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    # listing
+    def list_objects_v2(self, Bucket, Prefix="", Delimiter=None, MaxKeys=1000, ContinuationToken=None, StartAfter=None, **kwargs):
+        entries = []
+        seen_prefixes = set()
+        for key in self._all_keys(Bucket, Prefix):
+            if Delimiter:
+                delimiter_position = key.find(Delimiter, len(Prefix))
+                if delimiter_position != -1:
+                    common_prefix = key[:delimiter_position + len(Delimiter)]
+                    if common_prefix not in seen_prefixes:
+                        seen_prefixes.add(common_prefix)
+                        entries.append((common_prefix, True))
+                    continue
+            entries.append((key, False))
+
+        start_after = ContinuationToken or StartAfter
+        if start_after:
+            entries = [entry for entry in entries if entry[0] > start_after]
+
+        page, remaining = entries[:MaxKeys], entries[MaxKeys:]
+        response = {
+            'IsTruncated': bool(remaining),
+            'KeyCount': len(page),
+            'MaxKeys': MaxKeys,
+            'Prefix': Prefix,
+        }
+        contents = []
+        common_prefixes = []
+        for name, is_prefix in page:
+            if is_prefix:
+                common_prefixes.append({'Prefix': name})
+            else:
+                path = self._object_path(Bucket, name)
+                stat = os.stat(path)
+                contents.append({
+                    'Key': name,
+                    'Size': stat.st_size,
+                    'ETag': self._etag(path),
+                    'LastModified': datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc),
+                })
+        # S3 omits empty sections, callers rely on that ('Contents' in response)
+        if contents:
+            response['Contents'] = contents
+        if common_prefixes:
+            response['CommonPrefixes'] = common_prefixes
+        if remaining:
+            response['NextContinuationToken'] = page[-1][0]
+        return response
+
+    # reading
+    def head_object(self, Bucket, Key, **kwargs):
+        path = self._existing_object_path(Bucket, Key, 'HeadObject')
+        stat = os.stat(path)
+        return {
+            'ContentLength': stat.st_size,
+            'ETag': self._etag(path),
+            'LastModified': datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc),
+        }
+
+    def get_object(self, Bucket, Key, Range=None, IfMatch=None, **kwargs):
+        path = self._existing_object_path(Bucket, Key, 'GetObject')
+        if IfMatch is not None and self._etag(path) != IfMatch:
+            raise _client_error('PreconditionFailed', "At least one of the pre-conditions you specified did not hold", 'GetObject', 412)
+        with open(path, "rb") as file:
+            if Range is None:
+                data = file.read()
+                # etag of the bytes we actually read, file may be replaced in the meantime
+                etag = f'"{hashlib.md5(data).hexdigest()}"'
+            else:
+                # "bytes=start-end", end inclusive
+                start, end = Range[len("bytes="):].split("-")
+                file.seek(int(start))
+                data = file.read(int(end) - int(start) + 1)
+                etag = self._etag(path)
+        return {
+            'Body': StreamingBody(io.BytesIO(data), len(data)),
+            'ContentLength': len(data),
+            'ETag': etag,
+        }
+
+    def download_file(self, Bucket, Key, Filename, ExtraArgs=None, Callback=None, Config=None):
+        path = self._existing_object_path(Bucket, Key, 'GetObject')
+        shutil.copyfile(path, Filename)
+        if Callback is not None:
+            Callback(os.path.getsize(Filename))
+
+    # writing
+    def put_object(self, Bucket, Key, Body=b"", IfMatch=None, IfNoneMatch=None, **kwargs):
+        if isinstance(Body, str):
+            Body = Body.encode("utf-8")
+        fileobj = io.BytesIO(Body) if isinstance(Body, (bytes, bytearray)) else Body
+        if IfMatch is None and IfNoneMatch is None:
+            return {'ETag': self._write_object(Bucket, Key, fileobj)}
+
+        with self._conditional_lock():
+            path = self._object_path(Bucket, Key)
+            exists = os.path.isfile(path)
+            if IfNoneMatch == '*' and exists:
+                raise _client_error('PreconditionFailed', "At least one of the pre-conditions you specified did not hold", 'PutObject', 412)
+            if IfMatch is not None:
+                if not exists:
+                    raise _client_error('NoSuchKey', f"The specified key does not exist: {Key}", 'PutObject', 404)
+                if self._etag(path) != IfMatch:
+                    raise _client_error('PreconditionFailed', "At least one of the pre-conditions you specified did not hold", 'PutObject', 412)
+            return {'ETag': self._write_object(Bucket, Key, fileobj)}
+
+    def upload_fileobj(self, Fileobj, Bucket, Key, ExtraArgs=None, Callback=None, Config=None):
+        self._write_object(Bucket, Key, Fileobj)
+
+    def upload_file(self, Filename, Bucket, Key, ExtraArgs=None, Callback=None, Config=None):
+        with open(Filename, "rb") as file:
+            self._write_object(Bucket, Key, file)
+
+    # multipart upload, parts are kept in <root>/.multipart/<upload_id>/ until completed
+    def _multipart_upload_dir(self, upload_id, operation_name):
+        upload_dir = os.path.join(self.multipart_dir, upload_id)
+        if not os.path.isdir(upload_dir):
+            raise _client_error('NoSuchUpload', f"The specified upload does not exist: {upload_id}", operation_name, 404)
+        return upload_dir
+
+    def create_multipart_upload(self, Bucket, Key, **kwargs):
+        upload_id = uuid.uuid4().hex
+        os.makedirs(os.path.join(self.multipart_dir, upload_id))
+        return {'Bucket': Bucket, 'Key': Key, 'UploadId': upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body, **kwargs):
+        upload_dir = self._multipart_upload_dir(UploadId, 'UploadPart')
+        data = Body if isinstance(Body, (bytes, bytearray)) else Body.read()
+        with open(os.path.join(upload_dir, f"{PartNumber:05d}"), "wb") as part_file:
+            part_file.write(data)
+        return {'ETag': f'"{hashlib.md5(data).hexdigest()}"'}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload, **kwargs):
+        upload_dir = self._multipart_upload_dir(UploadId, 'CompleteMultipartUpload')
+        path = self._object_path(Bucket, Key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.tmp_dir)
+        with os.fdopen(fd, "wb") as tmp_file:
+            for part in MultipartUpload['Parts']:
+                with open(os.path.join(upload_dir, f"{part['PartNumber']:05d}"), "rb") as part_file:
+                    shutil.copyfileobj(part_file, tmp_file, 1024 * 1024)
+        os.replace(tmp_path, path)
+        etag = self._etag(path)
+        shutil.rmtree(upload_dir)
+        return {'Bucket': Bucket, 'Key': Key, 'ETag': etag}
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId, **kwargs):
+        shutil.rmtree(os.path.join(self.multipart_dir, UploadId), ignore_errors=True)
+        return {}
+
+    def delete_object(self, Bucket, Key, **kwargs):
+        path = self._object_path(Bucket, Key)
+        if os.path.isfile(path):
+            os.remove(path)
+        return {}
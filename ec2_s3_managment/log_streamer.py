@@ -0,0 +1,97 @@
+import threading
+
+from ec2_s3_managment.ec2_s3_constants import LOGGER_OUT_PATH, LOGGER_FILENAME, LOG_STREAM_INTERVAL
+from ec2_s3_managment.logger_config import logger, flush_logging, configure_logging
+
+
+class LogStreamerClass:
+    """
+    Ships the log to the run folder while the run is still going, so a run that dies
+    (e.g. instance killed out of memory during training) still leaves its log in S3.
+
+    Every interval seconds a background thread uploads what was written to the log file since the
+    last upload as the next segment:
+        Output_N/logger_segments/00001.log, 00002.log, ...
+    segments only contain whole lines, concatenated in order they are the log. stop() (or leaving
+    the with block, also on exception) writes everything still queued and uploads the last segment.
+
+    Example usage:
+        with LogStreamerClass(s3_manager_instance):
+            ...
+        s3_manager_instance.upload_log_to_s3()
+    """
+    def __init__(self, s3_manager, interval=LOG_STREAM_INTERVAL, log_path=LOGGER_OUT_PATH, log_name=LOGGER_FILENAME):
+        """
+        log_name - segments are uploaded to <run folder>/<log_name>_segments/, e.g. logger_worker_0
+        """
+        self.s3_manager = s3_manager
+        self.interval = interval
+        self.log_path = log_path
+        self.log_name = log_name
+        self.offset = 0 # bytes of the log file already uploaded, file is truncated when logger is configured
+        self.segments = 0
+        self._upload_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def segment_key(self, segment_index):
+        return self.s3_manager.s3_upload_root + f"/{self.log_name}_segments/{segment_index:05d}.log"
+
+    def upload_segment(self, final=False):
+        """
+        Uploads new whole lines of the log file as the next segment, with final also an unterminated last line
+
+        Returns:
+            int: bytes uploaded
+        """
+        with self._upload_lock:
+            with open(self.log_path, "rb") as file:
+                file.seek(self.offset)
+                data = file.read()
+            if not final:
+                data = data[:data.rfind(b"\n") + 1]
+            if not data:
+                return 0
+            try:
+                self.s3_manager.s3_client.put_object(
+                    Bucket=self.s3_manager.bucket_name,
+                    Key=self.segment_key(self.segments + 1),
+                    Body=data
+                )
+            except Exception as e:
+                # offset is kept - these bytes go with the next segment
+                print(f"Error uploading log segment to S3: {e}")
+                return 0
+            self.segments += 1
+            self.offset += len(data)
+            return len(data)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.upload_segment()
+
+    def start(self):
+        # segments are read from the log file - it must be written
+        configure_logging()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        logger.info(f"Streaming log to s3 every {self.interval}s, segments: {self.segment_key(1).rsplit('/', 1)[0]}/")
+        return self
+
+    def stop(self):
+        """
+        Final flush - every queued record is written and uploaded
+        """
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        flush_logging()
+        self.upload_segment(final=True)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
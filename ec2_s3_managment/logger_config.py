@@ -1,15 +1,116 @@
+import os
+import queue
+import atexit
 import logging
-from ec2_s3_managment.ec2_s3_constants import LOGGER_OUT_PATH, LOGGER_NAME
-# Configure the logger
-open(LOGGER_OUT_PATH, 'w').close()
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(LOGGER_OUT_PATH),
-        logging.StreamHandler()
-    ]
-)
+from logging.handlers import QueueHandler, QueueListener
+from ec2_s3_managment.ec2_s3_constants import LOGGER_OUT_PATH, LOGGER_NAME, LOG_QUEUE_SIZE
+
+
+class BoundedQueueHandlerClass(QueueHandler):
+    """
+    Puts records on a bounded queue, file and console are written by the QueueListener thread,
+    so logging never waits for disk or terminal on the calling (training) thread
+
+    When the queue is full the record is dropped (and counted) instead of blocking the caller
+    """
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped_records = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped_records += 1
+
+
+def _start_listener(log_queue):
+    global log_queue_listener
+    log_queue_listener = QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+    log_queue_listener.start()
+
+
+def flush_logging():
+    """
+    Blocks until every queued record is written to the log file - call before the file is read (e.g. uploaded)
+    """
+    if log_queue_listener is not None:
+        queue_handler.queue.join()
+        file_handler.flush()
+
+
+def truncate_log():
+    """
+    Empties the log file after its records were written - long running processes (pool workers)
+    start every job with an empty log, so each run folder gets only the log of its own job
+    """
+    if log_queue_listener is not None:
+        flush_logging()
+        # file handler appends, next record goes to the start of the empty file
+        with open(LOGGER_OUT_PATH, 'w'):
+            pass
+
+
+def stop_logging():
+    global log_queue_listener
+    if log_queue_listener is None:
+        return
+    flush_logging()
+    if queue_handler.dropped_records:
+        file_handler.handle(logging.makeLogRecord({
+            "name": LOGGER_NAME, "levelno": logging.WARNING, "levelname": "WARNING",
+            "msg": f"{queue_handler.dropped_records} log records dropped, logging queue was full",
+        }))
+    log_queue_listener.stop()
+    log_queue_listener = None
+
+
+def _reinit_after_fork():
+    # queue lock may be held by the listener thread of the parent at fork time,
+    # and the thread itself doesn't exist in the child - new queue, new listener
+    if log_queue_listener is not None:
+        queue_handler.queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+        _start_listener(queue_handler.queue)
+        # worker processes of multiprocessing pools leave through os._exit (atexit is skipped),
+        # their finalizers still run - lowest priority, after the other finalizers which may log
+        import multiprocessing.util
+        multiprocessing.util.Finalize(None, stop_logging, exitpriority=-100)
+
+
+def configure_logging():
+    """
+    Configures global logging - truncates the log file, file and console handlers are written by a
+    background thread (see BoundedQueueHandlerClass). Importing this module has no side effects,
+    entry points call this once at start, later calls do nothing.
+
+    Example usage:
+        if __name__ == "__main__":
+            configure_logging()
+            run_cloud_training_pipeline()
+    """
+    global formatter, file_handler, console_handler, queue_handler
+    if queue_handler is not None:
+        return
+    open(LOGGER_OUT_PATH, 'w').close()
+    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    file_handler = logging.FileHandler(LOGGER_OUT_PATH)
+    console_handler = logging.StreamHandler()
+    for handler in (file_handler, console_handler):
+        handler.setFormatter(formatter)
+
+    queue_handler = BoundedQueueHandlerClass(queue.Queue(maxsize=LOG_QUEUE_SIZE))
+    # only merges args (and traceback) into the message, file and console handlers add the rest
+    queue_handler.setFormatter(logging.Formatter('%(message)s'))
+    logging.basicConfig(level=logging.INFO, handlers=[queue_handler])
+    _start_listener(queue_handler.queue)
+    atexit.register(stop_logging)
+    os.register_at_fork(after_in_child=_reinit_after_fork)
+
+    logger.info("=== Logger Start ===")
+
+
+# handlers exist only after configure_logging()
+formatter = file_handler = console_handler = queue_handler = None
+log_queue_listener = None
 
 logger = logging.getLogger(LOGGER_NAME)
-logger.info("=== Logger Start ===")
\ No newline at end of file
@@ -0,0 +1,90 @@
+import os
+import json
+import time
+import threading
+
+from ec2_s3_managment.ec2_s3_constants import RESOURCE_CACHE_PATH, RESOURCE_CACHE_TTL
+from ec2_s3_managment.logger_config import logger
+
+
+class ResourceCacheClass:
+    """
+    Local cache of resolved AWS resource ids/ARNs (key pair, security group id, instance profile ARN),
+    so launching an instance doesn't have to look them up in AWS every time.
+
+    Cache file (RESOURCE_CACHE_PATH):
+        {"scope": "eu-central-1", "resources": {"security_group_id": {"value": "sg-...", "resolved_at": 1700000000.0}}}
+    scope is the region - ids of another region are never used.
+
+    Entries younger than ttl are used as they are. Older entries are checked with validate(value)
+    (one cheap, filtered describe call) and kept if they still exist, otherwise resolved again.
+    Resources can be deleted behind our back - a call failing on a cached id should invalidate it.
+
+    Example usage:
+        resource_cache = ResourceCacheClass(scope="eu-central-1")
+        security_group_id = resource_cache.resolve("security_group_id", find_or_create_group, validate=group_exists)
+    """
+    def __init__(self, scope, cache_path=RESOURCE_CACHE_PATH, ttl=RESOURCE_CACHE_TTL):
+        self.scope = scope
+        self.cache_path = cache_path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._resources = self._read_cache()
+
+    def _read_cache(self):
+        try:
+            with open(self.cache_path, "r") as file:
+                cache = json.load(file)
+        except (OSError, ValueError):
+            return {}
+        if cache.get("scope") != self.scope:
+            return {}
+        return cache.get("resources", {})
+
+    def _write_cache(self):
+        cache_dir = os.path.dirname(self.cache_path)
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+        # tmp file per process - several launches may run at once
+        tmp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as file:
+            json.dump({"scope": self.scope, "resources": self._resources}, file, indent=4)
+        os.replace(tmp_path, self.cache_path)
+
+    def get(self, name, validate=None):
+        """
+        Returns:
+            cached value of name, None if it isn't cached, is expired and there is no validate, or failed validation
+        """
+        with self._lock:
+            entry = self._resources.get(name)
+        if entry is None:
+            return None
+        if time.time() - entry["resolved_at"] < self.ttl:
+            return entry["value"]
+        if validate is not None and validate(entry["value"]):
+            self.set(name, entry["value"])
+            return entry["value"]
+        logger.info(f"Cached {name} {entry['value']} expired or no longer exists")
+        self.invalidate(name)
+        return None
+
+    def set(self, name, value):
+        with self._lock:
+            self._resources[name] = {"value": value, "resolved_at": time.time()}
+            self._write_cache()
+
+    def invalidate(self, name):
+        with self._lock:
+            if self._resources.pop(name, None) is not None:
+                self._write_cache()
+
+    def resolve(self, name, resolve_function, validate=None):
+        """
+        Cached value of name, or resolve_function() - result is cached
+        """
+        value = self.get(name, validate)
+        if value is None:
+            value = resolve_function()
+            self.set(name, value)
+        return value
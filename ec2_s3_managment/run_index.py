@@ -0,0 +1,188 @@
+import os
+import json
+import time
+import random
+from botocore.exceptions import ClientError
+
+from ec2_s3_managment.ec2_s3_constants import (
+    S3_PREFIX, LIST_PAGE_SIZE, RUN_MANIFEST_KEY, RUN_INDEX_CACHE_PATH, RUN_INDEX_MAX_RETRIES)
+from ec2_s3_managment.logger_config import logger
+
+# S3 answers with these codes when a conditional write loses the race
+CONDITIONAL_WRITE_ERRORS = ('PreconditionFailed', 'ConditionalRequestConflict')
+
+
+class RunIndexAllocatorClass:
+    """
+    Allocates Output_N indexes using a small manifest object in the bucket root instead of
+    listing every Output_i folder.
+
+    Manifest (RUN_MANIFEST_KEY):
+        {"latest_index": 7, "latest_completed_index": 6}
+        latest_index            - last allocated run index (run may still be training)
+        latest_completed_index  - last run whose model was uploaded, this is what we download
+
+    Every update is a conditional put_object (IfMatch=<etag we read>, or IfNoneMatch='*' when the
+    manifest is created), so when many EC2 workers start at once only one of them can take
+    each index, the others get PreconditionFailed, re-read the manifest and try the next index.
+
+    The last seen manifest and its ETag are cached localy (RUN_INDEX_CACHE_PATH), so on a warm
+    cache allocation is a single conditional put, otherwise it is one get + one put.
+    Bucket history does not matter - except once, when the manifest does not exist yet and
+    it is seeded from a (paginated) scan of existing Output_i folders.
+
+    Example usage:
+        allocator = RunIndexAllocatorClass(s3_client, S3_BUCKET_NAME)
+        run_index = allocator.allocate()                  # 5 -> upload to Output_5
+        allocator.mark_completed(run_index)               # model uploaded
+        allocator.get_latest_completed_index()            # 5
+    """
+    def __init__(self, s3_client, bucket_name, cache_path=RUN_INDEX_CACHE_PATH):
+        self.s3_client = s3_client
+        self.bucket_name = bucket_name
+        self.cache_path = cache_path
+
+    # local cache of the manifest
+    def _read_cache(self):
+        try:
+            with open(self.cache_path, "r") as file:
+                cache = json.load(file)
+        except (OSError, ValueError):
+            return None
+        if cache.get("bucket") != self.bucket_name:
+            return None
+        return cache["manifest"], cache["etag"]
+
+    def _write_cache(self, manifest, etag):
+        cache_dir = os.path.dirname(self.cache_path)
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = self.cache_path + ".tmp"
+        with open(tmp_path, "w") as file:
+            json.dump({"bucket": self.bucket_name, "manifest": manifest, "etag": etag}, file)
+        os.replace(tmp_path, self.cache_path)
+
+    # manifest in S3
+    def _read_manifest(self):
+        """
+        Returns:
+            tuple: (manifest dict, etag), (None, None) if manifest does not exist yet
+        """
+        try:
+            response = self.s3_client.get_object(Bucket=self.bucket_name, Key=RUN_MANIFEST_KEY)
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('NoSuchKey', '404'):
+                return None, None
+            raise
+        manifest = json.loads(response['Body'].read())
+        return manifest, response['ETag']
+
+    def _conditional_put(self, manifest, etag):
+        """
+        Writes manifest only if nobody changed it since we read it (etag None = must not exist)
+
+        Returns:
+            str: ETag of the new manifest, None if we lost the race
+        """
+        condition = {'IfMatch': etag} if etag is not None else {'IfNoneMatch': '*'}
+        try:
+            response = self.s3_client.put_object(
+                Bucket=self.bucket_name,
+                Key=RUN_MANIFEST_KEY,
+                Body=json.dumps(manifest).encode('utf-8'),
+                ContentType='application/json',
+                **condition
+            )
+        except ClientError as e:
+            # NoSuchKey - manifest we had cached was deleted, re-read it
+            if e.response['Error']['Code'] in CONDITIONAL_WRITE_ERRORS + ('NoSuchKey',):
+                return None
+            raise
+        return response['ETag']
+
+    def scan_max_output_index(self):
+        """
+        Finds Output_i folder with the biggest index by listing all root folders of the bucket (all pages)
+
+        This is O(number of runs), it is only used to seed the manifest for buckets created before it existed
+        """
+        max_index, prefix_length = 0, len(S3_PREFIX)
+        list_kwargs = {'Bucket': self.bucket_name, 'Delimiter': '/', 'MaxKeys': LIST_PAGE_SIZE}
+        while True:
+            response = self.s3_client.list_objects_v2(**list_kwargs)
+            # Folders are returned as CommonPrefixes
+            for prefix in response.get('CommonPrefixes', []):
+                folder_name = prefix['Prefix']
+                if folder_name.startswith(S3_PREFIX + "_") and folder_name[prefix_length+1:-1].isdigit():
+                    max_index = max(int(folder_name[prefix_length+1:-1]), max_index)
+            if not response.get('IsTruncated'):
+                return max_index
+            list_kwargs['ContinuationToken'] = response['NextContinuationToken']
+
+    def _update_manifest(self, update_function):
+        """
+        Read - modify - conditional write loop
+
+        update_function(manifest) returns new manifest, manifest is None if it doesn't exist yet
+        Starts from the localy cached manifest, on conflict re-reads it from S3 and retries
+        """
+        state = self._read_cache()
+        for attempt in range(RUN_INDEX_MAX_RETRIES):
+            if state is None:
+                state = self._read_manifest()
+            manifest, etag = state
+
+            new_manifest = update_function(manifest)
+            new_etag = self._conditional_put(new_manifest, etag)
+            if new_etag is not None:
+                self._write_cache(new_manifest, new_etag)
+                return new_manifest
+
+            # somebody else updated the manifest first, short random backoff so workers spread out
+            state = None
+            time.sleep(random.uniform(0, 0.05 * 2 ** min(attempt, 5)))
+        raise RuntimeError(f"Failed to update {RUN_MANIFEST_KEY} after {RUN_INDEX_MAX_RETRIES} attempts")
+
+    def _seed_manifest(self):
+        max_index = self.scan_max_output_index()
+        logger.info(f"Creating {RUN_MANIFEST_KEY}, latest existing output index: {max_index}")
+        return {"latest_index": max_index, "latest_completed_index": max_index}
+
+    def allocate(self):
+        """
+        Reserves next run index, no other caller can get the same index
+
+        Returns:
+            int: index of the new Output_i folder
+        """
+        def next_index(manifest):
+            manifest = dict(manifest) if manifest is not None else self._seed_manifest()
+            manifest["latest_index"] += 1
+            return manifest
+
+        run_index = self._update_manifest(next_index)["latest_index"]
+        logger.info(f"Allocated run index {run_index}")
+        return run_index
+
+    def mark_completed(self, run_index):
+        """
+        Marks run as completed (model uploaded), latest_completed_index only moves forward
+        """
+        def complete(manifest):
+            manifest = dict(manifest) if manifest is not None else self._seed_manifest()
+            manifest["latest_index"] = max(manifest["latest_index"], run_index)
+            manifest["latest_completed_index"] = max(manifest["latest_completed_index"], run_index)
+            return manifest
+
+        self._update_manifest(complete)
+
+    def get_latest_completed_index(self):
+        """
+        Returns:
+            int: index of the newest completed run, 0 if there is none (single GET request)
+        """
+        manifest, etag = self._read_manifest()
+        if manifest is None:
+            return self.scan_max_output_index()
+        self._write_cache(manifest, etag)
+        return manifest["latest_completed_index"]
@@ -1,120 +1,288 @@
-import boto3
 from botocore.exceptions import ClientError
-import os
-from dotenv import load_dotenv
-import joblib
 import io
+import os
 import json
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 
 from ec2_s3_managment.ec2_s3_constants import (
-    S3_PREFIX, METRICS_FILENAME, LOGGER_FILENAME, MODEL_FILENAME, LOCAL_OUTPUT_PATH, LOGGER_OUT_PATH)
-from ec2_s3_managment.logger_config import logger
-load_dotenv(".env")
-S3_BUCKET_NAME = os.getenv('S3_BUCKET_NAME')
+    S3_PREFIX, METRICS_FILENAME, LOGGER_FILENAME, MODEL_FILENAME, LOCAL_OUTPUT_PATH, LOGGER_OUT_PATH,
+    MODEL_COMPRESSION, COMPACT_MODEL_FILENAME, EXPORT_COMPACT_MODEL, DOWNLOAD_MAX_WORKERS)
+from ec2_s3_managment.logger_config import logger, flush_logging
+from ec2_s3_managment.aws_session import get_client, get_bucket_name, get_local_root
+from ec2_s3_managment.s3_upload import S3MultipartWriterClass
+from ec2_s3_managment.s3_range_reader import S3RangeReaderClass
+from ec2_s3_managment.run_index import RunIndexAllocatorClass
+from ec2_s3_managment.tracing import tracer
+# joblib, boto3 and the download engine are imported where they are used - importing this module stays cheap
+
+def create_s3_client():
+    """
+    Returns local S3 stand-in if S3_LOCAL_ROOT is set, otherwise S3 client of the shared boto3 session
+    (see get_client) with connection pool big enough for all download workers
+    """
+    local_root = get_local_root()
+    if local_root:
+        from ec2_s3_managment.local_s3_client import LocalS3ClientClass
+        return LocalS3ClientClass(local_root)
+    return get_client('s3')
 
 class S3ManagerClass:
-    def __init__(self):
-        self.s3_client = boto3.client('s3')
-        self.download_index, self.download_possible = self.get_max_output_index()
-        self.upload_index = self.download_index + 1
-        self.s3_upload_root = f"{S3_PREFIX}_{self.upload_index}"
-        self.metrics_upload_path = self.s3_upload_root + f"/{METRICS_FILENAME}.json"
-        self.model_upload_path = self.s3_upload_root + f"/{MODEL_FILENAME}.joblib"
-        self.logger_upload_path = self.s3_upload_root + f"/{LOGGER_FILENAME}.log"
-        self.update_download_paths()
+    def __init__(self, s3_client=None, run_index=None):
+        """
+        run_index - upload to this (already allocated) Output_i folder, e.g. distributed training workers
+                    all write to the run index reserved by the coordinator
+
+        Nothing is requested from S3 here - client is created and the run manifest is read
+        the first time a path or the client is actually needed
+        """
+        self._s3_client = s3_client
+        self._run_index_allocator = None
+        self._upload_index = run_index # None - reserved on first upload, see upload_index
+        self._download_paths_loaded = False # see update_download_paths
+        self._uploaded_metrics = None # last metrics uploaded by this run, see upload_timings_to_s3
+        self.bucket_name = get_bucket_name()
+
+    @property
+    def s3_client(self):
+        if self._s3_client is None:
+            self._s3_client = create_s3_client()
+        return self._s3_client
+
+    @property
+    def run_index_allocator(self):
+        if self._run_index_allocator is None:
+            self._run_index_allocator = RunIndexAllocatorClass(self.s3_client, self.bucket_name)
+        return self._run_index_allocator
+
+    @property
+    def experiment_catalog(self):
+        from ec2_s3_managment.experiment_catalog import ExperimentCatalogClass
+        return ExperimentCatalogClass(self.s3_client, self.bucket_name)
+
+    @property
+    def upload_index(self):
+        """
+        Index of the Output_i folder this run uploads to
+
+        It is reserved in the run manifest the first time it is needed (see RunIndexAllocatorClass),
+        so two trainings started at the same time never get the same folder
+        """
+        if self._upload_index is None:
+            self._upload_index = self.run_index_allocator.allocate()
+        return self._upload_index
+
+    @staticmethod
+    def run_root(run_index):
+        return f"{S3_PREFIX}_{run_index}"
+
+    @property
+    def s3_upload_root(self):
+        return self.run_root(self.upload_index)
+
+    @property
+    def metrics_upload_path(self):
+        return self.s3_upload_root + f"/{METRICS_FILENAME}.json"
+
+    @property
+    def model_upload_path(self):
+        return self.s3_upload_root + f"/{MODEL_FILENAME}.joblib"
+
+    @property
+    def compact_model_upload_path(self):
+        return self.s3_upload_root + f"/{COMPACT_MODEL_FILENAME}.bin"
+
+    @property
+    def logger_upload_path(self):
+        return self.s3_upload_root + f"/{LOGGER_FILENAME}.log"
     
     def update_download_paths(self):
-        self.download_index, self.download_possible = self.get_max_output_index()
-        self.s3_download_root = f"{S3_PREFIX}_{self.download_index}" if self.download_possible else "not_possible"
-        self.model_download_path = self.s3_download_root + f"/{MODEL_FILENAME}.joblib"
-        self.metrics_download_path = self.s3_download_root + f"/{METRICS_FILENAME}.json"
-        self.logger_download_path = self.s3_download_root + f"/{LOGGER_FILENAME}.log"
+        """
+        Reads the newest completed run from the run manifest - download paths below point to it.
+        Called automaticaly on first access of a download path, call it again to refresh
+        """
+        self._download_index, self._download_possible = self.get_max_output_index()
+        self._download_paths_loaded = True
+
+    def _download_paths(self):
+        if not self._download_paths_loaded:
+            self.update_download_paths()
+        return self._download_index, self._download_possible
+
+    @property
+    def download_index(self):
+        return self._download_paths()[0]
+
+    @property
+    def download_possible(self):
+        return self._download_paths()[1]
+
+    @property
+    def s3_download_root(self):
+        return self.run_root(self.download_index) if self.download_possible else "not_possible"
+
+    @property
+    def model_download_path(self):
+        return self.s3_download_root + f"/{MODEL_FILENAME}.joblib"
+
+    @property
+    def metrics_download_path(self):
+        return self.s3_download_root + f"/{METRICS_FILENAME}.json"
+
+    @property
+    def logger_download_path(self):
+        return self.s3_download_root + f"/{LOGGER_FILENAME}.log"
 
     def get_max_output_index(self):
         """
         If last folder_name where we dumped our model and metrics was: Output_3, automaticaly
         new folder Output_4 will be created when we want to save new model and metrics...
 
-        this function just finds Output_i name with biggest index, and returns it
+        this function returns index of the newest completed Output_i folder, read from the
+        run manifest in a single request (bucket is not listed)
         """
         try:
-            response = self.s3_client.list_objects_v2(
-                Bucket=S3_BUCKET_NAME,
-                Delimiter='/'
-            )
-            
-            # Folders are returned as CommonPrefixes
-            root_folders = []
-            if 'CommonPrefixes' in response:
-                for prefix in response['CommonPrefixes']:
-                    root_folders.append(prefix['Prefix'])
-            
-            max_index, prefix_length = 0, len(S3_PREFIX)
-
-            for folder_name in root_folders:
-                if folder_name.startswith(S3_PREFIX + "_"):
-                    
-                    max_index = max(int(folder_name[prefix_length+1:-1]), max_index)
+            max_index = self.run_index_allocator.get_latest_completed_index()
             return max_index, max_index != 0
 
         except ClientError as e:
-            print(f"Error listing root contents of the bucket: {e}")
+            print(f"Error reading run manifest of the bucket: {e}")
             raise
 
     def upload_single_file(self, local_file_path, s3_path):
         try:
             self.s3_client.upload_file(
                 Filename=local_file_path,  #local path
-                Bucket=S3_BUCKET_NAME,  
+                Bucket=self.bucket_name,  
                 Key=self.s3_upload_root + "/" + s3_path  # S3 path
             )
         except Exception as e:
             print(f"Error uploading file: {e}")
             raise
     
-    def upload_model_to_s3(self, model):
-        try:    
-            model_buffer = io.BytesIO()
-            joblib.dump(model, model_buffer)
-            model_buffer.seek(0) 
-            
-            # Upload the model directly from memory to S3
-            logger.info(f"Uploading model to S3 bucket {S3_BUCKET_NAME}, key: {self.s3_upload_root}/{MODEL_FILENAME}")
-            self.s3_client.upload_fileobj(
-                model_buffer, 
-                S3_BUCKET_NAME, 
-                self.model_upload_path
-            )
-            logger.info(f"Successfully uploaded to s3://{S3_BUCKET_NAME}/{self.s3_upload_root}")
+    def upload_compact_model_to_s3(self, model):
+        """
+        Uploads array-backed copy of the forest (see CompactForestClass) next to model.joblib
+
+        Returns:
+            dict: upload statistics, None if model can't be exported or on error
+        """
+        # model package is only needed here
+        from model.compact_forest import CompactForestClass
+        try:
+            compact_model = CompactForestClass.from_sklearn(model)
+        except (AttributeError, ValueError) as e:
+            logger.info(f"Model is not exported in compact format: {e}")
+            return None
+        try:
+            with S3MultipartWriterClass(self.s3_client, self.bucket_name, self.compact_model_upload_path) as model_writer:
+                compact_model.save(model_writer)
+            return model_writer.stats
+        except Exception as e:
+            print(f"Error uploading compact model to S3: {e}")
+            return None
+
+    def upload_model_to_s3(self, model, compress=MODEL_COMPRESSION, export_compact=EXPORT_COMPACT_MODEL):
+        """
+        Serializes model straight into S3 multipart upload (see S3MultipartWriterClass)
+
+        joblib writes into a fixed-size buffer which is uploaded part by part, so the serialized
+        model is never fully in memory - peak memory doesn't depend on model size.
+        compress (e.g. ("zlib", 3)) compresses on the fly, joblib.load detects it automaticaly.
+        With export_compact the forest is also uploaded in compact format (model_compact.bin).
+
+        Returns:
+            dict: upload statistics (bytes, parts, seconds, bytes_per_sec), None on error
+        """
+        import joblib
+        try:
+            logger.info(f"Uploading model to S3 bucket {self.bucket_name}, key: {self.model_upload_path}")
+            with tracer.span("upload_model"):
+                with S3MultipartWriterClass(self.s3_client, self.bucket_name, self.model_upload_path) as model_writer:
+                    joblib.dump(model, model_writer, compress=compress if compress is not None else 0)
+                logger.info(f"Successfully uploaded to s3://{self.bucket_name}/{self.s3_upload_root}")
+                if export_compact:
+                    self.upload_compact_model_to_s3(model)
+
+            # model is there - this run can now be downloaded as the newest one
+            self.run_index_allocator.mark_completed(self.upload_index)
+            self.record_in_catalog(model)
+            return model_writer.stats
         except Exception as e:
             print(f"Error uploading model to S3: {e}")
             return None
         
+    def record_in_catalog(self, model=None):
+        """
+        Adds this run to the experiment catalog (see ExperimentCatalogClass) - metrics uploaded by this
+        manager with timings so far, sizes of files in the run folder, hyperparameters of model
+        """
+        if self._uploaded_metrics is None:
+            return None
+        from ec2_s3_managment.experiment_catalog import catalog_entry
+        try:
+            entry = catalog_entry(
+                self.upload_index,
+                {**self._uploaded_metrics, "timings": tracer.summary()},
+                self.experiment_catalog.run_artifacts(self.upload_index),
+                model.get_params() if hasattr(model, "get_params") else None,
+            )
+            self.experiment_catalog.record([entry])
+            return entry
+        except Exception as e:
+            print(f"Error recording run in experiment catalog: {e}")
+            return None
+
     def upload_metrics_to_s3(self, metrics_dict):
+        """
+        metrics.json gets "timings" section - spans of this process so far (see TracerClass)
+        """
         try:
             # Convert the metrics dictionary to a JSON string then to bytes
-            logger.info(f"Uploading metrics to S3 bucket {S3_BUCKET_NAME}, key: {self.metrics_upload_path}")
-            metrics_data = json.dumps(metrics_dict, indent=4).encode('utf-8')
-            
-            # Upload the metrics directly to S3
-            self.s3_client.put_object(
-                Body=metrics_data,
-                Bucket=S3_BUCKET_NAME,
-                Key=self.metrics_upload_path
-            )
+            logger.info(f"Uploading metrics to S3 bucket {self.bucket_name}, key: {self.metrics_upload_path}")
+            with tracer.span("upload_metrics"):
+                metrics_data = json.dumps({**metrics_dict, "timings": tracer.summary()}, indent=4).encode('utf-8')
+
+                # Upload the metrics directly to S3
+                self.s3_client.put_object(
+                    Body=metrics_data,
+                    Bucket=self.bucket_name,
+                    Key=self.metrics_upload_path
+                )
+                tracer.add_bytes(len(metrics_data))
+            self._uploaded_metrics = metrics_dict
             logger.info(f"Uploading succesfull")
             
         except Exception as e:
             print(f"Error uploading metrics to S3: {e}")
             return None
+
+    def upload_timings_to_s3(self):
+        """
+        Uploads metrics.json again with current timings - metrics are uploaded before the model,
+        so the first upload doesn't contain timings of the model upload
+        """
+        if self._uploaded_metrics is not None:
+            self.upload_metrics_to_s3(self._uploaded_metrics)
         
-    def upload_log_to_s3(self):
+    def upload_log_to_s3(self, log_filename=None):
+        """
+        log_filename - name of the log in the run folder, default logger.log
+        """
+        # logging was never configured (configure_logging) - there is no log to upload
+        if not os.path.isfile(LOGGER_OUT_PATH):
+            logger.warning(f"No log file {LOGGER_OUT_PATH} to upload, configure_logging() was not called")
+            return None
         try:
-            self.s3_client.upload_file(
-                LOGGER_OUT_PATH,
-                S3_BUCKET_NAME,
-                self.logger_upload_path
-            )
+            # records still queued for the logging thread belong to the log
+            flush_logging()
+            with tracer.span("upload_log"):
+                self.s3_client.upload_file(
+                    LOGGER_OUT_PATH,
+                    self.bucket_name,
+                    self.logger_upload_path if log_filename is None else self.s3_upload_root + "/" + log_filename
+                )
+                tracer.add_bytes(os.path.getsize(LOGGER_OUT_PATH))
 
         except Exception as e:
             print(f"Error uploading log to S3: {e}")
@@ -124,6 +292,12 @@ class S3ManagerClass:
     def download_experiment_files_from_s3(self):
         """
         downloads all files from last created folder with model and metrics in S3_BUCKET_NAME bucket
+
+        all pages of the folder are listed and files are downloaded in parallel (see S3DownloadEngineClass),
+        files already in the local artifact cache (same ETag and size) are not downloaded again
+
+        Returns:
+            dict: download statistics (files, bytes, seconds, bytes_per_sec), None if there is nothing to download
         """
         self.update_download_paths()
         if not self.download_possible:
@@ -133,44 +307,122 @@ class S3ManagerClass:
         os.makedirs(LOCAL_OUTPUT_PATH, exist_ok=True) # Create the local folder if it doesn't exist
         print("LOCAL_OUTPUT_PATH: ", LOCAL_OUTPUT_PATH)
 
-        response = self.s3_client.list_objects_v2(
-            Bucket=S3_BUCKET_NAME,
-            Prefix=self.s3_download_root
-        )
-        os.makedirs(LOCAL_OUTPUT_PATH + "/" + S3_PREFIX + "_" + str(self.download_index), exist_ok=True)
-
-        for obj in response['Contents']:
-            # Get the S3 key (full path in S3)
-            s3_key = obj['Key']
-            print("response: ", s3_key)
-            
-            # Create the local file path
-            local_path = LOCAL_OUTPUT_PATH + "/" + s3_key
-            print("local_path: ", local_path)
+        from ec2_s3_managment.s3_download import S3DownloadEngineClass
+        from ec2_s3_managment.artifact_cache import ArtifactCacheClass
 
-            
-            print(f"Downloading {s3_key} to {local_path}...")
-            # Download the file
-            self.s3_client.download_file(
-                S3_BUCKET_NAME,
-                s3_key,
-                local_path
-            )
+        # trailing "/" - Output_3 must not match Output_31
+        download_engine = S3DownloadEngineClass(self.s3_client, self.bucket_name, artifact_cache=ArtifactCacheClass())
+        with tracer.span("download"):
+            stats = download_engine.download_prefix(self.s3_download_root + "/", LOCAL_OUTPUT_PATH)
+            tracer.add_bytes(stats["downloaded_bytes"])
+        return stats
     
     
+    # selective loading - artifacts of any run straight from S3, nothing is written to disk
+    def artifact_key(self, name, run_index=None):
+        """
+        name - file name in the run folder, e.g. "metrics.json", "logger.log", "sweep/candidate_0.json"
+        run_index - Output_<run_index>, None - newest completed run (one manifest GET, the bucket is not listed)
+        """
+        if run_index is None:
+            if not self.download_possible:
+                raise FileNotFoundError(f"No completed run in bucket {self.bucket_name}")
+            run_index = self.download_index
+        return self.run_root(run_index) + "/" + name
+
+    @contextmanager
+    def open_artifact(self, name, run_index=None):
+        """
+        Yields buffered file object of the artifact - ranged GETs fetched in parallel and read
+        while they arrive (see S3RangeReaderClass), the object is never fully in memory or on disk
+        """
+        with S3RangeReaderClass(self.s3_client, self.bucket_name, self.artifact_key(name, run_index)) as raw_reader:
+            yield io.BufferedReader(raw_reader, buffer_size=1024 * 1024)
+
+    def fetch_artifacts(self, names, run_index=None):
+        """
+        Fetches chosen small artifacts of one run in parallel, one GET each
+
+        Returns:
+            dict: name -> bytes, None for artifacts the run doesn't have
+        """
+        keys = {name: self.artifact_key(name, run_index) for name in names}
+
+        def fetch(name):
+            try:
+                return self.s3_client.get_object(Bucket=self.bucket_name, Key=keys[name])['Body'].read()
+            except ClientError as e:
+                if e.response['Error']['Code'] in ('NoSuchKey', '404'):
+                    return None
+                raise
+
+        with ThreadPoolExecutor(max_workers=min(DOWNLOAD_MAX_WORKERS, max(len(keys), 1))) as executor:
+            artifacts = dict(zip(keys, executor.map(fetch, keys)))
+        tracer.add_bytes(sum(len(data) for data in artifacts.values() if data is not None))
+        return artifacts
+
+    def load_metrics(self, run_index=None):
+        """
+        Returns:
+            dict: metrics.json of the run, None if the run has no metrics
+        """
+        data = self.fetch_artifacts([f"{METRICS_FILENAME}.json"], run_index)[f"{METRICS_FILENAME}.json"]
+        return json.loads(data) if data is not None else None
+
+    def load_joblib(self, name, run_index=None):
+        """
+        Deserializes a joblib artifact while it is streamed from S3 (compressed ones too)
+        """
+        import joblib
+        with self.open_artifact(name, run_index) as artifact:
+            return joblib.load(artifact)
+
+    def load_model(self, run_index=None, compact=False):
+        """
+        Loads model of any run straight from S3 into memory - no download_experiment_files_from_s3,
+        no LocalOutput files, no other artifact is fetched
+
+        compact=True - model_compact.bin (see CompactForestClass), arrays are views of the fetched bytes
+
+        Example usage:
+            model = S3ManagerClass().load_model()                 # newest completed run
+            model = S3ManagerClass().load_model(run_index=3)      # Output_3
+        """
+        with tracer.span("load_model"):
+            if compact:
+                from model.compact_forest import CompactForestClass
+                with self.open_artifact(f"{COMPACT_MODEL_FILENAME}.bin", run_index) as artifact:
+                    data = artifact.read()
+                tracer.add_bytes(len(data))
+                return CompactForestClass.from_bytes(data)
+            return self.load_joblib(f"{MODEL_FILENAME}.joblib", run_index)
+
     def load_model_localy(self):
-        loaded_model = joblib.load(LOCAL_OUTPUT_PATH + "/" + S3_PREFIX + "_" + str(self.download_index)+ "/" + MODEL_FILENAME + ".joblib")
+        import joblib
+        with tracer.span("load_model"):
+            loaded_model = joblib.load(LOCAL_OUTPUT_PATH + "/" + S3_PREFIX + "_" + str(self.download_index)+ "/" + MODEL_FILENAME + ".joblib")
         return loaded_model
 
+    def load_compact_model_localy(self, mmap=True):
+        """
+        Memory-maps downloaded model_compact.bin (see CompactForestClass), loads in milliseconds
+        """
+        from model.compact_forest import CompactForestClass
+        return CompactForestClass.load(LOCAL_OUTPUT_PATH + "/" + S3_PREFIX + "_" + str(self.download_index) + "/" + COMPACT_MODEL_FILENAME + ".bin", mmap=mmap)
+
     def __str__(self):
         output_string = f"self.download_index: {self.download_index}\n"
         output_string += f"self.download_possible: {self.download_possible}\n"
-        output_string += f"self.upload_index: {self.upload_index}\n"
-        output_string += f"self.s3_upload_root: {self.s3_upload_root}\n"
         output_string += f"self.s3_download_root {self.s3_download_root}\n"
-        output_string += f"self.metrics_upload_path: {self.metrics_upload_path}\n"
-        output_string += f"self.model_upload_path: {self.model_upload_path}\n"
-        output_string += f"self.logger_upload_path: {self.logger_upload_path}\n"
+        # printing must not reserve a run index
+        if self._upload_index is None:
+            output_string += "self.upload_index: not allocated yet\n"
+        else:
+            output_string += f"self.upload_index: {self.upload_index}\n"
+            output_string += f"self.s3_upload_root: {self.s3_upload_root}\n"
+            output_string += f"self.metrics_upload_path: {self.metrics_upload_path}\n"
+            output_string += f"self.model_upload_path: {self.model_upload_path}\n"
+            output_string += f"self.logger_upload_path: {self.logger_upload_path}\n"
         output_string += f"self.metrics_download_path: {self.metrics_download_path}\n"
         output_string += f"self.model_download_path: {self.model_download_path}\n"
         output_string += f"self.logger_download_path: {self.logger_download_path}\n"
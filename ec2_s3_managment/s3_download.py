@@ -0,0 +1,114 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from boto3.s3.transfer import TransferConfig
+
+from ec2_s3_managment.ec2_s3_constants import DOWNLOAD_MAX_WORKERS, LIST_PAGE_SIZE
+from ec2_s3_managment.logger_config import logger
+
+
+class S3DownloadEngineClass:
+    """
+    Downloads every object under an S3 prefix using a bounded pool of worker threads.
+
+    1. Pages through the whole prefix with list_objects_v2 (ContinuationToken), so nothing
+       after the first 1000 keys is dropped
+    2. Downloads objects concurrently, at most max_workers at a time
+    3. All workers use the same s3_client - boto3 clients are thread safe and share one
+       connection pool (sized with max_pool_connections when the client is created)
+    4. Reports number of files, bytes and bytes/sec
+    5. Optionaly uses ArtifactCacheClass - objects with known (ETag, Size) are linked from the
+       local cache instead of downloaded, so a repeated download costs only the listing request
+
+    Example usage:
+        engine = S3DownloadEngineClass(s3_client, S3_BUCKET_NAME)
+        stats = engine.download_prefix("Output_3/", "LocalOutput")
+    """
+    def __init__(self, s3_client, bucket_name, max_workers=DOWNLOAD_MAX_WORKERS, artifact_cache=None):
+        self.s3_client = s3_client
+        self.bucket_name = bucket_name
+        self.max_workers = max_workers
+        self.artifact_cache = artifact_cache
+        # one object = one worker, s3transfer must not spawn extra threads per file
+        self.transfer_config = TransferConfig(use_threads=False)
+
+    def list_objects(self, prefix):
+        """
+        Yields every object (dict with Key, Size, ETag...) under prefix, one page at a time
+        """
+        list_kwargs = {'Bucket': self.bucket_name, 'Prefix': prefix, 'MaxKeys': LIST_PAGE_SIZE}
+        while True:
+            response = self.s3_client.list_objects_v2(**list_kwargs)
+            for obj in response.get('Contents', []):
+                yield obj
+            if not response.get('IsTruncated'):
+                break
+            list_kwargs['ContinuationToken'] = response['NextContinuationToken']
+
+    def _download_object(self, obj, local_root):
+        """
+        Returns:
+            tuple: (size, downloaded) - downloaded is False if the file came from the artifact cache
+        """
+        s3_key = obj['Key']
+        local_path = os.path.join(local_root, *s3_key.split("/"))
+        os.makedirs(os.path.dirname(local_path), exist_ok=True)
+
+        if self.artifact_cache is None:
+            self.s3_client.download_file(self.bucket_name, s3_key, local_path, Config=self.transfer_config)
+            return obj['Size'], True
+
+        if self.artifact_cache.materialize(obj, local_path):
+            return obj['Size'], False
+
+        download_path = self.artifact_cache.new_download_path()
+        self.s3_client.download_file(self.bucket_name, s3_key, download_path, Config=self.transfer_config)
+        if not self.artifact_cache.add(obj, download_path):
+            # bigger than the whole cache budget - keep it only in local_root
+            os.replace(download_path, local_path)
+        elif not self.artifact_cache.materialize(obj, local_path, count_access=False):
+            # evicted by another worker in the meantime
+            self.s3_client.download_file(self.bucket_name, s3_key, local_path, Config=self.transfer_config)
+        return obj['Size'], True
+
+    def download_objects(self, objects, local_root):
+        """
+        Downloads given objects (as returned by list_objects) to local_root/<key>
+
+        Returns:
+            dict: files, bytes, seconds and bytes_per_sec of the transfer
+        """
+        start_time = time.perf_counter()
+        total_bytes, total_files, downloaded_bytes, downloaded_files = 0, 0, 0, 0
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for size, downloaded in executor.map(lambda obj: self._download_object(obj, local_root), objects):
+                total_bytes += size
+                total_files += 1
+                if downloaded:
+                    downloaded_bytes += size
+                    downloaded_files += 1
+        seconds = time.perf_counter() - start_time
+
+        stats = {
+            "files": total_files,
+            "bytes": total_bytes,
+            "downloaded_files": downloaded_files,
+            "downloaded_bytes": downloaded_bytes,
+            "seconds": seconds,
+            "bytes_per_sec": total_bytes / seconds if seconds > 0 else 0.0,
+        }
+        logger.info(
+            f"Downloaded {total_files} files, {total_bytes} bytes in {seconds:.2f}s "
+            f"({stats['bytes_per_sec'] / 1e6:.2f} MB/s, {self.max_workers} workers), "
+            f"{downloaded_files} files / {downloaded_bytes} bytes transferred from S3"
+        )
+        if self.artifact_cache is not None:
+            self.artifact_cache.flush()
+        return stats
+
+    def download_prefix(self, prefix, local_root):
+        """
+        Lists and downloads all objects under prefix, keeps S3 folder structure under local_root
+        """
+        return self.download_objects(list(self.list_objects(prefix)), local_root)
@@ -0,0 +1,132 @@
+import io
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from ec2_s3_managment.ec2_s3_constants import RANGE_BLOCK_SIZE, RANGE_READ_WORKERS
+from ec2_s3_managment.tracing import tracer
+from ec2_s3_managment.logger_config import logger
+
+
+def is_s3_uri(path):
+    return isinstance(path, str) and path.startswith("s3://")
+
+
+def parse_s3_uri(uri):
+    """
+    "s3://bucket/folder/file.csv" -> ("bucket", "folder/file.csv")
+    """
+    bucket_name, _, key = uri[len("s3://"):].partition("/")
+    if not bucket_name or not key:
+        raise ValueError(f"Invalid S3 uri: {uri}, expected s3://bucket/key")
+    return bucket_name, key
+
+
+class S3RangeReaderClass(io.RawIOBase):
+    """
+    Read-only, seekable file object over an S3 object, fetched with parallel byte-range GETs.
+
+    The object is split into blocks of block_size bytes. Reading block i schedules blocks
+    i .. i + prefetch_blocks on a thread pool, so while the caller (e.g. csv parser) works on
+    one block, the next ones are already downloading - download and parsing overlap.
+    Blocks behind the read position are dropped, memory is bounded by prefetch_blocks * block_size.
+
+    Every ranged GET uses IfMatch=<ETag from head_object>, so if the object is overwritten
+    while it is being read, the read fails instead of mixing two versions.
+
+    Example usage:
+        with S3RangeReaderClass(s3_client, "bucket", "data/train.csv") as raw:
+            data = pd.read_csv(io.BufferedReader(raw), chunksize=100_000)
+    """
+    def __init__(self, s3_client, bucket_name, key, block_size=RANGE_BLOCK_SIZE, max_workers=RANGE_READ_WORKERS, prefetch_blocks=None):
+        super().__init__()
+        self.s3_client = s3_client
+        self.bucket_name = bucket_name
+        self.key = key
+        self.block_size = block_size
+        self.prefetch_blocks = prefetch_blocks or 2 * max_workers
+
+        head = s3_client.head_object(Bucket=bucket_name, Key=key)
+        self.size = head['ContentLength']
+        self.etag = head['ETag']
+        self.n_blocks = (self.size + block_size - 1) // block_size
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._blocks = {} # block index -> future with block bytes
+        self._position = 0
+        self._start_time = time.perf_counter()
+        self._bytes_lock = threading.Lock() # blocks are fetched on pool threads
+        self.bytes_fetched = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._position + offset
+        elif whence == io.SEEK_END:
+            position = self.size + offset
+        else:
+            raise ValueError(f"invalid whence ({whence})")
+        if position < 0:
+            raise ValueError(f"negative seek position {position}")
+        self._position = position
+        return position
+
+    def _fetch_block(self, block_index):
+        start = block_index * self.block_size
+        end = min(start + self.block_size, self.size) - 1
+        response = self.s3_client.get_object(
+            Bucket=self.bucket_name,
+            Key=self.key,
+            Range=f"bytes={start}-{end}",
+            IfMatch=self.etag
+        )
+        data = response['Body'].read()
+        with self._bytes_lock:
+            self.bytes_fetched += len(data)
+        return data
+
+    def _schedule(self, first_block):
+        last_block = min(first_block + self.prefetch_blocks, self.n_blocks)
+        for block_index in list(self._blocks):
+            if block_index < first_block or block_index >= last_block:
+                self._blocks.pop(block_index).cancel()
+        for block_index in range(first_block, last_block):
+            if block_index not in self._blocks:
+                self._blocks[block_index] = self._executor.submit(self._fetch_block, block_index)
+
+    def readinto(self, buffer):
+        if self._position >= self.size:
+            return 0
+        block_index = self._position // self.block_size
+        self._schedule(block_index)
+        data = self._blocks[block_index].result()
+
+        offset = self._position - block_index * self.block_size
+        size = min(len(buffer), len(data) - offset)
+        buffer[:size] = data[offset:offset + size]
+        self._position += size
+        return size
+
+    def close(self):
+        if self.closed:
+            return
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        self._blocks = {}
+        super().close()
+        tracer.add_bytes(self.bytes_fetched)
+
+        seconds = time.perf_counter() - self._start_time
+        logger.info(
+            f"Read s3://{self.bucket_name}/{self.key}: {self.bytes_fetched} bytes in {seconds:.2f}s "
+            f"({self.bytes_fetched / seconds / 1e6 if seconds > 0 else 0.0:.2f} MB/s)"
+        )
@@ -0,0 +1,144 @@
+import io
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from ec2_s3_managment.ec2_s3_constants import UPLOAD_PART_SIZE
+from ec2_s3_managment.tracing import tracer
+from ec2_s3_managment.logger_config import logger
+
+
+class S3MultipartWriterClass(io.RawIOBase):
+    """
+    Writable file object that streams everything written to it into an S3 multipart upload.
+
+    Data is collected in one fixed-size buffer (part_size), every full buffer is sent as one part
+    by a background thread while the caller keeps writing - at most one part is in flight.
+    Memory usage is therefore ~3 * part_size, no matter how much data is written.
+
+    If less than one part was written, a single put_object is used instead of multipart upload.
+    If anything fails, the multipart upload is aborted so S3 doesn't keep (and bill) orphan parts.
+
+    Example usage:
+        with S3MultipartWriterClass(s3_client, S3_BUCKET_NAME, "Output_3/model.joblib") as writer:
+            joblib.dump(model, writer)
+        print(writer.stats)
+    """
+    def __init__(self, s3_client, bucket_name, key, part_size=UPLOAD_PART_SIZE):
+        super().__init__()
+        self.s3_client = s3_client
+        self.bucket_name = bucket_name
+        self.key = key
+        self.part_size = part_size
+
+        self._buffer = bytearray(part_size)
+        self._buffer_fill = 0
+        self._upload_id = None
+        self._parts = []
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._pending_part = None
+        self._start_time = time.perf_counter()
+        self.bytes_written = 0
+        self.stats = None
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        data = memoryview(data).cast("B")
+        position = 0
+        while position < len(data):
+            chunk_size = min(self.part_size - self._buffer_fill, len(data) - position)
+            self._buffer[self._buffer_fill:self._buffer_fill + chunk_size] = data[position:position + chunk_size]
+            self._buffer_fill += chunk_size
+            position += chunk_size
+            if self._buffer_fill == self.part_size:
+                self._flush_part()
+        self.bytes_written += len(data)
+        return len(data)
+
+    def _upload_part(self, part_number, body):
+        response = self.s3_client.upload_part(
+            Bucket=self.bucket_name,
+            Key=self.key,
+            UploadId=self._upload_id,
+            PartNumber=part_number,
+            Body=body
+        )
+        return {'ETag': response['ETag'], 'PartNumber': part_number}
+
+    def _wait_for_pending_part(self):
+        if self._pending_part is not None:
+            self._parts.append(self._pending_part.result())
+            self._pending_part = None
+
+    def _flush_part(self):
+        if self._upload_id is None:
+            response = self.s3_client.create_multipart_upload(Bucket=self.bucket_name, Key=self.key)
+            self._upload_id = response['UploadId']
+
+        # copy out of the buffer so it can be refilled while this part is uploading
+        body = bytes(self._buffer[:self._buffer_fill])
+        self._buffer_fill = 0
+        self._wait_for_pending_part()
+        part_number = len(self._parts) + 1
+        self._pending_part = self._executor.submit(self._upload_part, part_number, body)
+
+    def abort(self):
+        """
+        Drops everything uploaded so far
+        """
+        if self._pending_part is not None:
+            self._pending_part.cancel()
+            self._pending_part = None
+        self._executor.shutdown(wait=True)
+        if self._upload_id is not None:
+            self.s3_client.abort_multipart_upload(Bucket=self.bucket_name, Key=self.key, UploadId=self._upload_id)
+            self._upload_id = None
+        super().close()
+
+    def close(self):
+        """
+        Uploads what is left in the buffer and completes the upload
+        """
+        if self.closed:
+            return
+        try:
+            if self._upload_id is None:
+                # everything fits in one part - plain put_object
+                self.s3_client.put_object(Bucket=self.bucket_name, Key=self.key, Body=bytes(self._buffer[:self._buffer_fill]))
+            else:
+                if self._buffer_fill > 0:
+                    self._flush_part()
+                self._wait_for_pending_part()
+                self.s3_client.complete_multipart_upload(
+                    Bucket=self.bucket_name,
+                    Key=self.key,
+                    UploadId=self._upload_id,
+                    MultipartUpload={'Parts': self._parts}
+                )
+        except Exception:
+            self.abort()
+            raise
+        self._executor.shutdown(wait=True)
+        self._buffer = None
+        super().close()
+        tracer.add_bytes(self.bytes_written)
+
+        seconds = time.perf_counter() - self._start_time
+        self.stats = {
+            "bytes": self.bytes_written,
+            "parts": max(len(self._parts), 1),
+            "seconds": seconds,
+            "bytes_per_sec": self.bytes_written / seconds if seconds > 0 else 0.0,
+        }
+        logger.info(
+            f"Uploaded {self.bytes_written} bytes to {self.key} in {self.stats['parts']} part(s), "
+            f"{seconds:.2f}s ({self.stats['bytes_per_sec'] / 1e6:.2f} MB/s)"
+        )
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.abort()
+            return False
+        self.close()
+        return False
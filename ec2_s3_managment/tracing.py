@@ -0,0 +1,186 @@
+import os
+import sys
+import time
+import resource
+import threading
+from functools import wraps
+from contextlib import contextmanager
+
+from ec2_s3_managment.ec2_s3_constants import TRACE_SAMPLE_INTERVAL
+from ec2_s3_managment.logger_config import logger
+
+
+def current_rss_mb():
+    try:
+        with open("/proc/self/statm") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except OSError:
+        # no procfs (macOS) - peak of the whole process so far
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1e6 if sys.platform == "darwin" else 1e3)
+
+
+class PeakRssSamplerClass:
+    """
+    Samples RSS of this process every interval seconds on a background thread, peak is reset with reset()
+
+    Example usage:
+        with PeakRssSamplerClass() as rss_sampler:
+            rss_sampler.reset()
+            ...
+            print(rss_sampler.peak_mb)
+    """
+    def __init__(self, interval=TRACE_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.peak_mb = current_rss_mb()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak_mb = max(self.peak_mb, current_rss_mb())
+
+    def reset(self):
+        self.peak_mb = current_rss_mb()
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+
+class SpanClass:
+    def __init__(self, name):
+        self.name = name
+        self.wall_seconds = 0.0
+        self.cpu_seconds = 0.0
+        self.peak_rss_mb = current_rss_mb()
+        self.bytes = 0
+
+
+class TracerClass:
+    """
+    Lightweight per-stage instrumentation - wall time, CPU time (all threads of the process),
+    peak RSS and bytes moved of every span.
+
+    Spans can be nested (peak RSS and bytes of a child count for the parent too), while any span
+    is open RSS is sampled every sample_interval seconds on one background thread.
+    Spans with the same name are aggregated, summary() is the "timings" section of metrics.json.
+
+    Example usage:
+        with tracer.span("load_training_data"):
+            ...
+            tracer.add_bytes(os.path.getsize(path))
+
+        @traced("train_model")
+        def train_model(self, X_train, y_train):
+            ...
+    """
+    def __init__(self, sample_interval=TRACE_SAMPLE_INTERVAL):
+        self.sample_interval = sample_interval
+        self._lock = threading.Lock()
+        self._open_spans = []
+        self._totals = {} # name -> aggregated statistics, in order of first use
+        self._sampler = None
+        self._start_wall = time.perf_counter()
+        self._start_cpu = time.process_time()
+
+    def _sample(self, stop_event):
+        while not stop_event.wait(self.sample_interval):
+            rss_mb = current_rss_mb()
+            with self._lock:
+                for span in self._open_spans:
+                    span.peak_rss_mb = max(span.peak_rss_mb, rss_mb)
+
+    def _start_sampler(self):
+        stop_event = threading.Event()
+        thread = threading.Thread(target=self._sample, args=(stop_event,), daemon=True)
+        thread.start()
+        self._sampler = (thread, stop_event)
+
+    def _stop_sampler(self):
+        thread, stop_event = self._sampler
+        stop_event.set()
+        self._sampler = None
+
+    @contextmanager
+    def span(self, name):
+        span = SpanClass(name)
+        with self._lock:
+            self._open_spans.append(span)
+            if self._sampler is None:
+                self._start_sampler()
+        start_wall, start_cpu = time.perf_counter(), time.process_time()
+        try:
+            yield span
+        finally:
+            span.wall_seconds = time.perf_counter() - start_wall
+            span.cpu_seconds = time.process_time() - start_cpu
+            span.peak_rss_mb = max(span.peak_rss_mb, current_rss_mb())
+            with self._lock:
+                self._open_spans.remove(span)
+                if not self._open_spans:
+                    self._stop_sampler()
+                # parent's peak includes children
+                for parent in self._open_spans:
+                    parent.peak_rss_mb = max(parent.peak_rss_mb, span.peak_rss_mb)
+                self._record(span)
+            logger.info(
+                f"[timing] {name}: wall {span.wall_seconds:.3f}s, cpu {span.cpu_seconds:.3f}s, "
+                f"peak RSS {span.peak_rss_mb:.1f} MB, {span.bytes} bytes"
+            )
+
+    def _record(self, span):
+        totals = self._totals.setdefault(span.name, {"count": 0, "wall_seconds": 0.0, "cpu_seconds": 0.0, "peak_rss_mb": 0.0, "bytes": 0})
+        totals["count"] += 1
+        totals["wall_seconds"] += span.wall_seconds
+        totals["cpu_seconds"] += span.cpu_seconds
+        totals["peak_rss_mb"] = max(totals["peak_rss_mb"], span.peak_rss_mb)
+        totals["bytes"] += span.bytes
+
+    def add_bytes(self, n_bytes):
+        """
+        Adds bytes moved (read, downloaded, uploaded) to every open span
+        """
+        with self._lock:
+            for span in self._open_spans:
+                span.bytes += n_bytes
+
+    def summary(self):
+        """
+        Returns:
+            dict: {"spans": {name: {count, wall_seconds, cpu_seconds, peak_rss_mb, bytes}},
+                   "total_wall_seconds", "total_cpu_seconds"} - totals since the tracer was created
+        """
+        with self._lock:
+            spans = {name: dict(totals) for name, totals in self._totals.items()}
+        return {
+            "spans": spans,
+            "total_wall_seconds": time.perf_counter() - self._start_wall,
+            "total_cpu_seconds": time.process_time() - self._start_cpu,
+        }
+
+    def reset(self):
+        with self._lock:
+            self._totals = {}
+            self._start_wall = time.perf_counter()
+            self._start_cpu = time.process_time()
+
+
+def traced(name):
+    """
+    Decorator - the whole function call is one span
+    """
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with tracer.span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# one tracer per process, shared by all modules (like logger)
+tracer = TracerClass()
@@ -4,23 +4,55 @@ Docker Execution Script
 This script defines the EC2 instance's user data, which runs automatically when the instance starts.
 
 Key points:
-    sleep 60
-        Instance waits for 60 seconds because instance will first start running and only then S3 access rule will
-        be attached - so we need to wait until EC2 instance has S3 access
+    no waiting for S3 access
+        Instance is launched with its instance profile (see Ec2ManagerClass), so credentials are there at boot,
+        the container starts right after the pull - main_cloud.py probes credentials itself (wait_for_credentials)
     shutdown -h now
         Initiates system shutdown once the container execution completes,
         Combined with instance 'terminate on shutdown' setting, this ensures complete cleanup
         All resources (instance, EBS volumes) are automatically terminated and deleted
+    build_user_data(environment)
+        Same script, environment variables are passed to the container (docker run -e KEY=value),
+        e.g. distributed training workers get RUN_INDEX, WORKER_INDEX and NUM_WORKERS
+    build_pool_user_data(environment)
+        Warm pool instance (see Ec2ManagerClass.ensure_pool) - docker is installed on the first boot only,
+        the container start goes into a cloud-init per-boot script, so every start of the stopped instance
+        pulls (only changed layers) and runs the pool worker (POOL_WORKER=1) again.
+        Pool instances shut down into 'stopped' - EBS volume with docker and the image stays for the next start
 """
 
+import shlex
+
 IMAGE_NAME = "jankoi/model-training:latest"
-user_data = f"""#!/bin/bash
+
+def build_user_data(environment=None):
+    env_arguments = "".join(f"-e {shlex.quote(f'{key}={value}')} " for key, value in (environment or {}).items())
+    return f"""#!/bin/bash
 yum update -y
 yum install docker -y
 systemctl start docker
 systemctl enable docker
 docker pull {IMAGE_NAME}
-sleep 60
-docker run {IMAGE_NAME}
+docker run {env_arguments}{IMAGE_NAME}
+shutdown -h now
+"""
+
+user_data = build_user_data()
+
+
+def build_pool_user_data(environment=None):
+    env_arguments = "".join(f"-e {shlex.quote(f'{key}={value}')} " for key, value in {"POOL_WORKER": 1, **(environment or {})}.items())
+    return f"""#!/bin/bash
+yum update -y
+yum install docker -y
+systemctl enable docker
+cat > /var/lib/cloud/scripts/per-boot/pool_worker.sh <<'POOL_WORKER'
+#!/bin/bash
+systemctl start docker
+docker pull {IMAGE_NAME}
+docker run --rm -e WORKER_ID=$(hostname) {env_arguments}{IMAGE_NAME}
 shutdown -h now
+POOL_WORKER
+chmod +x /var/lib/cloud/scripts/per-boot/pool_worker.sh
+/var/lib/cloud/scripts/per-boot/pool_worker.sh
 """
\ No newline at end of file
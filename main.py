@@ -1,12 +1,112 @@
 from ec2_s3_managment.ec2_class import Ec2ManagerClass
+from ec2_s3_managment.logger_config import configure_logging
+from model.training_constants import N_WORKERS, TRAINING_MODE
+from ec2_s3_managment.ec2_s3_constants import POOL_SIZE, POOL_POLL_INTERVAL, POOL_JOB_TIMEOUT
+
+def plan_training_capacity(training_mode=TRAINING_MODE, n_workers=1):
+    """
+    Sizes the training instance from the training dataset shape (file size + first rows, nothing is
+    downloaded) and hyperparameters of training_mode (see CapacityPlannerClass)
+
+    Returns:
+        dict: capacity plan of one instance - with n_workers > 1 of one distributed training worker
+    """
+    from model.load_data import LoaderClass
+    from model.training_constants import N_ESTIMATORS, INCREMENTAL_N_ESTIMATORS
+    from ec2_s3_managment.capacity_planner import CapacityPlannerClass, WorkloadClass
+
+    loader_instance = LoaderClass()
+    profile = loader_instance.dataset_profile(loader_instance.train_dataset_path)
+    if training_mode == "sweep":
+        from model.sweep import SweepEngineClass
+        models, parallel_models = SweepEngineClass().candidates(), True
+    elif training_mode == "incremental":
+        models, parallel_models = [{"n_estimators": INCREMENTAL_N_ESTIMATORS, "fitted_estimators": N_ESTIMATORS}], False
+    else:
+        models, parallel_models = [{"n_estimators": -(-N_ESTIMATORS // n_workers)}], False
+    workload = WorkloadClass(profile["n_rows"], profile["n_features"], profile["n_classes"], models, parallel_models, profile["bytes"])
+    capacity_plan = CapacityPlannerClass().plan(workload)
+    print(f"capacity plan for {training_mode} on ~{profile['n_rows']} x {profile['n_features']}: {capacity_plan['instance_type']} "
+          f"({'spot' if capacity_plan['spot'] else 'on-demand'}), n_jobs={capacity_plan['n_jobs']}, {capacity_plan['volume_gib']}GB volume, "
+          f"~{capacity_plan['memory_gib']}GB memory, ~{capacity_plan['estimated_seconds'] / 60:.0f} min")
+    return capacity_plan
 
 def main():
+    configure_logging()
     ec2_manager_instance = Ec2ManagerClass()
     ec2_manager_instance.create_key_pair() # Ensures an SSH key pair exists both in AWS and locally
-    instance_id = ec2_manager_instance.start_instance()
+    instance_id = ec2_manager_instance.start_instance({"TRAINING_MODE": TRAINING_MODE}, plan_training_capacity())
 
     #important: instance will shut down and terminated automaticaly - this simulate notification when the whole process is finished
-    ec2_manager_instance.wait_for_instance_target_status(instance_id, 'terminated')
+    # interrupted spot instance is relaunched on-demand, the wait goes on until the training really finished
+    ec2_manager_instance.wait_for_termination([instance_id])
+
+def main_distributed(n_workers=N_WORKERS):
+    """
+    Distributed training - n_workers EC2 instances train slices of the forest,
+    this machine (coordinator) waits for them, merges partial forests and uploads
+    the merged model and metrics to the same Output_N folder
+    """
+    # training modules are only needed by the coordinator step
+    from model.distributed_training import DistributedTrainingClass
+    from model.load_data import LoaderClass
+
+    configure_logging()
+
+    distributed_training = DistributedTrainingClass(n_workers)
+    ec2_manager_instance = Ec2ManagerClass()
+    ec2_manager_instance.create_key_pair()
+    instance_ids = ec2_manager_instance.start_training_workers(n_workers, distributed_training.run_index, plan_training_capacity("single", n_workers))
+
+    # all workers are polled together, one describe_instances call per poll, interrupted spot workers are relaunched on-demand
+    ec2_manager_instance.wait_for_termination(instance_ids)
+
+    _, _, X_test, y_test = LoaderClass().load_training_data()
+    metrics = distributed_training.merge_and_upload(X_test, y_test)
+    print("accuracy: ", metrics["accuracy"])
+
+def main_pool(pool_size=POOL_SIZE, timeout=POOL_JOB_TIMEOUT):
+    """
+    Warm pool - the job is put on the S3 job queue, stopped pool instances are started
+    (new ones launched while the pool is smaller than pool_size) for waiting jobs.
+    Started instances skip docker install and reuse the pulled image, they run queued
+    jobs and stop again after POOL_IDLE_TIMEOUT without work.
+    Jobs of workers that died count as waiting again once their claim is stale (see JobQueueClass),
+    without a result after timeout seconds TimeoutError is raised.
+    """
+    import time
+    from ec2_s3_managment.s3_class import S3ManagerClass
+    from ec2_s3_managment.job_queue import JobQueueClass
+
+    configure_logging()
+    s3_manager_instance = S3ManagerClass()
+    job_queue = JobQueueClass(s3_manager_instance.s3_client, s3_manager_instance.bucket_name)
+    ec2_manager_instance = Ec2ManagerClass()
+    ec2_manager_instance.create_key_pair()
+
+    # pool instances are sized once, for the job which made them
+    capacity_plan = plan_training_capacity()
+    job_id = job_queue.submit({"training_mode": TRAINING_MODE})
+    deadline = time.monotonic() + timeout
+    while True:
+        result = job_queue.get_result(job_id)
+        if result is not None:
+            break
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"Job {job_id} has no result after {timeout}s, it stays queued for the next pool run")
+        # instances stopped meanwhile (idle timeout) are started again while jobs wait
+        unclaimed_jobs = job_queue.unclaimed_jobs()
+        jobs_running = len(job_queue.pending_jobs()) - len(unclaimed_jobs)
+        ec2_manager_instance.ensure_pool(len(unclaimed_jobs), jobs_running, pool_size, capacity_plan)
+        time.sleep(POOL_POLL_INTERVAL)
+
+    print(f"job {job_id} {result['status']} on {result['worker_id']} in {result['seconds']:.0f}s", end="")
+    print(f", Output_{result['run_index']}" if "run_index" in result else f": {result.get('error')}")
 
 if __name__ == "__main__":
-    main()
+    if POOL_SIZE > 0:
+        main_pool()
+    elif N_WORKERS > 1:
+        main_distributed()
+    else:
+        main()
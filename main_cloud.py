@@ -1,7 +1,15 @@
+import os
+import socket
+
 from ec2_s3_managment.s3_class import S3ManagerClass
-from model.load_data import LoaderClass
-from model.model_class import ModelClass
-from ec2_s3_managment.logger_config import logger
+from model.training_constants import TRAINING_MODE
+from ec2_s3_managment.ec2_s3_constants import LOGGER_FILENAME, LOGGER_OUT_PATH
+from ec2_s3_managment.log_streamer import LogStreamerClass
+from ec2_s3_managment.logger_config import logger, configure_logging, truncate_log, flush_logging
+from ec2_s3_managment.aws_session import wait_for_credentials
+from ec2_s3_managment.tracing import tracer
+# training modules (pandas, sklearn, joblib) are imported by the pipeline that needs them,
+# container start doesn't pay for modules of the other training modes
 
 def run_cloud_training_pipeline():
     """
@@ -9,28 +17,170 @@ def run_cloud_training_pipeline():
     This will be dockerized and it will run on EC2
     Model, Metrics, and Logger will be saved on S3 bucket
     """
-    
+    from model.load_data import LoaderClass
+    from model.model_class import ModelClass
+
     logger.info(f"=== Starting model training pipeline ===")
     s3_manager_instance = S3ManagerClass()
     loader_instance = LoaderClass()
     model_instance = ModelClass()
 
-    # Load data
-    X_train, y_train, X_test, y_test = loader_instance.load_training_data()
+    # log segments are uploaded to the run folder while the pipeline runs
+    with LogStreamerClass(s3_manager_instance):
+        # Load data
+        X_train, y_train, X_test, y_test = loader_instance.load_training_data()
 
-    # Train model
-    model_instance.train_model(X_train, y_train)
+        # Train model
+        model_instance.train_model(X_train, y_train)
 
-    #evaluate model
-    metrics = ModelClass.evaluate_model_static(model_instance.model, X_test, y_test)
+        #evaluate model
+        metrics = ModelClass.evaluate_model_static(model_instance.model, X_test, y_test)
 
-    # upload metrics, model, logger to S3
-    s3_manager_instance.upload_metrics_to_s3(metrics)
-    s3_manager_instance.upload_model_to_s3(model_instance.model)
-    logger.info("=== Model training pipeline completed ===")
+        # upload metrics, model, logger to S3
+        s3_manager_instance.upload_metrics_to_s3(metrics)
+        s3_manager_instance.upload_model_to_s3(model_instance.model)
+        s3_manager_instance.upload_timings_to_s3()
+        logger.info("=== Model training pipeline completed ===")
     s3_manager_instance.upload_log_to_s3()
 
     logger.info(f"=== Logger END ===\n\n")
+    return s3_manager_instance.upload_index
+
+def run_cloud_sweep_pipeline():
+    """
+    Hyperparameter sweep - cloud version
+    All candidates of SWEEP_SEARCH_SPACE are trained in this one run, metrics of every candidate,
+    and the best model with its metrics are saved in one Output_N folder
+    """
+    from model.load_data import LoaderClass
+    from model.sweep import SweepEngineClass
+
+    logger.info(f"=== Starting hyperparameter sweep pipeline ===")
+    s3_manager_instance = S3ManagerClass()
+    loader_instance = LoaderClass()
+
+    with LogStreamerClass(s3_manager_instance):
+        # Load data
+        X_train, y_train, X_test, y_test = loader_instance.load_training_data()
+
+        # train and evaluate all candidates, upload metrics and best model
+        SweepEngineClass(s3_manager=s3_manager_instance).run(X_train, y_train, X_test, y_test)
+
+        logger.info("=== Hyperparameter sweep pipeline completed ===")
+    s3_manager_instance.upload_log_to_s3()
+    return s3_manager_instance.upload_index
+
+def run_cloud_incremental_pipeline():
+    """
+    Incremental training - cloud version
+    Model of the newest completed run gets INCREMENTAL_N_ESTIMATORS new trees trained on the
+    current training data, result is saved as the next Output_N folder
+    """
+    from model.load_data import LoaderClass
+    from model.incremental_training import IncrementalTrainingClass
+
+    logger.info(f"=== Starting incremental training pipeline ===")
+    s3_manager_instance = S3ManagerClass()
+    loader_instance = LoaderClass()
+
+    with LogStreamerClass(s3_manager_instance):
+        # Load data
+        X_train, y_train, X_test, y_test = loader_instance.load_training_data()
+
+        # extend newest model, evaluate it, upload metrics and model
+        IncrementalTrainingClass(s3_manager=s3_manager_instance).run(X_train, y_train, X_test, y_test)
+
+        logger.info("=== Incremental training pipeline completed ===")
+    s3_manager_instance.upload_log_to_s3()
+    return s3_manager_instance.upload_index
+
+def run_cloud_worker_pipeline(run_index, worker_index, n_workers):
+    """
+    Distributed training worker - cloud version
+    Trains this worker's slice of the forest, partial model and log are saved in Output_<run_index>,
+    coordinator (main.py) merges partial models when all workers are done
+    """
+    from model.distributed_training import DistributedTrainingClass
+
+    logger.info(f"=== Starting distributed training worker {worker_index + 1}/{n_workers}, run {run_index} ===")
+    s3_manager_instance = S3ManagerClass(run_index=run_index)
+
+    with LogStreamerClass(s3_manager_instance, log_name=f"{LOGGER_FILENAME}_worker_{worker_index}"):
+        DistributedTrainingClass.train_worker(run_index, worker_index, n_workers, s3_manager=s3_manager_instance)
+
+        logger.info("=== Worker completed ===")
+    s3_manager_instance.upload_log_to_s3(f"{LOGGER_FILENAME}_worker_{worker_index}.log")
+
+def run_cloud_scoring_worker(job_prefix, worker_index):
+    """
+    Distributed batch scoring worker - cloud version
+    Scores this worker's shards of the job, shard predictions and the log are saved in the job folder,
+    coordinator (main_inference.py --distributed) merges them when all workers are done
+    """
+    from model.distributed_scoring import DistributedScoringClass
+
+    logger.info(f"=== Starting scoring worker {worker_index} of {job_prefix} ===")
+    s3_manager_instance = S3ManagerClass()
+    try:
+        results = DistributedScoringClass.score_worker(job_prefix, worker_index, s3_manager=s3_manager_instance)
+        logger.info(f"=== Worker completed, {sum(result['rows'] for result in results)} rows in {len(results)} shards ===")
+    finally:
+        flush_logging()
+        s3_manager_instance.s3_client.upload_file(LOGGER_OUT_PATH, s3_manager_instance.bucket_name, f"{job_prefix}/logs/{LOGGER_FILENAME}_worker_{worker_index}.log")
+
+CLOUD_PIPELINES = {
+    "single": run_cloud_training_pipeline,
+    "sweep": run_cloud_sweep_pipeline,
+    "incremental": run_cloud_incremental_pipeline,
+}
+
+def run_cloud_pool_job(spec):
+    """
+    Runs one job of the queue, spec["training_mode"] picks the pipeline
+
+    Returns:
+        dict: part of the job result - Output_N folder the job wrote
+    """
+    try:
+        pipeline = CLOUD_PIPELINES[spec.get("training_mode", "single")]
+    except KeyError:
+        raise ValueError(f"Unknown training_mode {spec['training_mode']}, expected one of {list(CLOUD_PIPELINES)}")
+    # every job starts with an empty log and fresh timings - its run folder and catalog entry get only its own
+    truncate_log()
+    tracer.reset()
+    return {"run_index": pipeline()}
+
+def run_cloud_pool_worker():
+    """
+    Warm pool worker - cloud version
+    Runs jobs from the S3 job queue until none comes for POOL_IDLE_TIMEOUT seconds,
+    then the container exits and the instance stops (see build_pool_user_data)
+    """
+    from ec2_s3_managment.job_queue import JobQueueClass, PoolWorkerClass
+
+    s3_manager_instance = S3ManagerClass()
+    job_queue = JobQueueClass(s3_manager_instance.s3_client, s3_manager_instance.bucket_name)
+    worker_id = os.getenv("WORKER_ID") or socket.gethostname()
+    logger.info(f"=== Starting pool worker {worker_id} ===")
+    jobs_done = PoolWorkerClass(job_queue, run_cloud_pool_job, worker_id).run()
+    logger.info(f"=== Pool worker {worker_id} stopped after {jobs_done} jobs ===")
 
 if __name__ == "__main__":
-    run_cloud_training_pipeline()
\ No newline at end of file
+    configure_logging()
+    # readiness probe - returns at once when the instance profile credentials are already there
+    wait_for_credentials()
+    # workers of distributed scoring get WORKER_INDEX too, SCORING_JOB tells them apart from training workers
+    if os.getenv("SCORING_JOB"):
+        run_cloud_scoring_worker(os.getenv("SCORING_JOB"), int(os.getenv("WORKER_INDEX")))
+    # workers of distributed training get these from user data (docker run -e ...)
+    elif os.getenv("WORKER_INDEX") is not None:
+        run_cloud_worker_pipeline(int(os.getenv("RUN_INDEX")), int(os.getenv("WORKER_INDEX")), int(os.getenv("NUM_WORKERS")))
+    # warm pool instances (see build_pool_user_data)
+    elif os.getenv("POOL_WORKER"):
+        run_cloud_pool_worker()
+    elif TRAINING_MODE == "sweep":
+        run_cloud_sweep_pipeline()
+    elif TRAINING_MODE == "incremental":
+        run_cloud_incremental_pipeline()
+    else:
+        run_cloud_training_pipeline()
\ No newline at end of file
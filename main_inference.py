@@ -0,0 +1,79 @@
+"""
+Batch inference - scores a large csv (local or s3://bucket/key) with a trained model
+
+Run from the project root:
+    python main_inference.py model/Resources/test_dataset.csv LocalOutput/predictions.csv
+    python main_inference.py s3://bucket/data/to_score.csv s3://bucket/predictions/to_score.csv --run-index 3 --workers 8
+
+Distributed - every csv under an s3 prefix, sharded across EC2 workers (or local processes with --local),
+merged predictions go to output_path (default <job folder>/predictions.csv, see DistributedScoringClass):
+    python main_inference.py s3://bucket/data/to_score/ --distributed 8
+    python main_inference.py s3://bucket/data/to_score/ s3://bucket/predictions/all.csv --distributed 4 --local
+"""
+import argparse
+
+from model.training_constants import INFERENCE_CHUNK_SIZE, INFERENCE_MAX_WORKERS
+from ec2_s3_managment.logger_config import configure_logging
+
+def run_batch_inference(input_path, output_path, run_index=None, chunk_size=INFERENCE_CHUNK_SIZE, max_workers=INFERENCE_MAX_WORKERS, with_proba=True):
+    """
+    Scores input_path with the model of Output_<run_index> (default newest completed run),
+    predictions are written to output_path
+    """
+    # pandas, sklearn and joblib - not needed for --help or argument errors
+    from model.batch_inference import BatchInferenceClass
+
+    batch_inference = BatchInferenceClass(run_index, chunk_size=chunk_size, max_workers=max_workers, with_proba=with_proba)
+    stats = batch_inference.run(input_path, output_path)
+    print(f"rows: {stats['rows']}, rows/sec: {stats['rows_per_sec']:.0f}")
+    return stats
+
+def run_distributed_inference(input_prefix, output_path=None, n_workers=2, run_index=None, chunk_size=INFERENCE_CHUNK_SIZE, local=False):
+    """
+    Scores every csv under input_prefix on n_workers EC2 instances (local=True - local processes),
+    shard predictions are merged into output_path
+    """
+    from model.distributed_scoring import DistributedScoringClass
+
+    distributed_scoring = DistributedScoringClass(run_index, chunk_size=chunk_size)
+    if local:
+        summary = distributed_scoring.run_local(input_prefix, n_workers, output_path)
+    else:
+        from ec2_s3_managment.ec2_class import Ec2ManagerClass
+
+        job_prefix = distributed_scoring.plan(input_prefix, n_workers)
+        ec2_manager_instance = Ec2ManagerClass()
+        ec2_manager_instance.create_key_pair()
+        # plan has fewer workers than requested when there are fewer input files
+        instance_ids = ec2_manager_instance.start_scoring_workers(job_prefix, distributed_scoring.read_plan(job_prefix)["n_workers"])
+        # workers terminate themselves when their shards are scored
+        ec2_manager_instance.wait_for_termination(instance_ids)
+        summary = distributed_scoring.merge(job_prefix, output_path)
+
+    for worker_index, worker in summary["workers"].items():
+        print(f"worker {worker_index}: {worker['rows']} rows in {worker['shards']} shards, rows/sec: {worker['rows_per_sec']:.0f}")
+    print(f"rows: {summary['rows']}, rows/sec: {summary['rows_per_sec']:.0f} aggregate, predictions: {summary['predictions']}")
+    if "metrics" in summary:
+        print(f"accuracy: {summary['metrics']['accuracy']:.4f}")
+    return summary
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input_path")
+    parser.add_argument("output_path", nargs="?", default=None, help="required unless --distributed")
+    parser.add_argument("--run-index", type=int, default=None, help="Output_N index of the model, default newest completed run")
+    parser.add_argument("--chunk-size", type=int, default=INFERENCE_CHUNK_SIZE)
+    parser.add_argument("--workers", type=int, default=INFERENCE_MAX_WORKERS)
+    parser.add_argument("--no-proba", action="store_true", help="write only predictions, without class probabilities")
+    parser.add_argument("--distributed", type=int, default=None, metavar="N_WORKERS", help="input_path is an s3 prefix, scored by N_WORKERS workers")
+    parser.add_argument("--local", action="store_true", help="with --distributed: workers are local processes, not EC2 instances")
+    args = parser.parse_args()
+    if args.distributed is None and args.output_path is None:
+        parser.error("output_path is required without --distributed")
+
+    configure_logging()
+
+    if args.distributed is not None:
+        run_distributed_inference(args.input_path, args.output_path, args.distributed, args.run_index, args.chunk_size, args.local)
+    else:
+        run_batch_inference(args.input_path, args.output_path, args.run_index, args.chunk_size, args.workers, not args.no_proba)
@@ -1,7 +1,6 @@
 from ec2_s3_managment.s3_class import S3ManagerClass
-from model.load_data import LoaderClass
-from model.model_class import ModelClass
-from ec2_s3_managment.logger_config import logger
+from ec2_s3_managment.logger_config import logger, configure_logging
+# training modules (pandas, sklearn, joblib) are imported by the pipeline that needs them
 
 def run_local_training_pipeline():
     """
@@ -14,6 +13,11 @@ def run_local_training_pipeline():
         - downloading model metrics and logs localy
         - evaluating downloaded and loaded model
     """
+    from model.load_data import LoaderClass
+    from model.model_class import ModelClass
+
+    configure_logging()
+
     logger.info(f"=== Starting model training pipeline ===")
     s3_manager_instance = S3ManagerClass()
     loader_instance = LoaderClass()
@@ -31,6 +35,7 @@ def run_local_training_pipeline():
     # upload metrics, model, logger to S3
     s3_manager_instance.upload_metrics_to_s3(metrics)
     s3_manager_instance.upload_model_to_s3(model_instance.model)
+    s3_manager_instance.upload_timings_to_s3()
     logger.info("=== Model training pipeline completed ===")
     s3_manager_instance.upload_log_to_s3()
     
@@ -44,31 +49,77 @@ def run_local_training_pipeline():
     
     logger.info(f"=== Logger END ===\n\n")
 
-def download_experiment_data_and_evaluate_model():
+def run_local_distributed_training_pipeline(n_workers=4):
+    """
+    Distributed training - local version
+    Same as distributed training on EC2 (main.py with N_WORKERS > 1), but workers are
+    local processes - used for testing merging of partial forests without AWS
+    """
+    from model.distributed_training import DistributedTrainingClass
+
+    configure_logging()
+
+    metrics = DistributedTrainingClass(n_workers).run_local()
+    print("accuracy: ", metrics["accuracy"])
+
+def run_local_sweep_pipeline():
+    """
+    Hyperparameter sweep - local version
+    Trains and evaluates all candidates of SWEEP_SEARCH_SPACE, uploads metrics and best model to S3
+    """
+    from model.load_data import LoaderClass
+    from model.sweep import SweepEngineClass
+
+    configure_logging()
+
+    s3_manager_instance = S3ManagerClass()
+    X_train, y_train, X_test, y_test = LoaderClass().load_training_data()
+    summary = SweepEngineClass(s3_manager=s3_manager_instance).run(X_train, y_train, X_test, y_test)
+    print("best params: ", summary["best_params"])
+    s3_manager_instance.upload_log_to_s3()
+
+def run_local_incremental_training_pipeline():
+    """
+    Incremental training - local version
+    Adds INCREMENTAL_N_ESTIMATORS trees to the newest completed model and uploads it as the next run
     """
-    downloads newest folder from S3 bucket, loads and evaluates the model
+    from model.load_data import LoaderClass
+    from model.incremental_training import IncrementalTrainingClass
 
+    configure_logging()
+
+    s3_manager_instance = S3ManagerClass()
+    X_train, y_train, X_test, y_test = LoaderClass().load_training_data()
+    metrics = IncrementalTrainingClass(s3_manager=s3_manager_instance).run(X_train, y_train, X_test, y_test)
+    print("accuracy: ", metrics["accuracy"], "trees: ", metrics["incremental_training"]["n_estimators"])
+    s3_manager_instance.upload_log_to_s3()
+
+def download_experiment_data_and_evaluate_model(run_index=None):
+    """
+    loads the model of a run straight from S3 bucket and evaluates it
+
+    run_index - Output_<run_index>, None - newest completed run
     this function is used after main.py finish running
     """
+    from model.load_data import LoaderClass
+    from model.evaluation import EvaluationEngineClass
+
+    configure_logging()
+
     s3_manager_instance = S3ManagerClass()
-    if not s3_manager_instance.download_possible:
+    if run_index is None and not s3_manager_instance.download_possible:
         print("nothing to download")
         return
 
     loader_instance = LoaderClass()
-    
-    # Load train test data
-    X_train, y_train, X_test, y_test = loader_instance.load_training_data()
 
-    # download metrics, model, logger from S3
-    s3_manager_instance.download_experiment_files_from_s3()
+    # only the model is needed - streamed into joblib, metrics and logs are not downloaded, nothing is written to disk
+    loaded_model = s3_manager_instance.load_model(run_index)
 
-    # load model
-    loaded_model = s3_manager_instance.load_model_localy()
-
-    # evaluate model
-    metrics = ModelClass.evaluate_model_static(loaded_model, X_test, y_test)
+    # evaluate model - test set is streamed in chunks, it is never fully in memory
+    metrics = EvaluationEngineClass().evaluate_batches(loaded_model, loader_instance.iter_batches(loader_instance.test_dataset_path))
     print("accuracy: ", metrics["accuracy"])
 
 if __name__ == "__main__":
+    configure_logging()
     download_experiment_data_and_evaluate_model()
\ No newline at end of file
@@ -0,0 +1,152 @@
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from model.load_data import LoaderClass
+from model.evaluation import as_model_input
+from model.training_constants import INFERENCE_CHUNK_SIZE, INFERENCE_MAX_WORKERS
+from ec2_s3_managment.s3_class import S3ManagerClass, create_s3_client
+from ec2_s3_managment.s3_upload import S3MultipartWriterClass
+from ec2_s3_managment.s3_range_reader import is_s3_uri, parse_s3_uri
+from ec2_s3_managment.logger_config import logger
+
+
+# process level model cache, run index -> loaded model
+# every process (main or pool worker) loads a model from S3 only once
+_MODEL_CACHE = {}
+_s3_client = None
+
+
+def get_cached_model(run_index, s3_client=None):
+    """
+    Returns model of Output_<run_index>, loaded straight from S3 on first use, from the cache afterwards
+    """
+    global _s3_client
+    if run_index not in _MODEL_CACHE:
+        if s3_client is None:
+            _s3_client = _s3_client or create_s3_client()
+            s3_client = _s3_client
+        _MODEL_CACHE[run_index] = S3ManagerClass(s3_client=s3_client).load_model(run_index)
+        logger.info(f"Model of run {run_index} loaded into process {os.getpid()}")
+    return _MODEL_CACHE[run_index]
+
+
+def _init_worker(run_index):
+    # model is loaded when the process starts, not with the first chunk
+    get_cached_model(run_index)
+
+
+def predict_chunk(run_index, X, with_proba=True):
+    """
+    Scores one chunk with the cached model
+
+    predict_proba is computed once and predictions are derived from it (this is what
+    forest.predict does internally), so asking for probabilities doesn't score twice
+
+    Returns:
+        tuple: (predictions, probabilities or None)
+    """
+    model = get_cached_model(run_index)
+    probabilities = model.predict_proba(as_model_input(model, X))
+    predictions = model.classes_.take(np.argmax(probabilities, axis=1), axis=0)
+    return predictions, probabilities if with_proba else None
+
+
+def predictions_to_csv(classes, predictions, probabilities, header):
+    data = pd.DataFrame({"prediction": predictions})
+    if probabilities is not None:
+        for class_index, class_label in enumerate(classes):
+            data[f"proba_{class_label}"] = probabilities[:, class_index]
+    return data.to_csv(index=False, header=header, float_format="%.6g").encode("utf-8")
+
+
+def score_chunk_to_csv(run_index, X, with_proba=True, header=False):
+    """
+    Scores one chunk and formats it as csv in the same process - formatting is as expensive
+    as scoring, so it must not be left to the single process writing the output
+
+    Returns:
+        tuple: (rows, csv bytes)
+    """
+    predictions, probabilities = predict_chunk(run_index, X, with_proba)
+    return len(predictions), predictions_to_csv(get_cached_model(run_index).classes_, predictions, probabilities, header)
+
+
+class BatchInferenceClass:
+    """
+    Batch scoring of large inputs with the model of one Output_N run.
+
+    1. input (local csv or s3://bucket/key) is read in chunks of chunk_size rows, it is never fully in memory
+    2. chunks are scored and formatted as csv on a process pool, every process loads the model once (see get_cached_model)
+    3. predictions are written in input order, chunk by chunk, to a local csv or to S3 (multipart upload),
+       at most 2 * max_workers chunks are in flight, so memory stays bounded
+
+    Output csv has "prediction" column and, with with_proba, one "proba_<class>" column per class.
+
+    Example usage:
+        batch_inference = BatchInferenceClass()  # newest completed run
+        stats = batch_inference.run("data/to_score.csv", "s3://bucket/predictions/to_score.csv")
+    """
+    def __init__(self, run_index=None, chunk_size=INFERENCE_CHUNK_SIZE, max_workers=INFERENCE_MAX_WORKERS, with_proba=True, s3_manager=None):
+        self.s3_manager = s3_manager or S3ManagerClass()
+        if run_index is None:
+            if not self.s3_manager.download_possible:
+                raise RuntimeError("There is no completed run to score with")
+            run_index = self.s3_manager.download_index
+        self.run_index = run_index
+        self.chunk_size = chunk_size
+        self.max_workers = max_workers or os.cpu_count()
+        self.with_proba = with_proba
+
+    def _open_output(self, output_path):
+        if is_s3_uri(output_path):
+            bucket_name, key = parse_s3_uri(output_path)
+            return S3MultipartWriterClass(self.s3_manager.s3_client, bucket_name, key)
+        os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+        return open(output_path, "wb")
+
+    def _score_chunks(self, chunks):
+        """
+        Yields scored chunks as csv bytes, in input order
+        """
+        if self.max_workers == 1:
+            for chunk_index, X in enumerate(chunks):
+                yield score_chunk_to_csv(self.run_index, X, self.with_proba, header=chunk_index == 0)
+            return
+
+        with ProcessPoolExecutor(max_workers=self.max_workers, initializer=_init_worker, initargs=(self.run_index,)) as executor:
+            pending = deque()
+            for chunk_index, X in enumerate(chunks):
+                pending.append(executor.submit(score_chunk_to_csv, self.run_index, X, self.with_proba, chunk_index == 0))
+                if len(pending) >= 2 * self.max_workers:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+    def run(self, input_path, output_path):
+        """
+        Returns:
+            dict: scoring statistics (rows, chunks, seconds, rows_per_sec)
+        """
+        model = get_cached_model(self.run_index, self.s3_manager.s3_client)
+        loader = LoaderClass(input_path, input_path, chunk_size=self.chunk_size, s3_client=self.s3_manager.s3_client)
+        logger.info(f"=== Batch inference of {input_path} with model of run {self.run_index}, chunks of {self.chunk_size} rows, {self.max_workers} processes ===")
+
+        start_time = time.perf_counter()
+        rows, chunks = 0, 0
+        with self._open_output(output_path) as output:
+            for chunk_rows, csv_bytes in self._score_chunks(loader.iter_feature_batches(input_path, model.n_features_in_)):
+                output.write(csv_bytes)
+                rows += chunk_rows
+                chunks += 1
+            if chunks == 0:
+                output.write(predictions_to_csv(model.classes_, [], np.empty((0, len(model.classes_))) if self.with_proba else None, header=True))
+        seconds = time.perf_counter() - start_time
+
+        stats = {"rows": rows, "chunks": chunks, "seconds": seconds, "rows_per_sec": rows / seconds if seconds > 0 else 0.0}
+        logger.info(f"Scored {rows} rows in {chunks} chunks, {seconds:.2f}s ({stats['rows_per_sec']:.0f} rows/s), predictions written to {output_path}")
+        return stats
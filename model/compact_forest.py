@@ -0,0 +1,253 @@
+import io
+import json
+import struct
+
+import numpy as np
+import sklearn
+
+FILE_MAGIC = b"CFOREST1"
+ARRAY_ALIGNMENT = 64
+PREDICT_BATCH_ROWS = 4096
+
+# since scikit-learn 1.4 tree_.value of classifiers holds class fractions and tree predict_proba returns
+# them as they are, older versions hold weighted counts which predict_proba normalizes
+_VALUES_ARE_FRACTIONS = tuple(int(part) for part in sklearn.__version__.split(".")[:2]) >= (1, 4)
+
+
+def _float32_floor(thresholds):
+    """
+    Largest float32 <= every float64 threshold
+
+    sklearn compares float32 features with float64 thresholds (x <= threshold), for float32 x
+    that is exactly x <= floor32(threshold), so float32 thresholds give identical splits
+    """
+    thresholds32 = thresholds.astype(np.float32)
+    rounded_up = thresholds32.astype(np.float64) > thresholds
+    thresholds32[rounded_up] = np.nextafter(thresholds32[rounded_up], np.float32(-np.inf))
+    return thresholds32
+
+
+def _leaf_probabilities(tree, n_classes):
+    # computed exactly the way DecisionTreeClassifier.predict_proba does it
+    proba = tree.tree_.value[:, 0, :n_classes].astype(np.float64)
+    if not _VALUES_ARE_FRACTIONS:
+        normalizer = proba.sum(axis=1)[:, np.newaxis]
+        normalizer[normalizer == 0.0] = 1.0
+        proba /= normalizer
+    return proba
+
+
+class CompactForestClass:
+    """
+    Random forest flattened into a few contiguous arrays, an alternative to joblib pickles of sklearn trees.
+
+    Nodes of all trees are renumbered: leaves get ids 0 .. n_leaves - 1, internal (split) nodes
+    n_leaves .. n_nodes - 1, so split arrays store only split nodes and leaf_values only leaves:
+        feature         int16 (int32 for >= 32768 features)   feature of every split node
+        threshold       float32                                threshold of every split node, rounded down
+        children        int32 (n_splits, 2)                    node ids of left and right child
+        missing_left    uint8                                  where NaN goes (sklearn >= 1.3 trees)
+        leaf_values     float64 (n_leaves, n_classes)          class probabilities of every leaf
+        roots           int32                                  root node id of every tree
+
+    Prediction walks all trees at once (vectorized over trees and rows, one step per depth level,
+    only paths that haven't reached a leaf yet are advanced)
+    and averages leaf probabilities in the same order and precision as sklearn, so
+    predict_proba and predict give exactly the same results as the original RandomForestClassifier.
+
+    Saved file is one header (json) + aligned raw arrays, load() memory-maps it - loading takes
+    milliseconds and pages are read from disk only when prediction touches them.
+
+    Example usage:
+        compact_model = CompactForestClass.from_sklearn(model_instance.model)
+        compact_model.save_to_path("LocalOutput/model_compact.bin")
+        compact_model = CompactForestClass.load("LocalOutput/model_compact.bin")
+        y_pred = compact_model.predict(X_test)
+    """
+    ARRAY_NAMES = ("feature", "threshold", "children", "missing_left", "leaf_values", "roots")
+
+    def __init__(self, arrays, classes, n_features, max_depth, feature_names=None):
+        for name in self.ARRAY_NAMES:
+            setattr(self, name, arrays[name])
+        self.classes_ = classes
+        self.n_features_in_ = n_features
+        self.max_depth = max_depth
+        self.feature_names_in_ = feature_names
+        self.n_leaves = len(self.leaf_values)
+        self.n_estimators = len(self.roots)
+
+    @classmethod
+    def from_sklearn(cls, model):
+        """
+        Flattens fitted RandomForestClassifier (or any forest of DecisionTreeClassifier with one output)
+        """
+        if getattr(model, "n_outputs_", 1) != 1:
+            raise ValueError("Only single output forests can be exported")
+        n_classes = len(model.classes_)
+        trees = [estimator.tree_ for estimator in model.estimators_]
+
+        # new id of every node: leaves are numbered first, then split nodes, tree by tree
+        is_leaf = [tree.children_left == -1 for tree in trees]
+        n_leaves = sum(int(leaves.sum()) for leaves in is_leaf)
+        node_ids, leaf_offset, split_offset = [], 0, n_leaves
+        for leaves in is_leaf:
+            ids = np.empty(len(leaves), dtype=np.int64)
+            ids[leaves] = leaf_offset + np.arange(leaves.sum())
+            ids[~leaves] = split_offset + np.arange((~leaves).sum())
+            leaf_offset += leaves.sum()
+            split_offset += (~leaves).sum()
+            node_ids.append(ids)
+
+        feature_dtype = np.int16 if model.n_features_in_ < np.iinfo(np.int16).max else np.int32
+        splits = [~leaves for leaves in is_leaf]
+        arrays = {
+            "feature": np.concatenate([tree.feature[split] for tree, split in zip(trees, splits)]).astype(feature_dtype),
+            "threshold": _float32_floor(np.concatenate([tree.threshold[split] for tree, split in zip(trees, splits)])),
+            "children": np.concatenate([
+                np.stack([ids[tree.children_left[split]], ids[tree.children_right[split]]], axis=1)
+                for tree, ids, split in zip(trees, node_ids, splits)
+            ]).astype(np.int32),
+            "missing_left": np.concatenate([
+                (np.asarray(tree.missing_go_to_left)[split] if hasattr(tree, "missing_go_to_left") else np.zeros(split.sum())).astype(np.uint8)
+                for tree, split in zip(trees, splits)
+            ]),
+            "leaf_values": np.concatenate([_leaf_probabilities(estimator, n_classes)[leaves] for estimator, leaves in zip(model.estimators_, is_leaf)]),
+            "roots": np.array([ids[0] for ids in node_ids], dtype=np.int32),
+        }
+        feature_names = getattr(model, "feature_names_in_", None)
+        return cls(
+            arrays,
+            np.asarray(model.classes_),
+            int(model.n_features_in_),
+            max(int(tree.max_depth) for tree in trees),
+            None if feature_names is None else [str(name) for name in feature_names]
+        )
+
+    # file format
+    def save(self, file):
+        """
+        Writes the forest into a binary, writable file object (local file or S3MultipartWriterClass)
+
+        Layout: 8 bytes magic, 8 bytes header length, json header, arrays - each starting at an
+        offset divisible by ARRAY_ALIGNMENT, offsets are relative to the start of the file
+        """
+        arrays = {name: np.ascontiguousarray(getattr(self, name)) for name in self.ARRAY_NAMES}
+        header = {
+            "classes": self.classes_.tolist(),
+            "classes_dtype": self.classes_.dtype.str if self.classes_.dtype != object else "O",
+            "n_features": self.n_features_in_,
+            "max_depth": self.max_depth,
+            "feature_names": self.feature_names_in_,
+            "arrays": {},
+        }
+        # offsets depend on header length and header contains offsets - header is padded to a fixed size
+        header_size = ARRAY_ALIGNMENT
+        while True:
+            offset = header_size
+            for name, array in arrays.items():
+                header["arrays"][name] = {"dtype": array.dtype.str, "shape": array.shape, "offset": offset}
+                offset += -(-array.nbytes // ARRAY_ALIGNMENT) * ARRAY_ALIGNMENT
+            header_bytes = json.dumps(header).encode("utf-8")
+            if 16 + len(header_bytes) <= header_size:
+                break
+            header_size = -(-(16 + len(header_bytes)) // ARRAY_ALIGNMENT) * ARRAY_ALIGNMENT
+
+        file.write(FILE_MAGIC + struct.pack("<Q", len(header_bytes)) + header_bytes)
+        file.write(b"\0" * (header_size - 16 - len(header_bytes)))
+        for name, array in arrays.items():
+            file.write(array.tobytes())
+            file.write(b"\0" * (-array.nbytes % ARRAY_ALIGNMENT))
+
+    def save_to_path(self, path):
+        with open(path, "wb") as file:
+            self.save(file)
+
+    def to_bytes(self):
+        buffer = io.BytesIO()
+        self.save(buffer)
+        return buffer.getvalue()
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """
+        mmap=True - arrays are read-only views of the memory-mapped file (nothing is read until used),
+        mmap=False - arrays are read into memory
+        """
+        with open(path, "rb") as file:
+            header = cls._read_header(file.read(16), file)
+        if mmap:
+            buffer = np.memmap(path, dtype=np.uint8, mode="r")
+        else:
+            with open(path, "rb") as file:
+                buffer = file.read()
+        return cls._from_buffer(header, buffer)
+
+    @classmethod
+    def from_bytes(cls, data):
+        file = io.BytesIO(data)
+        return cls._from_buffer(cls._read_header(file.read(16), file), data)
+
+    @staticmethod
+    def _read_header(prefix, file):
+        if len(prefix) != 16 or prefix[:8] != FILE_MAGIC:
+            raise ValueError("Not a compact forest file")
+        header_length, = struct.unpack("<Q", prefix[8:])
+        return json.loads(file.read(header_length))
+
+    @classmethod
+    def _from_buffer(cls, header, buffer):
+        arrays = {
+            name: np.ndarray(tuple(spec["shape"]), dtype=np.dtype(spec["dtype"]), buffer=buffer, offset=spec["offset"])
+            for name, spec in header["arrays"].items()
+        }
+        classes_dtype = object if header["classes_dtype"] == "O" else np.dtype(header["classes_dtype"])
+        return cls(arrays, np.array(header["classes"], dtype=classes_dtype), header["n_features"], header["max_depth"], header["feature_names"])
+
+    # prediction
+    def apply(self, X):
+        """
+        Returns:
+            np.ndarray: (n_trees, n_rows) leaf id reached by every row in every tree
+        """
+        n_rows, n_features = X.shape
+        X_flat = X.ravel()
+        children_flat = self.children.ravel() # left child of split i at 2 * i, right child at 2 * i + 1
+        has_missing = bool(np.isnan(X_flat).any())
+
+        nodes = np.repeat(self.roots[:, np.newaxis], n_rows, axis=1).ravel()
+        # flat (tree, row) positions still in a split node, shrinks every depth level
+        active = np.flatnonzero(nodes >= self.n_leaves)
+        row_offsets = (active % n_rows) * n_features
+        while len(active):
+            split = np.take(nodes, active) - self.n_leaves
+            values = np.take(X_flat, row_offsets + np.take(self.feature, split))
+            go_right = values > np.take(self.threshold, split)
+            if has_missing:
+                missing = np.isnan(values)
+                go_right[missing] = self.missing_left[split[missing]] == 0
+            next_nodes = np.take(children_flat, 2 * split + go_right)
+            nodes[active] = next_nodes
+            in_split = next_nodes >= self.n_leaves
+            active, row_offsets = active[in_split], row_offsets[in_split]
+        return nodes.reshape(len(self.roots), n_rows)
+
+    def _check_X(self, X):
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(f"X has shape {X.shape}, model expects (n_rows, {self.n_features_in_})")
+        return X
+
+    def predict_proba(self, X):
+        X = self._check_X(X)
+        proba = np.zeros((len(X), len(self.classes_)), dtype=np.float64)
+        for start in range(0, len(X), PREDICT_BATCH_ROWS):
+            leaves = self.apply(X[start:start + PREDICT_BATCH_ROWS])
+            batch_proba = proba[start:start + PREDICT_BATCH_ROWS]
+            # summed tree by tree like sklearn does, float addition order matters for exact equality
+            for tree_leaves in leaves:
+                batch_proba += self.leaf_values[tree_leaves]
+        proba /= self.n_estimators
+        return proba
+
+    def predict(self, X):
+        return self.classes_.take(np.argmax(self.predict_proba(X), axis=1), axis=0)
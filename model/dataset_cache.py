@@ -0,0 +1,135 @@
+import os
+import json
+import shutil
+import hashlib
+
+import numpy as np
+
+from model.training_constants import DATASET_CACHE_DIR, FEATURE_DTYPE, LABEL_DTYPE
+from ec2_s3_managment.logger_config import logger
+
+
+class DatasetCacheClass:
+    """
+    Binary cache of parsed csv datasets.
+
+    First time a csv is loaded it is parsed once (chunk by chunk, see LoaderClass.iter_batches) into
+    two contiguous .npy files - X (FEATURE_DTYPE) and y (LABEL_DTYPE). Every next run memory-maps them,
+    so X and y are available without parsing and without copying (pages are read on first access).
+
+    Cache entries are keyed by sha256 of the csv content:
+        <cache_dir>/<csv name>-<hash>/X.npy, y.npy, meta.json
+    If the csv changes, hash changes and the entry is rebuilt, old entries of the same csv (same absolute
+    path in meta.json, csv files with the same name in other folders keep theirs) are deleted.
+    Hash of a file is remembered together with its size and mtime (hashes.json), so unchanged files are not re-hashed.
+
+    Example usage:
+        cache = DatasetCacheClass()
+        X_train, y_train = cache.load(TRAIN_DATASET_PATH, LoaderClass())
+    """
+    def __init__(self, cache_dir=DATASET_CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.hashes_path = os.path.join(cache_dir, "hashes.json")
+        os.makedirs(cache_dir, exist_ok=True)
+
+    # file hash
+    def _load_hashes(self):
+        try:
+            with open(self.hashes_path, "r") as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    def file_hash(self, dataset_path):
+        """
+        sha256 of the file content, recomputed only if size or mtime of the file changed
+        """
+        stat = os.stat(dataset_path)
+        stamp = [stat.st_size, stat.st_mtime_ns]
+        hashes = self._load_hashes()
+        absolute_path = os.path.abspath(dataset_path)
+        known = hashes.get(absolute_path)
+        if known is not None and known["stamp"] == stamp:
+            return known["sha256"]
+
+        sha256 = hashlib.sha256()
+        with open(dataset_path, "rb") as file:
+            for block in iter(lambda: file.read(1024 * 1024), b""):
+                sha256.update(block)
+        hashes[absolute_path] = {"stamp": stamp, "sha256": sha256.hexdigest()}
+        tmp_path = f"{self.hashes_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(hashes, file)
+        os.replace(tmp_path, self.hashes_path)
+        return hashes[absolute_path]["sha256"]
+
+    # entries
+    def entry_dir(self, dataset_path):
+        name = os.path.splitext(os.path.basename(dataset_path))[0]
+        return os.path.join(self.cache_dir, f"{name}-{self.file_hash(dataset_path)[:16]}")
+
+    def _remove_stale_entries(self, dataset_path, current_entry_dir):
+        source = os.path.abspath(dataset_path)
+        for entry_name in os.listdir(self.cache_dir):
+            entry_path = os.path.join(self.cache_dir, entry_name)
+            # .tmp folders are builds in progress, maybe of another process
+            if entry_path == current_entry_dir or entry_name.endswith(".tmp") or not os.path.isdir(entry_path):
+                continue
+            try:
+                with open(os.path.join(entry_path, "meta.json"), "r") as file:
+                    entry_source = json.load(file)["source"]
+            except (OSError, ValueError, KeyError):
+                continue
+            if entry_source == source:
+                shutil.rmtree(entry_path, ignore_errors=True)
+
+    def build(self, dataset_path, loader, entry_dir):
+        """
+        Parses csv chunk by chunk straight into .npy files (memory bounded by the chunk size)
+        """
+        logger.info(f"Building dataset cache for {dataset_path} in {entry_dir}")
+        n_rows = loader._count_rows(dataset_path)
+        columns, _ = loader._column_dtypes(dataset_path)
+
+        # build in a temp folder of this process, then rename - a crashed build never looks like a valid entry,
+        # concurrent builds of the same entry don't write into each other's folder
+        tmp_dir = f"{entry_dir}.{os.getpid()}.tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        X = np.lib.format.open_memmap(os.path.join(tmp_dir, "X.npy"), mode="w+", dtype=FEATURE_DTYPE, shape=(n_rows, len(columns) - 1))
+        y = np.lib.format.open_memmap(os.path.join(tmp_dir, "y.npy"), mode="w+", dtype=LABEL_DTYPE, shape=(n_rows,))
+        position = 0
+        for X_batch, y_batch in loader.iter_batches(dataset_path):
+            X[position:position + len(X_batch)] = X_batch
+            y[position:position + len(y_batch)] = y_batch
+            position += len(X_batch)
+        X.flush()
+        y.flush()
+        del X, y
+
+        with open(os.path.join(tmp_dir, "meta.json"), "w") as file:
+            json.dump({"source": os.path.abspath(dataset_path), "rows": position, "columns": list(columns)}, file)
+        try:
+            os.replace(tmp_dir, entry_dir)
+        except OSError:
+            # a concurrent build of the same content finished first, its entry is the same
+            if not os.path.isfile(os.path.join(entry_dir, "meta.json")):
+                raise
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        self._remove_stale_entries(dataset_path, entry_dir)
+
+    def load(self, dataset_path, loader):
+        """
+        Returns:
+            tuple: (X, y) read-only memory-mapped arrays, cache is built first if needed
+        """
+        entry_dir = self.entry_dir(dataset_path)
+        if not os.path.isfile(os.path.join(entry_dir, "meta.json")):
+            self.build(dataset_path, loader, entry_dir)
+        with open(os.path.join(entry_dir, "meta.json"), "r") as file:
+            rows = json.load(file)["rows"]
+
+        X = np.load(os.path.join(entry_dir, "X.npy"), mmap_mode="r")
+        y = np.load(os.path.join(entry_dir, "y.npy"), mmap_mode="r")
+        # blank trailing lines are counted but not parsed - X may have a few unused rows at the end
+        return X[:rows], y[:rows]
@@ -0,0 +1,286 @@
+import io
+import os
+import json
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from botocore.exceptions import ClientError
+
+from model.load_data import LoaderClass
+from model.evaluation import ConfusionMatrixAccumulatorClass
+from model.batch_inference import get_cached_model, predict_chunk, predictions_to_csv
+from model.training_constants import INFERENCE_CHUNK_SIZE, SCORING_SHARDS_PER_WORKER
+from ec2_s3_managment.s3_class import S3ManagerClass
+from ec2_s3_managment.s3_upload import S3MultipartWriterClass
+from ec2_s3_managment.s3_range_reader import S3RangeReaderClass, parse_s3_uri
+from ec2_s3_managment.ec2_s3_constants import SCORING_PREFIX, LIST_PAGE_SIZE
+from ec2_s3_managment.logger_config import logger
+
+
+def split_into_shards(objects, n_shards):
+    """
+    Cuts objects (key, size) - in key order - into at most n_shards contiguous groups of about the same
+    number of bytes, files are never split. Merged predictions then follow the input order.
+
+    Returns:
+        list: shards, lists of keys, no empty shard
+    """
+    total_bytes = sum(size for _, size in objects)
+    n_shards = max(min(n_shards, len(objects)), 1)
+    shards, current, current_bytes, done_bytes = [], [], 0, 0
+    for key, size in objects:
+        # shard is closed before the file which would take it further past its share of what is left
+        # than leaving the file out keeps it under, the last shard takes the rest
+        shards_left = n_shards - len(shards)
+        if current and shards_left > 1 and current_bytes + size / 2 > (total_bytes - done_bytes) / shards_left:
+            shards.append(current)
+            done_bytes += current_bytes
+            current, current_bytes = [], 0
+        current.append(key)
+        current_bytes += size
+    if current:
+        shards.append(current)
+    return shards
+
+
+def shard_key(job_prefix, shard_index, extension):
+    return f"{job_prefix}/shards/{shard_index:05d}.{extension}"
+
+
+def score_shard(job_prefix, shard_index, keys, run_index, chunk_size=INFERENCE_CHUNK_SIZE, worker_index=0, s3_manager=None):
+    """
+    Scores every input file of one shard, writes its predictions (csv without header) and result to the job folder.
+    Inputs with a label column (n_features + 1 columns) also give a partial confusion matrix.
+
+    Returns:
+        dict: shard result {"shard_index", "worker_index", "rows", "seconds", "rows_per_sec", "classes", "labels", "matrix", ...}
+    """
+    s3_manager = s3_manager or S3ManagerClass()
+    model = get_cached_model(run_index, s3_manager.s3_client)
+    loader = LoaderClass(chunk_size=chunk_size, s3_client=s3_manager.s3_client)
+    accumulator = ConfusionMatrixAccumulatorClass()
+    started_at, start_time, rows = time.time(), time.perf_counter(), 0
+
+    with S3MultipartWriterClass(s3_manager.s3_client, s3_manager.bucket_name, shard_key(job_prefix, shard_index, "csv")) as output:
+        for key in keys:
+            columns, _ = loader._column_dtypes(key)
+            if len(columns) == model.n_features_in_ + 1:
+                batches = loader.iter_batches(key)
+            else:
+                batches = ((X, None) for X in loader.iter_feature_batches(key, model.n_features_in_))
+            for X, y in batches:
+                predictions, probabilities = predict_chunk(run_index, X)
+                output.write(predictions_to_csv(model.classes_, predictions, probabilities, header=False))
+                if y is not None:
+                    accumulator.update(y, predictions)
+                rows += len(predictions)
+    seconds = time.perf_counter() - start_time
+
+    result = {
+        "shard_index": shard_index, "worker_index": worker_index, "keys": keys, "rows": rows,
+        "seconds": seconds, "rows_per_sec": rows / seconds if seconds > 0 else 0.0,
+        "started_at": started_at, "finished_at": time.time(),
+        "classes": model.classes_.tolist(),
+        "labels": accumulator.labels.tolist() if accumulator.labels is not None else None,
+        "matrix": accumulator.matrix.tolist() if accumulator.matrix is not None else None,
+    }
+    s3_manager.s3_client.put_object(Bucket=s3_manager.bucket_name, Key=shard_key(job_prefix, shard_index, "json"),
+                                    Body=json.dumps(result).encode("utf-8"))
+    logger.info(f"Shard {shard_index} ({len(keys)} files): {rows} rows in {seconds:.2f}s ({result['rows_per_sec']:.0f} rows/s)")
+    return result
+
+
+def _score_shard_task(arguments):
+    return score_shard(*arguments)
+
+
+class DistributedScoringClass:
+    """
+    Batch scoring of an S3 prefix (many csv files) on many workers with the model of one Output_N run.
+
+    Job folder (scoring/scoring_<job id>/ in the bucket):
+        plan.json               model run index, input files of every shard, number of workers
+        shards/00003.csv        predictions of shard 3, in input order, no header
+        shards/00003.json       shard result - rows, seconds, worker, partial confusion matrix (labeled input)
+        predictions.csv         merged predictions of all shards, one header
+        summary.json            rows, rows/sec per worker and in aggregate, metrics of labeled input
+
+    1. coordinator lists the input prefix and cuts the files into n_workers * SCORING_SHARDS_PER_WORKER shards
+       of about the same size (see split_into_shards), plan.json is written
+    2. worker i scores shards i, i + n_workers, ... (see score_worker) - EC2 instances (see
+       Ec2ManagerClass.start_scoring_workers) or local processes (run_local)
+    3. coordinator merges shard predictions into predictions.csv (streamed, multipart) and partial
+       confusion matrices into one (ConfusionMatrixAccumulatorClass.merge), writes summary.json
+
+    With S3_LOCAL_ROOT set (see LocalS3ClientClass), run_local works without AWS - worker processes share
+    the local bucket folder, e.g. to test sharding and merging.
+
+    Example usage:
+        distributed_scoring = DistributedScoringClass(run_index=3)
+        summary = distributed_scoring.run_local("s3://bucket/to_score/", n_workers=4)
+        print(summary["rows_per_sec"], summary["workers"])
+
+        # EC2 workers
+        job_prefix = distributed_scoring.plan("s3://bucket/to_score/", n_workers=8)
+        instance_ids = ec2_manager.start_scoring_workers(job_prefix, 8)
+        ec2_manager.wait_for_termination(instance_ids)
+        summary = distributed_scoring.merge(job_prefix)
+    """
+    def __init__(self, run_index=None, chunk_size=INFERENCE_CHUNK_SIZE, shards_per_worker=SCORING_SHARDS_PER_WORKER, s3_manager=None):
+        self.s3_manager = s3_manager or S3ManagerClass()
+        if run_index is None:
+            if not self.s3_manager.download_possible:
+                raise RuntimeError("There is no completed run to score with")
+            run_index = self.s3_manager.download_index
+        self.run_index = run_index
+        self.chunk_size = chunk_size
+        self.shards_per_worker = shards_per_worker
+
+    def _read_json(self, key):
+        try:
+            response = self.s3_manager.s3_client.get_object(Bucket=self.s3_manager.bucket_name, Key=key)
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('NoSuchKey', '404'):
+                return None
+            raise
+        return json.loads(response['Body'].read())
+
+    def read_plan(self, job_prefix):
+        return self._read_json(f"{job_prefix}/plan.json")
+
+    def list_input(self, input_prefix):
+        """
+        Returns:
+            list: (s3 uri, size) of every csv file under input_prefix, in key order
+        """
+        bucket_name, prefix = parse_s3_uri(input_prefix)
+        objects = []
+        list_kwargs = {'Bucket': bucket_name, 'Prefix': prefix, 'MaxKeys': LIST_PAGE_SIZE}
+        while True:
+            response = self.s3_manager.s3_client.list_objects_v2(**list_kwargs)
+            objects += [(f"s3://{bucket_name}/{item['Key']}", item['Size']) for item in response.get('Contents', []) if item['Key'].endswith(".csv")]
+            if not response.get('IsTruncated'):
+                return sorted(objects)
+            list_kwargs['ContinuationToken'] = response['NextContinuationToken']
+
+    def plan(self, input_prefix, n_workers):
+        """
+        Returns:
+            str: job prefix (folder of the job in the bucket), workers get it as SCORING_JOB
+        """
+        objects = self.list_input(input_prefix)
+        if not objects:
+            raise FileNotFoundError(f"No csv files under {input_prefix}")
+        shards = split_into_shards(objects, n_workers * self.shards_per_worker)
+        job_prefix = f"{SCORING_PREFIX}/scoring_{time.strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
+        plan = {"run_index": self.run_index, "input_prefix": input_prefix, "n_workers": min(n_workers, len(shards)),
+                "chunk_size": self.chunk_size, "shards": shards, "created_at": time.time()}
+        self.s3_manager.s3_client.put_object(Bucket=self.s3_manager.bucket_name, Key=f"{job_prefix}/plan.json",
+                                             Body=json.dumps(plan, indent=4).encode("utf-8"))
+        logger.info(f"Scoring job {job_prefix}: {len(objects)} files, {sum(size for _, size in objects) / 1e6:.1f}MB "
+                    f"in {len(shards)} shards for {plan['n_workers']} workers, model of run {self.run_index}")
+        return job_prefix
+
+    @staticmethod
+    def score_worker(job_prefix, worker_index, max_processes=None, s3_manager=None):
+        """
+        Scores shards of this worker (shard_index % n_workers == worker_index), shards already scored
+        (their result exists, e.g. after a restart) are skipped. max_processes > 1 - shards in parallel processes
+
+        Returns:
+            list: results of shards scored by this call
+        """
+        s3_manager = s3_manager or S3ManagerClass()
+        plan = json.loads(s3_manager.s3_client.get_object(Bucket=s3_manager.bucket_name, Key=f"{job_prefix}/plan.json")['Body'].read())
+        done = set()
+        for shard_index in range(len(plan["shards"])):
+            try:
+                s3_manager.s3_client.head_object(Bucket=s3_manager.bucket_name, Key=shard_key(job_prefix, shard_index, "json"))
+                done.add(shard_index)
+            except ClientError as e:
+                if e.response['Error']['Code'] not in ('NoSuchKey', '404', 'NotFound'):
+                    raise
+        tasks = [(job_prefix, shard_index, keys, plan["run_index"], plan["chunk_size"], worker_index)
+                 for shard_index, keys in enumerate(plan["shards"])
+                 if shard_index % plan["n_workers"] == worker_index and shard_index not in done]
+        logger.info(f"Scoring worker {worker_index + 1}/{plan['n_workers']}: {len(tasks)} shards")
+        max_processes = min(max_processes or os.cpu_count(), len(tasks))
+        if max_processes <= 1:
+            return [score_shard(*task, s3_manager=s3_manager) for task in tasks]
+        with ProcessPoolExecutor(max_workers=max_processes) as executor:
+            return list(executor.map(_score_shard_task, tasks))
+
+    def _write_predictions(self, job_prefix, results, output_path):
+        bucket_name, s3_client = self.s3_manager.bucket_name, self.s3_manager.s3_client
+        output_bucket_name, output_key = parse_s3_uri(output_path)
+        classes = results[0]["classes"]
+        header = predictions_to_csv(classes, [], np.empty((0, len(classes))), header=True)
+        with S3MultipartWriterClass(s3_client, output_bucket_name, output_key) as output:
+            output.write(header)
+            for result in results:
+                if not result["rows"]:
+                    continue
+                with S3RangeReaderClass(s3_client, bucket_name, shard_key(job_prefix, result["shard_index"], "csv")) as raw_reader:
+                    reader = io.BufferedReader(raw_reader, buffer_size=1024 * 1024)
+                    for block in iter(lambda: reader.read(1024 * 1024), b""):
+                        output.write(block)
+
+    def merge(self, job_prefix, output_path=None):
+        """
+        Merges shard results of a finished job, writes predictions.csv and summary.json to the job folder
+        output_path - s3://bucket/key of merged predictions instead of <job folder>/predictions.csv
+
+        Returns:
+            dict: summary - rows, seconds, rows/sec per worker and in aggregate, metrics of labeled input
+        """
+        plan = self.read_plan(job_prefix)
+        results = [self._read_json(shard_key(job_prefix, shard_index, "json")) for shard_index in range(len(plan["shards"]))]
+        missing = [shard_index for shard_index, result in enumerate(results) if result is None]
+        if missing:
+            raise RuntimeError(f"Scoring job {job_prefix}: shards {missing} have no result")
+
+        output_path = output_path or f"s3://{self.s3_manager.bucket_name}/{job_prefix}/predictions.csv"
+        self._write_predictions(job_prefix, results, output_path)
+        accumulator = ConfusionMatrixAccumulatorClass()
+        for result in results:
+            if result["labels"] is not None:
+                accumulator.merge(ConfusionMatrixAccumulatorClass(result["labels"], result["matrix"]))
+
+        workers = {}
+        for result in results:
+            worker = workers.setdefault(result["worker_index"], {"shards": 0, "rows": 0, "seconds": 0.0})
+            worker["shards"] += 1
+            worker["rows"] += result["rows"]
+            worker["seconds"] += result["seconds"]
+        for worker in workers.values():
+            worker["rows_per_sec"] = worker["rows"] / worker["seconds"] if worker["seconds"] > 0 else 0.0
+
+        rows = sum(result["rows"] for result in results)
+        # aggregate - from the first shard start to the last shard end, what the fleet delivered together
+        seconds = max(result["finished_at"] for result in results) - min(result["started_at"] for result in results)
+        summary = {
+            "run_index": plan["run_index"], "input_prefix": plan["input_prefix"], "shards": len(results),
+            "rows": rows, "seconds": seconds, "rows_per_sec": rows / seconds if seconds > 0 else 0.0,
+            "workers": {str(worker_index): workers[worker_index] for worker_index in sorted(workers)},
+            "predictions": output_path,
+        }
+        if accumulator.n_rows:
+            summary["metrics"] = accumulator.metrics()
+        self.s3_manager.s3_client.put_object(Bucket=self.s3_manager.bucket_name, Key=f"{job_prefix}/summary.json",
+                                             Body=json.dumps(summary, indent=4).encode("utf-8"))
+        logger.info(f"Scoring job {job_prefix} merged: {rows} rows, {summary['rows_per_sec']:.0f} rows/s aggregate "
+                    f"on {len(workers)} workers, predictions in {summary['predictions']}")
+        return summary
+
+    def run_local(self, input_prefix, n_workers, output_path=None):
+        """
+        Local multi-process mode - every worker is a process of this machine, same S3 layout as EC2 workers
+        """
+        job_prefix = self.plan(input_prefix, n_workers)
+        n_workers = self.read_plan(job_prefix)["n_workers"]
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            # one process per worker, shards of a worker one after another
+            list(executor.map(DistributedScoringClass.score_worker, [job_prefix] * n_workers, range(n_workers), [1] * n_workers))
+        return self.merge(job_prefix, output_path)
@@ -0,0 +1,154 @@
+import copy
+from concurrent.futures import ProcessPoolExecutor
+
+import joblib
+import numpy as np
+from botocore.exceptions import ClientError
+
+from model.load_data import LoaderClass
+from model.model_class import ModelClass
+from model.training_constants import N_ESTIMATORS, RANDOM_STATE
+from ec2_s3_managment.s3_class import S3ManagerClass
+from ec2_s3_managment.s3_upload import S3MultipartWriterClass
+from ec2_s3_managment.ec2_s3_constants import PARTIAL_MODEL_FILENAME, MODEL_COMPRESSION
+from ec2_s3_managment.logger_config import logger
+
+
+def split_estimators(n_estimators, n_workers):
+    """
+    Splits trees as evenly as possible, 10 trees on 3 workers -> [4, 3, 3]
+    """
+    if n_workers < 1 or n_workers > n_estimators:
+        raise ValueError(f"n_workers must be between 1 and n_estimators ({n_estimators}), got {n_workers}")
+    base, remainder = divmod(n_estimators, n_workers)
+    return [base + (worker_index < remainder) for worker_index in range(n_workers)]
+
+
+def derive_worker_seed(random_state, worker_index, n_workers):
+    """
+    Independent, reproducible seed for every worker derived from the global random_state
+    (same random_state and n_workers -> same forest)
+    """
+    seed_sequences = np.random.SeedSequence(random_state).spawn(n_workers)
+    return int(seed_sequences[worker_index].generate_state(1)[0])
+
+
+def partial_model_key(run_index, worker_index):
+    return S3ManagerClass.run_root(run_index) + f"/{PARTIAL_MODEL_FILENAME}_{worker_index}.joblib"
+
+
+def merge_partial_models(partial_models):
+    """
+    Merges forests trained on the same data into one forest (trees are independent, so the merged
+    forest is a valid random forest with sum of all trees)
+
+    Returns:
+        RandomForestClassifier: copy of the first partial model with estimators_ of all of them
+    """
+    merged_model = copy.deepcopy(partial_models[0])
+    for partial_model in partial_models[1:]:
+        if not np.array_equal(partial_model.classes_, merged_model.classes_) or partial_model.n_features_in_ != merged_model.n_features_in_:
+            raise ValueError("Partial models were trained on different classes or features and can't be merged")
+        merged_model.estimators_ += partial_model.estimators_
+    merged_model.n_estimators = len(merged_model.estimators_)
+    return merged_model
+
+
+class DistributedTrainingClass:
+    """
+    Random forest training split across n_workers (EC2 instances or local processes).
+
+    Trees of a random forest are independent, so:
+        1. coordinator reserves one run index (Output_N) for all workers
+        2. every worker trains split_estimators(...)[worker_index] trees with its own derived seed
+           and uploads partial forest to Output_N/partial_model_<worker_index>.joblib
+        3. coordinator loads partial forests, merges their estimators_ into one model and uploads
+           it with metrics to Output_N, same as a single machine run
+
+    Example usage (local, n_workers processes):
+        distributed_training = DistributedTrainingClass(n_workers=4)
+        metrics = distributed_training.run_local()
+    """
+    def __init__(self, n_workers, n_estimators=N_ESTIMATORS, random_state=RANDOM_STATE, s3_manager=None):
+        self.n_workers = n_workers
+        self.n_estimators = n_estimators
+        self.random_state = random_state
+        self.s3_manager = s3_manager or S3ManagerClass()
+        self.estimators_per_worker = split_estimators(n_estimators, n_workers)
+
+    # worker side
+    @staticmethod
+    def train_worker(run_index, worker_index, n_workers, n_estimators=N_ESTIMATORS, random_state=RANDOM_STATE, s3_manager=None):
+        """
+        Trains this worker's slice of the forest and uploads it to the run folder
+        """
+        s3_manager = s3_manager or S3ManagerClass(run_index=run_index)
+        worker_estimators = split_estimators(n_estimators, n_workers)[worker_index]
+        worker_seed = derive_worker_seed(random_state, worker_index, n_workers)
+        logger.info(f"Worker {worker_index + 1}/{n_workers} of run {run_index}: {worker_estimators} trees, seed {worker_seed}")
+
+        X_train, y_train, _, _ = LoaderClass().load_training_data()
+        model_instance = ModelClass(n_estimators=worker_estimators, random_state=worker_seed)
+        model_instance.train_model(X_train, y_train)
+
+        key = partial_model_key(run_index, worker_index)
+        with S3MultipartWriterClass(s3_manager.s3_client, s3_manager.bucket_name, key) as model_writer:
+            joblib.dump(model_instance.model, model_writer, compress=MODEL_COMPRESSION if MODEL_COMPRESSION is not None else 0)
+        logger.info(f"Partial model uploaded to s3://{s3_manager.bucket_name}/{key}")
+        return key
+
+    # coordinator side
+    @property
+    def run_index(self):
+        return self.s3_manager.upload_index
+
+    def missing_partial_models(self):
+        missing = []
+        for worker_index in range(self.n_workers):
+            try:
+                self.s3_manager.s3_client.head_object(Bucket=self.s3_manager.bucket_name, Key=partial_model_key(self.run_index, worker_index))
+            except ClientError:
+                missing.append(worker_index)
+        return missing
+
+    def load_partial_model(self, worker_index):
+        return self.s3_manager.load_joblib(f"{PARTIAL_MODEL_FILENAME}_{worker_index}.joblib", self.run_index)
+
+    def merge_and_upload(self, X_test, y_test):
+        """
+        Merges all partial models of the run, evaluates merged model and uploads model and metrics
+
+        Returns:
+            dict: metrics of the merged model
+        """
+        missing = self.missing_partial_models()
+        if missing:
+            raise RuntimeError(f"Run {self.run_index}: partial models of workers {missing} are missing")
+
+        merged_model = merge_partial_models([self.load_partial_model(worker_index) for worker_index in range(self.n_workers)])
+        logger.info(f"Merged {self.n_workers} partial models into forest with {merged_model.n_estimators} trees")
+
+        metrics = ModelClass.evaluate_model_static(merged_model, X_test, y_test)
+        metrics["distributed_training"] = {"n_workers": self.n_workers, "estimators_per_worker": self.estimators_per_worker}
+        self.s3_manager.upload_metrics_to_s3(metrics)
+        self.s3_manager.upload_model_to_s3(merged_model)
+        self.s3_manager.upload_timings_to_s3()
+        return metrics
+
+    def run_local(self):
+        """
+        Same workflow as on EC2, but workers are local processes
+        """
+        logger.info(f"=== Starting local distributed training, run {self.run_index}, {self.n_workers} workers ===")
+        with ProcessPoolExecutor(max_workers=self.n_workers) as executor:
+            futures = [
+                executor.submit(DistributedTrainingClass.train_worker, self.run_index, worker_index, self.n_workers, self.n_estimators, self.random_state)
+                for worker_index in range(self.n_workers)
+            ]
+            for future in futures:
+                future.result()
+
+        _, _, X_test, y_test = LoaderClass().load_training_data()
+        metrics = self.merge_and_upload(X_test, y_test)
+        logger.info("=== Distributed training completed ===")
+        return metrics
@@ -0,0 +1,192 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from model.training_constants import EVAL_CHUNK_SIZE, EVAL_MAX_WORKERS
+
+
+def as_model_input(model, X):
+    """
+    Numpy batch -> DataFrame with the model's feature names if the model was fitted on a DataFrame
+    (otherwise sklearn warns on every batch), anything else is returned as it is
+    """
+    if isinstance(X, np.ndarray) and hasattr(model, "feature_names_in_"):
+        return pd.DataFrame(X, columns=model.feature_names_in_, copy=False)
+    return X
+
+
+def _divide(numerator, denominator):
+    # 0 where denominator is 0, same as sklearn with zero_division="warn" (without the warning)
+    denominator = np.asarray(denominator, dtype=np.float64).copy()
+    mask = denominator == 0
+    denominator[mask] = 1
+    result = np.asarray(numerator, dtype=np.float64) / denominator
+    result[mask] = 0.0
+    return result
+
+
+class ConfusionMatrixAccumulatorClass:
+    """
+    Confusion matrix built batch by batch - labels are collected as they appear, so the final
+    matrix and the metrics derived from it are the same as sklearn's for the whole dataset at once.
+
+    Accuracy and classification report are derived from the matrix only, model predicts
+    every row exactly once and y is never needed in memory as a whole.
+
+    Partial accumulators (parallel chunks, distributed workers) are combined with merge().
+
+    Example usage:
+        accumulator = ConfusionMatrixAccumulatorClass()
+        for X_batch, y_batch in batches:
+            accumulator.update(y_batch, model.predict(X_batch))
+        metrics = accumulator.metrics()
+    """
+    def __init__(self, labels=None, matrix=None):
+        self.labels = np.asarray(labels) if labels is not None else None # sorted
+        self.matrix = np.asarray(matrix, dtype=np.int64) if matrix is not None else None
+
+    def _reindexed(self, labels):
+        # matrix with rows/columns moved to positions of self.labels in (sorted, wider) labels
+        matrix = np.zeros((len(labels), len(labels)), dtype=np.int64)
+        if self.labels is not None and len(self.labels):
+            positions = np.searchsorted(labels, self.labels)
+            matrix[np.ix_(positions, positions)] = self.matrix
+        return matrix
+
+    def _extend_labels(self, labels):
+        if self.labels is None:
+            self.labels = np.unique(labels)
+            self.matrix = np.zeros((len(self.labels), len(self.labels)), dtype=np.int64)
+            return
+        new_labels = np.union1d(self.labels, labels)
+        if len(new_labels) != len(self.labels):
+            self.matrix = self._reindexed(new_labels)
+            self.labels = new_labels
+
+    def update(self, y_true, y_pred):
+        y_true, y_pred = np.asarray(y_true).ravel(), np.asarray(y_pred).ravel()
+        if len(y_true) != len(y_pred):
+            raise ValueError(f"y_true has {len(y_true)} rows, y_pred has {len(y_pred)}")
+        self._extend_labels(np.union1d(np.unique(y_true), np.unique(y_pred)))
+        n_labels = len(self.labels)
+        flat_index = np.searchsorted(self.labels, y_true) * n_labels + np.searchsorted(self.labels, y_pred)
+        self.matrix += np.bincount(flat_index, minlength=n_labels * n_labels).reshape(n_labels, n_labels)
+        return self
+
+    def merge(self, other):
+        if other.labels is None:
+            return self
+        self._extend_labels(other.labels)
+        self.matrix += other._reindexed(self.labels)
+        return self
+
+    @property
+    def n_rows(self):
+        return 0 if self.matrix is None else int(self.matrix.sum())
+
+    def accuracy(self):
+        return float(np.trace(self.matrix) / self.matrix.sum())
+
+    def classification_report(self):
+        """
+        Same dict as sklearn classification_report(y_true, y_pred, output_dict=True)
+        """
+        tp_sum = np.diag(self.matrix)
+        pred_sum = self.matrix.sum(axis=0)
+        true_sum = self.matrix.sum(axis=1)
+
+        # formulas (and float operations) of sklearn precision_recall_fscore_support
+        precision = _divide(tp_sum, pred_sum)
+        recall = _divide(tp_sum, true_sum)
+        f_score = _divide(2.0 * tp_sum.astype(np.float64), 1.0 * true_sum.astype(np.float64) + pred_sum.astype(np.float64))
+
+        report = {}
+        for label, scores in zip(self.labels, zip(precision, recall, f_score, true_sum)):
+            report["%s" % label] = dict(zip(("precision", "recall", "f1-score", "support"), [float(score) for score in scores]))
+        report["accuracy"] = float(_divide([tp_sum.sum()], [pred_sum.sum()])[0])
+        support = float(np.sum(true_sum))
+        report["macro avg"] = {
+            "precision": float(np.average(precision)),
+            "recall": float(np.average(recall)),
+            "f1-score": float(np.average(f_score)),
+            "support": support,
+        }
+        weights = true_sum if true_sum.sum() else None
+        report["weighted avg"] = {
+            "precision": float(np.average(precision, weights=weights)),
+            "recall": float(np.average(recall, weights=weights)),
+            "f1-score": float(np.average(f_score, weights=weights)),
+            "support": support,
+        }
+        return report
+
+    def metrics(self):
+        """
+        Metrics dict stored in metrics.json (same keys and values as evaluate_model_static always had)
+        """
+        if not self.n_rows:
+            raise ValueError("Nothing was evaluated, confusion matrix is empty")
+        return {
+            "accuracy": self.accuracy(),
+            "classification_report": self.classification_report(),
+            "confusion_matrix": self.matrix.tolist(),
+        }
+
+
+class EvaluationEngineClass:
+    """
+    Single pass, chunked model evaluation.
+
+    Test set (arrays / DataFrame, or any iterator of (X, y) batches, e.g. LoaderClass.iter_batches)
+    is scored chunk by chunk, every row is predicted once and only the confusion matrix is kept
+    (see ConfusionMatrixAccumulatorClass) - memory is bounded by chunk size, not test set size.
+
+    With max_workers > 1 chunks are scored on a thread pool (tree traversal and numpy release the GIL,
+    model is shared, not copied), at most 2 * max_workers chunks are in flight.
+
+    Example usage:
+        metrics = EvaluationEngineClass(chunk_size=50_000, max_workers=4).evaluate(model, X_test, y_test)
+        metrics = EvaluationEngineClass().evaluate_batches(model, loader.iter_batches(TEST_DATASET_PATH))
+    """
+    def __init__(self, chunk_size=EVAL_CHUNK_SIZE, max_workers=EVAL_MAX_WORKERS):
+        self.chunk_size = chunk_size
+        self.max_workers = max_workers or 1
+
+    @staticmethod
+    def score_batch(model, X, y):
+        return ConfusionMatrixAccumulatorClass().update(y, model.predict(as_model_input(model, X)))
+
+    def _chunks(self, X, y):
+        y = np.asarray(y)
+        for start in range(0, len(y), self.chunk_size):
+            X_chunk = X.iloc[start:start + self.chunk_size] if isinstance(X, pd.DataFrame) else X[start:start + self.chunk_size]
+            yield X_chunk, y[start:start + self.chunk_size]
+
+    def accumulate(self, model, batches):
+        """
+        Returns:
+            ConfusionMatrixAccumulatorClass: confusion matrix of all batches
+        """
+        accumulator = ConfusionMatrixAccumulatorClass()
+        if self.max_workers == 1:
+            for X, y in batches:
+                accumulator.merge(self.score_batch(model, X, y))
+            return accumulator
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            pending = deque()
+            for X, y in batches:
+                pending.append(executor.submit(self.score_batch, model, X, y))
+                if len(pending) >= 2 * self.max_workers:
+                    accumulator.merge(pending.popleft().result())
+            while pending:
+                accumulator.merge(pending.popleft().result())
+        return accumulator
+
+    def evaluate_batches(self, model, batches):
+        return self.accumulate(model, batches).metrics()
+
+    def evaluate(self, model, X_test, y_test):
+        return self.evaluate_batches(model, self._chunks(X_test, y_test))
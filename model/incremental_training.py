@@ -0,0 +1,112 @@
+import time
+
+import numpy as np
+
+from model.model_class import ModelClass
+from model.training_constants import INCREMENTAL_N_ESTIMATORS, N_JOBS
+from ec2_s3_managment.s3_class import S3ManagerClass
+from ec2_s3_managment.tracing import traced
+from ec2_s3_managment.logger_config import logger
+
+
+class IncrementalTrainingClass:
+    """
+    Incremental (warm start) training - continues the forest of the newest completed run.
+
+    1. model of the newest completed Output_N folder is loaded straight from S3 (nothing written to disk)
+    2. n_new_estimators trees are added with warm_start on the new training data - the old trees
+       are kept as they are, so only the new trees cost compute
+    3. resulting forest is uploaded as the next run (Output_N+1) with metrics, which record
+       how many trees were reused and how many were added
+
+    If there is no completed run yet, a new forest (ModelClass defaults) is trained instead.
+
+    Example usage:
+        incremental_training = IncrementalTrainingClass(n_new_estimators=20)
+        metrics = incremental_training.run(X_train, y_train, X_test, y_test)
+    """
+    def __init__(self, n_new_estimators=INCREMENTAL_N_ESTIMATORS, s3_manager=None):
+        if n_new_estimators < 1:
+            raise ValueError(f"n_new_estimators must be at least 1, got {n_new_estimators}")
+        self.n_new_estimators = n_new_estimators
+        self.s3_manager = s3_manager or S3ManagerClass()
+
+    @traced("load_base_model")
+    def load_base_model(self):
+        """
+        Returns:
+            tuple: (model of the newest completed run, its run index), (None, None) if there is no completed run
+        """
+        self.s3_manager.update_download_paths()
+        if not self.s3_manager.download_possible:
+            return None, None
+
+        base_index = self.s3_manager.download_index
+        base_model = self.s3_manager.load_model(base_index)
+        logger.info(f"Loaded base model of run {base_index}: {len(base_model.estimators_)} trees")
+        return base_model, base_index
+
+    @staticmethod
+    def check_compatible(base_model, X_train, y_train):
+        """
+        New trees must see the same features and classes as the old ones, otherwise
+        predictions of old and new trees can't be averaged
+        """
+        n_features = np.shape(X_train)[1]
+        if n_features != base_model.n_features_in_:
+            raise ValueError(f"Base model was trained on {base_model.n_features_in_} features, new data has {n_features}")
+        classes = np.unique(np.asarray(y_train))
+        if not np.array_equal(classes, base_model.classes_):
+            raise ValueError(f"Base model classes {base_model.classes_.tolist()} differ from classes of new data {classes.tolist()}")
+
+    @traced("train_model")
+    def extend_model(self, base_model, X_train, y_train):
+        """
+        Adds n_new_estimators trees to base_model (in place), fitted on X_train, y_train
+
+        sklearn keeps the already fitted estimators_ when warm_start is set and only fits
+        n_estimators - len(estimators_) new trees
+        """
+        self.check_compatible(base_model, X_train, y_train)
+        trees_reused = len(base_model.estimators_)
+        # n_jobs of the instance this runs on, not of the one the base model was trained on
+        base_model.set_params(warm_start=True, n_estimators=trees_reused + self.n_new_estimators, n_jobs=N_JOBS)
+        logger.info(f"Training Started: adding {self.n_new_estimators} trees to forest with {trees_reused} trees")
+        base_model.fit(X_train, y_train)
+        # uploaded model behaves like any other - a later fit() retrains it from scratch
+        base_model.set_params(warm_start=False)
+        logger.info("Model training completed")
+        return base_model
+
+    def run(self, X_train, y_train, X_test, y_test):
+        """
+        Returns:
+            dict: metrics of the new model, with "incremental_training" section
+        """
+        base_model, base_index = self.load_base_model()
+
+        start_time = time.perf_counter()
+        if base_model is None:
+            logger.info("No completed run to continue from, training a new forest")
+            model_instance = ModelClass()
+            model_instance.train_model(X_train, y_train)
+            model, trees_reused = model_instance.model, 0
+        else:
+            trees_reused = len(base_model.estimators_)
+            model = self.extend_model(base_model, X_train, y_train)
+        training_seconds = time.perf_counter() - start_time
+
+        metrics = ModelClass.evaluate_model_static(model, X_test, y_test)
+        metrics["incremental_training"] = {
+            "base_run_index": base_index,
+            "trees_reused": trees_reused,
+            "trees_added": len(model.estimators_) - trees_reused,
+            "n_estimators": len(model.estimators_),
+            "training_seconds": training_seconds,
+        }
+        logger.info(f"Incremental training: {metrics['incremental_training']}")
+
+        self.s3_manager.upload_metrics_to_s3(metrics)
+        self.s3_manager.upload_model_to_s3(model)
+        self.s3_manager.upload_timings_to_s3()
+        return metrics
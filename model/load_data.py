@@ -1,25 +1,227 @@
+import io
+import os
+from contextlib import contextmanager
+
+import numpy as np
 import pandas as pd
 
-from model.training_constants import TRAIN_DATASET_PATH, TEST_DATASET_PATH
+from model.training_constants import (
+    TRAIN_DATASET_PATH, TEST_DATASET_PATH, CHUNK_SIZE, FEATURE_DTYPE, LABEL_DTYPE, STREAMING_LOAD, USE_DATASET_CACHE)
+from model.dataset_cache import DatasetCacheClass
+from ec2_s3_managment.s3_range_reader import S3RangeReaderClass, is_s3_uri, parse_s3_uri
+from ec2_s3_managment.tracing import tracer, traced
 from ec2_s3_managment.logger_config import logger
 
 class LoaderClass:
-    def __init__(self):
-        pass
+    """
+    Loads train and test datasets (csv, last column is the label).
+
+    Two APIs:
+        load_training_data()    tuple (X_train, y_train, X_test, y_test)
+        iter_batches(path)      generator of (X, y) numpy batches, chunk_size rows each
+
+    In streaming mode csv is parsed chunk by chunk with compact dtypes (float32 features,
+    small int labels), so peak memory is bounded by the chunk size, not the csv size.
+
+    With use_cache csv is parsed only once into a binary cache (see DatasetCacheClass),
+    next runs memory-map X and y without parsing.
+
+    Dataset paths can also be S3 uris (s3://bucket/key). Those are always loaded in streaming mode,
+    csv is read with parallel ranged GETs (see S3RangeReaderClass) straight into the chunk parser,
+    nothing is written to local disk.
 
-    def load_training_data(self):
+    Example usage:
+        loader = LoaderClass()
+        for X_batch, y_batch in loader.iter_batches(TEST_DATASET_PATH):
+            ...
+    """
+    def __init__(self, train_dataset_path=TRAIN_DATASET_PATH, test_dataset_path=TEST_DATASET_PATH, chunk_size=CHUNK_SIZE, s3_client=None):
+        self.train_dataset_path = train_dataset_path
+        self.test_dataset_path = test_dataset_path
+        self.chunk_size = chunk_size
+        self._s3_client = s3_client
+
+    @property
+    def s3_client(self):
+        # only needed for s3:// datasets
+        if self._s3_client is None:
+            from ec2_s3_managment.s3_class import create_s3_client
+            self._s3_client = create_s3_client()
+        return self._s3_client
+
+    @contextmanager
+    def _open_dataset(self, dataset_path, header_only=False):
+        """
+        Yields something pd.read_csv can read - local path as it is, or buffered S3 range reader
+        """
+        if not is_s3_uri(dataset_path):
+            if not header_only:
+                tracer.add_bytes(os.path.getsize(dataset_path))
+            yield dataset_path
+            return
+        bucket_name, key = parse_s3_uri(dataset_path)
+        # header needs only the first few KB - one small block, no prefetching
+        reader_kwargs = {"block_size": 64 * 1024, "prefetch_blocks": 1} if header_only else {}
+        with S3RangeReaderClass(self.s3_client, bucket_name, key, **reader_kwargs) as raw_reader:
+            yield io.BufferedReader(raw_reader, buffer_size=1024 * 1024)
+
+    def _has_s3_dataset(self):
+        return is_s3_uri(self.train_dataset_path) or is_s3_uri(self.test_dataset_path)
+
+    @traced("load_training_data")
+    def load_training_data(self, streaming=STREAMING_LOAD, use_cache=USE_DATASET_CACHE):
         """Load and prepare data for training TEST example"""
-        logger.info(f"Loading data from {TRAIN_DATASET_PATH} and {TEST_DATASET_PATH}")
-        
-        train_data = pd.read_csv(TRAIN_DATASET_PATH)
-        test_data = pd.read_csv(TEST_DATASET_PATH)
-        
+        if self._has_s3_dataset():
+            return self.load_training_data_chunked()
+        if use_cache:
+            return self.load_training_data_cached()
+        if streaming:
+            return self.load_training_data_chunked()
+
+        logger.info(f"Loading data from {self.train_dataset_path} and {self.test_dataset_path}")
+
+        train_data = pd.read_csv(self.train_dataset_path)
+        test_data = pd.read_csv(self.test_dataset_path)
+        tracer.add_bytes(os.path.getsize(self.train_dataset_path) + os.path.getsize(self.test_dataset_path))
+
         # Prepare data
         X_train = train_data.iloc[:, :-1]
         y_train = train_data.iloc[:, -1]
         X_test = test_data.iloc[:, :-1]
         y_test = test_data.iloc[:, -1]
-        
+
         logger.info(f"Training data shape: {X_train.shape}, Test data shape: {X_test.shape}")
-        
-        return X_train, y_train, X_test, y_test
\ No newline at end of file
+
+        return X_train, y_train, X_test, y_test
+
+    # streaming mode
+    def _column_dtypes(self, dataset_path):
+        """
+        Reads only the header, features -> FEATURE_DTYPE, label (last column) -> LABEL_DTYPE
+        """
+        with self._open_dataset(dataset_path, header_only=True) as dataset:
+            columns = pd.read_csv(dataset, nrows=0).columns
+        dtypes = {column: FEATURE_DTYPE for column in columns[:-1]}
+        dtypes[columns[-1]] = LABEL_DTYPE
+        return columns, dtypes
+
+    def iter_batches(self, dataset_path, chunk_size=None):
+        """
+        Yields (X, y) numpy batches of at most chunk_size rows
+
+        X is FEATURE_DTYPE 2d array, y is LABEL_DTYPE 1d array,
+        csv is never fully in memory - only one chunk at a time
+        """
+        columns, dtypes = self._column_dtypes(dataset_path)
+        feature_columns, label_column = list(columns[:-1]), columns[-1]
+        with self._open_dataset(dataset_path) as dataset:
+            with pd.read_csv(dataset, dtype=dtypes, chunksize=chunk_size or self.chunk_size) as reader:
+                for chunk in reader:
+                    yield chunk[feature_columns].to_numpy(dtype=FEATURE_DTYPE), chunk[label_column].to_numpy(dtype=LABEL_DTYPE)
+
+    def iter_feature_batches(self, dataset_path, n_features, chunk_size=None):
+        """
+        Yields FEATURE_DTYPE 2d feature batches of at most chunk_size rows, used for scoring
+
+        Input may have labels or not - if it has n_features + 1 columns, last column is the label and it is dropped
+        """
+        with self._open_dataset(dataset_path, header_only=True) as dataset:
+            columns = pd.read_csv(dataset, nrows=0).columns
+        if len(columns) not in (n_features, n_features + 1):
+            raise ValueError(f"{dataset_path} has {len(columns)} columns, expected {n_features} features (and optional label)")
+        feature_columns = list(columns[:n_features])
+        with self._open_dataset(dataset_path) as dataset:
+            with pd.read_csv(dataset, usecols=feature_columns, dtype=FEATURE_DTYPE, chunksize=chunk_size or self.chunk_size) as reader:
+                for chunk in reader:
+                    yield chunk[feature_columns].to_numpy(dtype=FEATURE_DTYPE)
+
+    @staticmethod
+    def _count_rows(dataset_path):
+        # counting newlines block by block, much cheaper than parsing
+        rows, last_byte = 0, b"\n"
+        with open(dataset_path, "rb") as file:
+            for block in iter(lambda: file.read(1024 * 1024), b""):
+                rows += block.count(b"\n")
+                last_byte = block[-1:]
+        rows += last_byte != b"\n" # last line without newline
+        return rows - 1 # header
+
+    def dataset_profile(self, dataset_path, sample_rows=1000):
+        """
+        Shape of a dataset without reading it - size of the file (head_object for S3) and
+        first sample_rows rows, used to size the training instance (see CapacityPlannerClass)
+
+        Returns:
+            dict: {"n_rows": estimated from average sampled line length, "n_features", "n_classes": seen in the sample, "bytes"}
+        """
+        if is_s3_uri(dataset_path):
+            bucket_name, key = parse_s3_uri(dataset_path)
+            dataset_bytes = self.s3_client.head_object(Bucket=bucket_name, Key=key)['ContentLength']
+        else:
+            dataset_bytes = os.path.getsize(dataset_path)
+        with self._open_dataset(dataset_path, header_only=True) as dataset:
+            with (open(dataset, "rb") if isinstance(dataset, str) else dataset) as lines_reader:
+                lines = [line for _, line in zip(range(sample_rows + 1), lines_reader)]
+        sample = pd.read_csv(io.BytesIO(b"".join(lines)))
+        if len(lines) <= sample_rows:
+            n_rows = len(sample) # whole file was sampled
+        else:
+            n_rows = int((dataset_bytes - len(lines[0])) / (sum(map(len, lines[1:])) / len(sample)))
+        return {"n_rows": n_rows, "n_features": sample.shape[1] - 1, "n_classes": int(sample.iloc[:, -1].nunique()), "bytes": dataset_bytes}
+
+    def load_dataset_chunked(self, dataset_path):
+        """
+        Builds compact (X, y) arrays from chunks
+
+        Output arrays are allocated once (rows are counted first) and filled chunk by chunk,
+        so peak memory is final compact arrays + one chunk
+
+        Rows of S3 datasets can't be counted without reading the whole object, their chunks are
+        concatenated at the end instead (peak memory 2x final compact arrays)
+        """
+        if is_s3_uri(dataset_path):
+            X_batches, y_batches = [], []
+            for X_batch, y_batch in self.iter_batches(dataset_path):
+                X_batches.append(X_batch)
+                y_batches.append(y_batch)
+            return np.concatenate(X_batches), np.concatenate(y_batches)
+
+        n_rows = self._count_rows(dataset_path)
+        columns, _ = self._column_dtypes(dataset_path)
+        X = np.empty((n_rows, len(columns) - 1), dtype=FEATURE_DTYPE)
+        y = np.empty(n_rows, dtype=LABEL_DTYPE)
+
+        position = 0
+        for X_batch, y_batch in self.iter_batches(dataset_path):
+            X[position:position + len(X_batch)] = X_batch
+            y[position:position + len(y_batch)] = y_batch
+            position += len(X_batch)
+        # blank trailing lines are counted but not parsed
+        return X[:position], y[:position]
+
+    def load_training_data_chunked(self):
+        """
+        Same as load_training_data but returns compact numpy arrays built chunk by chunk
+        """
+        logger.info(f"Loading data in chunks of {self.chunk_size} rows from {self.train_dataset_path} and {self.test_dataset_path}")
+
+        X_train, y_train = self.load_dataset_chunked(self.train_dataset_path)
+        X_test, y_test = self.load_dataset_chunked(self.test_dataset_path)
+
+        logger.info(f"Training data shape: {X_train.shape}, Test data shape: {X_test.shape}")
+
+        return X_train, y_train, X_test, y_test
+
+    def load_training_data_cached(self, dataset_cache=None):
+        """
+        Same as load_training_data but X and y are read-only memory-mapped arrays from the dataset cache
+        """
+        dataset_cache = dataset_cache or DatasetCacheClass()
+        logger.info(f"Loading data from dataset cache {dataset_cache.cache_dir}")
+
+        X_train, y_train = dataset_cache.load(self.train_dataset_path, self)
+        X_test, y_test = dataset_cache.load(self.test_dataset_path, self)
+
+        logger.info(f"Training data shape: {X_train.shape}, Test data shape: {X_test.shape}")
+
+        return X_train, y_train, X_test, y_test
@@ -1,41 +1,40 @@
 from sklearn.ensemble import RandomForestClassifier
-from sklearn.metrics import classification_report, confusion_matrix
 
-from model.training_constants import (N_ESTIMATORS, RANDOM_STATE)
+from model.training_constants import (N_ESTIMATORS, RANDOM_STATE, N_JOBS, EVAL_CHUNK_SIZE, EVAL_MAX_WORKERS)
+from model.evaluation import EvaluationEngineClass
+from ec2_s3_managment.tracing import traced
 from ec2_s3_managment.logger_config import logger
 
 class ModelClass:
-    def __init__(self):
+    def __init__(self, n_estimators=N_ESTIMATORS, random_state=RANDOM_STATE, n_jobs=N_JOBS, **model_params):
+        self.n_estimators = n_estimators
+        self.random_state = random_state
         self.model = RandomForestClassifier(
-            n_estimators=N_ESTIMATORS,
-            random_state=RANDOM_STATE
+            n_estimators=n_estimators,
+            random_state=random_state,
+            n_jobs=n_jobs,
+            **model_params
         )
 
+    @traced("train_model")
     def train_model(self, X_train, y_train):
         """Train the model."""
-        logger.info(f"Training Started: Random Forest with {N_ESTIMATORS} trees, random_state={RANDOM_STATE}")
+        logger.info(f"Training Started: Random Forest with {self.n_estimators} trees, random_state={self.random_state}")
         self.model.fit(X_train, y_train)
         logger.info("Model training completed")
     
     @staticmethod
-    def evaluate_model_static(model, X_test, y_test):
-        """Evaluate model and log metrics."""
-        
-        # Basic metrics
-        y_pred = model.predict(X_test)
-        accuracy = model.score(X_test, y_test)
-        
-        # More detailed metrics
-        report = classification_report(y_test, y_pred, output_dict=True)
-        conf_matrix = confusion_matrix(y_test, y_pred).tolist()
-        
-        # Store metrics in dictionary
-        metrics = {
-            "accuracy": accuracy,
-            "classification_report": report,
-            "confusion_matrix": conf_matrix,
-        }
+    @traced("evaluate_model")
+    def evaluate_model_static(model, X_test, y_test, chunk_size=None, max_workers=None):
+        """
+        Evaluate model and log metrics.
 
-        return metrics
-        
+        Every test row is predicted once, chunk by chunk, accuracy, classification report and
+        confusion matrix are all derived from the accumulated confusion matrix (see EvaluationEngineClass)
+        """
+        engine = EvaluationEngineClass(chunk_size or EVAL_CHUNK_SIZE, max_workers or EVAL_MAX_WORKERS)
+
+        # Store metrics in dictionary - accuracy, classification_report, confusion_matrix
+        metrics = engine.evaluate(model, X_test, y_test)
 
+        return metrics
@@ -0,0 +1,171 @@
+import os
+import json
+import time
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+
+import joblib
+import numpy as np
+from sklearn.model_selection import ParameterGrid, ParameterSampler
+
+from model.model_class import ModelClass
+from model.training_constants import RANDOM_STATE, SWEEP_SEARCH_SPACE, SWEEP_N_ITER, SWEEP_MAX_WORKERS
+from ec2_s3_managment.s3_class import S3ManagerClass
+from ec2_s3_managment.logger_config import logger
+
+
+class SharedArraysClass:
+    """
+    Numpy arrays placed once in shared memory, worker processes attach to them by name
+    instead of receiving a pickled copy of the data for every task.
+
+    Example usage:
+        shared_arrays = SharedArraysClass({"X_train": X_train, "y_train": y_train})
+        executor = ProcessPoolExecutor(initializer=init_worker, initargs=(shared_arrays.descriptors,))
+        ...
+        shared_arrays.close()
+    """
+    def __init__(self, arrays):
+        self._shared_memory_blocks = []
+        self.descriptors = {}
+        for name, array in arrays.items():
+            array = np.ascontiguousarray(array)
+            shared_memory_block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            np.ndarray(array.shape, dtype=array.dtype, buffer=shared_memory_block.buf)[...] = array
+            self._shared_memory_blocks.append(shared_memory_block)
+            self.descriptors[name] = (shared_memory_block.name, array.shape, array.dtype.str)
+
+    @staticmethod
+    def attach(descriptors):
+        """
+        Returns:
+            tuple: (dict name -> read-only array, list of SharedMemory handles - keep them alive while arrays are used)
+        """
+        arrays, handles = {}, []
+        for name, (shared_memory_name, shape, dtype) in descriptors.items():
+            # pool workers share the creator's resource tracker, so attaching doesn't take ownership - only close() of the creator unlinks
+            shared_memory_block = shared_memory.SharedMemory(name=shared_memory_name)
+            array = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shared_memory_block.buf)
+            array.flags.writeable = False
+            arrays[name] = array
+            handles.append(shared_memory_block)
+        return arrays, handles
+
+    def close(self):
+        for shared_memory_block in self._shared_memory_blocks:
+            shared_memory_block.close()
+            shared_memory_block.unlink()
+        self._shared_memory_blocks = []
+
+
+# worker process state, set once per process by _init_worker
+_worker_arrays = None
+_worker_handles = None
+
+
+def _init_worker(descriptors):
+    global _worker_arrays, _worker_handles
+    _worker_arrays, _worker_handles = SharedArraysClass.attach(descriptors)
+
+
+def _train_candidate(candidate_index, params, output_dir):
+    start_time = time.perf_counter()
+    # candidates already run in parallel processes, one core each
+    model_instance = ModelClass(**{"n_jobs": 1, **params})
+    model_instance.train_model(_worker_arrays["X_train"], _worker_arrays["y_train"])
+    metrics = ModelClass.evaluate_model_static(model_instance.model, _worker_arrays["X_test"], _worker_arrays["y_test"])
+
+    # model goes through a local file, only the best one is kept
+    model_path = os.path.join(output_dir, f"candidate_{candidate_index}.joblib")
+    joblib.dump(model_instance.model, model_path)
+    return candidate_index, params, metrics, model_path, time.perf_counter() - start_time
+
+
+class SweepEngineClass:
+    """
+    Hyperparameter sweep around ModelClass, all candidates trained in one run (one EC2 launch).
+
+    1. Candidates are generated from search_space - full grid (n_iter=None) or n_iter random samples
+    2. Train/test arrays are put in shared memory once, candidates are trained and evaluated on a process pool
+    3. Metrics of every candidate are uploaded to Output_N/sweep/candidate_<i>.json
+    4. Best candidate (by accuracy) is uploaded as Output_N/model.joblib, its metrics with the sweep
+       summary as Output_N/metrics.json - so the best model is downloaded like any other run
+
+    Example usage:
+        sweep_engine = SweepEngineClass({"n_estimators": [50, 100], "max_depth": [None, 10]})
+        summary = sweep_engine.run(X_train, y_train, X_test, y_test)
+    """
+    def __init__(self, search_space=SWEEP_SEARCH_SPACE, n_iter=SWEEP_N_ITER, max_workers=SWEEP_MAX_WORKERS, random_state=RANDOM_STATE, s3_manager=None):
+        self.search_space = search_space
+        self.n_iter = n_iter
+        self.max_workers = max_workers or os.cpu_count()
+        self.random_state = random_state
+        self.s3_manager = s3_manager or S3ManagerClass()
+
+    def candidates(self):
+        if self.n_iter is None:
+            candidates = list(ParameterGrid(self.search_space))
+        else:
+            candidates = list(ParameterSampler(self.search_space, n_iter=self.n_iter, random_state=self.random_state))
+        # every candidate gets the same random_state unless the search space sets it
+        return [{"random_state": self.random_state, **params} for params in candidates]
+
+    def _upload_candidate_metrics(self, candidate_index, params, metrics, seconds):
+        key = self.s3_manager.s3_upload_root + f"/sweep/candidate_{candidate_index}.json"
+        body = json.dumps({"params": params, "seconds": seconds, "metrics": metrics}, indent=4, default=str).encode("utf-8")
+        self.s3_manager.s3_client.put_object(Body=body, Bucket=self.s3_manager.bucket_name, Key=key)
+
+    def run(self, X_train, y_train, X_test, y_test):
+        """
+        Returns:
+            dict: sweep summary - best candidate, accuracy of every candidate, candidates per minute
+        """
+        candidates = self.candidates()
+        logger.info(f"=== Sweep: {len(candidates)} candidates on {self.max_workers} processes, run {self.s3_manager.upload_index} ===")
+
+        shared_arrays = SharedArraysClass({
+            "X_train": np.asarray(X_train), "y_train": np.asarray(y_train),
+            "X_test": np.asarray(X_test), "y_test": np.asarray(y_test),
+        })
+        output_dir = tempfile.mkdtemp(prefix="sweep_")
+        start_time = time.perf_counter()
+        results, best = [], None
+        try:
+            with ProcessPoolExecutor(max_workers=self.max_workers, initializer=_init_worker, initargs=(shared_arrays.descriptors,)) as executor:
+                futures = [executor.submit(_train_candidate, candidate_index, params, output_dir) for candidate_index, params in enumerate(candidates)]
+                for future in as_completed(futures):
+                    candidate_index, params, metrics, model_path, seconds = future.result()
+                    logger.info(f"Candidate {candidate_index} {params}: accuracy {metrics['accuracy']:.4f} ({seconds:.1f}s)")
+                    self._upload_candidate_metrics(candidate_index, params, metrics, seconds)
+                    results.append({"candidate": candidate_index, "params": params, "accuracy": metrics["accuracy"], "seconds": seconds})
+
+                    # ties go to the lower candidate index, so the result doesn't depend on completion order
+                    if best is None or (metrics["accuracy"], -candidate_index) > (best["metrics"]["accuracy"], -best["candidate"]):
+                        if best is not None:
+                            os.remove(best["model_path"])
+                        best = {"candidate": candidate_index, "params": params, "metrics": metrics, "model_path": model_path}
+                    else:
+                        os.remove(model_path)
+            elapsed = time.perf_counter() - start_time
+
+            summary = {
+                "best_candidate": best["candidate"],
+                "best_params": best["params"],
+                "candidates": sorted(results, key=lambda result: result["candidate"]),
+                "seconds": elapsed,
+                "candidates_per_minute": len(candidates) / elapsed * 60,
+            }
+            logger.info(
+                f"Sweep finished: {len(candidates)} candidates in {elapsed:.1f}s ({summary['candidates_per_minute']:.2f} candidates/min), "
+                f"best candidate {best['candidate']} {best['params']} accuracy {best['metrics']['accuracy']:.4f}"
+            )
+
+            self.s3_manager.upload_metrics_to_s3({**best["metrics"], "sweep": summary})
+            self.s3_manager.upload_model_to_s3(joblib.load(best["model_path"]))
+            self.s3_manager.upload_timings_to_s3()
+        finally:
+            shared_arrays.close()
+            shutil.rmtree(output_dir, ignore_errors=True)
+        return summary
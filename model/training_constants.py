@@ -1,7 +1,48 @@
-# paths
-TRAIN_DATASET_PATH = "model/Resources/train_dataset.csv"
-TEST_DATASET_PATH = "model/Resources/test_dataset.csv"
+import os
+
+# paths - local csv or s3://bucket/key, can be overridden with environment variables
+# (docker run -e TRAIN_DATASET_PATH=s3://... ) so new data doesn't need a new image
+TRAIN_DATASET_PATH = os.getenv("TRAIN_DATASET_PATH", "model/Resources/train_dataset.csv")
+TEST_DATASET_PATH = os.getenv("TEST_DATASET_PATH", "model/Resources/test_dataset.csv")
 
 # hyperparameters
 N_ESTIMATORS = 100
-RANDOM_STATE = 42
\ No newline at end of file
+RANDOM_STATE = 42
+# cores fitting trees of one forest, set per instance by the capacity planner (docker run -e N_JOBS=...)
+N_JOBS = int(os.getenv("N_JOBS", "1"))
+
+# training mode of the container: "single" - one model with hyperparameters above, "sweep" - hyperparameter sweep,
+# "incremental" - newest completed model gets INCREMENTAL_N_ESTIMATORS new trees (warm start)
+TRAINING_MODE = os.getenv("TRAINING_MODE", "single")
+
+# hyperparameter sweep (see SweepEngineClass)
+SWEEP_SEARCH_SPACE = {
+    "n_estimators": [50, 100, 200],
+    "max_depth": [None, 5, 10],
+    "min_samples_leaf": [1, 2],
+}
+SWEEP_N_ITER = None # None - full grid, int - number of random samples from the search space
+SWEEP_MAX_WORKERS = None # processes, None - all cores
+
+# incremental training (see IncrementalTrainingClass)
+INCREMENTAL_N_ESTIMATORS = 20 # trees added to the newest completed model per run
+
+# distributed training - trees are split across N_WORKERS EC2 instances (1 = single instance)
+N_WORKERS = 1
+
+# batch inference (see BatchInferenceClass)
+INFERENCE_CHUNK_SIZE = 50_000 # rows per task sent to an inference process
+INFERENCE_MAX_WORKERS = None # processes, None - all cores, 1 - score in this process
+SCORING_SHARDS_PER_WORKER = 4 # distributed scoring - input files are split into n_workers * this shards (see DistributedScoringClass)
+
+# evaluation (see EvaluationEngineClass)
+EVAL_CHUNK_SIZE = 100_000 # test rows predicted at once
+EVAL_MAX_WORKERS = 1 # threads scoring chunks in parallel
+
+# data loading
+STREAMING_LOAD = False # True - parse csv in chunks into compact numpy arrays (see LoaderClass)
+CHUNK_SIZE = 100_000 # rows per chunk in streaming mode
+FEATURE_DTYPE = "float32" # random forest works in float32 internally anyway
+LABEL_DTYPE = "int16" # labels must be integer encoded
+USE_DATASET_CACHE = False # True - parse csv once into binary cache and memory-map it in next runs (see DatasetCacheClass)
+DATASET_CACHE_DIR = "model/Resources/.dataset_cache"
@@ -0,0 +1,21 @@
+import os
+import sys
+
+import pytest
+
+# project root modules (ec2_s3_managment, model) are imported the same way the entry points import them
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ec2_s3_managment.local_s3_client import LocalS3ClientClass
+
+BUCKET_NAME = "test-bucket"
+
+
+@pytest.fixture
+def s3_client(tmp_path, monkeypatch):
+    """
+    Local S3 stand-in (see LocalS3ClientClass) in a fresh folder, S3ManagerClass uses it too
+    """
+    monkeypatch.setenv("S3_LOCAL_ROOT", str(tmp_path / "s3"))
+    monkeypatch.setenv("S3_BUCKET_NAME", BUCKET_NAME)
+    return LocalS3ClientClass(str(tmp_path / "s3"))
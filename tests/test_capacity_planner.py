@@ -0,0 +1,57 @@
+import pytest
+
+from ec2_s3_managment.capacity_planner import CapacityPlannerClass, WorkloadClass
+
+INSTANCE_TYPES = {
+    "small.burst": {"vcpus": 2, "memory_gib": 2, "price": 0.02, "burstable": True},
+    "medium":      {"vcpus": 4, "memory_gib": 8, "price": 0.2, "burstable": False},
+    "large":       {"vcpus": 16, "memory_gib": 32, "price": 0.8, "burstable": False},
+    "highmem":     {"vcpus": 8, "memory_gib": 128, "price": 1.0, "burstable": False},
+}
+
+
+def make_planner(**kwargs):
+    return CapacityPlannerClass(instance_types=INSTANCE_TYPES, use_spot=True, target_seconds=3600, setup_seconds=120, **kwargs)
+
+
+def test_small_workload_gets_cheapest_type():
+    plan = make_planner().plan(WorkloadClass(n_rows=1000, n_features=4, models=[{"n_estimators": 50}]))
+
+    assert plan["instance_type"] == "small.burst"
+    assert plan["spot"] is True
+
+
+def test_big_workload_gets_cores_to_make_the_target():
+    workload = WorkloadClass(n_rows=2_000_000, n_features=50, models=[{"n_estimators": 400, "max_depth": 20}])
+    plan = make_planner().plan(workload)
+
+    assert plan["instance_type"] in ("large", "highmem")
+    assert plan["n_jobs"] == INSTANCE_TYPES[plan["instance_type"]]["vcpus"]
+
+
+def test_types_without_enough_memory_are_skipped():
+    # fully grown forest on many rows - only the high memory type fits
+    workload = WorkloadClass(n_rows=10_000_000, n_features=10, models=[{"n_estimators": 100}])
+    options = make_planner().evaluate(workload)
+
+    assert [option[0] for option in options] == ["highmem"]
+
+
+def test_no_type_fits_raises():
+    workload = WorkloadClass(n_rows=50_000_000, n_features=200, models=[{"n_estimators": 500}])
+    with pytest.raises(ValueError):
+        make_planner().evaluate(workload)
+
+
+def test_sweep_runs_one_core_per_candidate():
+    models = [{"n_estimators": 100, "max_depth": depth} for depth in (5, 10, 15, 20)]
+    plan = make_planner().plan(WorkloadClass(n_rows=100_000, n_features=20, models=models, parallel_models=True))
+
+    assert plan["n_jobs"] == 1
+
+
+def test_launch_attempts_try_spot_then_on_demand_of_every_type():
+    plan = {"instance_type": "medium", "fallback_types": ["large"], "spot": True}
+    assert CapacityPlannerClass.launch_attempts(plan) == [("medium", True), ("medium", False), ("large", True), ("large", False)]
+
+    assert CapacityPlannerClass.launch_attempts({**plan, "spot": False}) == [("medium", False), ("large", False)]
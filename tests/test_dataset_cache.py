@@ -0,0 +1,67 @@
+import os
+
+import numpy as np
+
+from model.dataset_cache import DatasetCacheClass
+from model.load_data import LoaderClass
+
+
+def write_csv(path, rows):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as file:
+        file.write("f0,f1,label\n")
+        file.writelines(f"{f0},{f1},{label}\n" for f0, f1, label in rows)
+
+
+def entry_names(cache_dir):
+    return sorted(name for name in os.listdir(cache_dir) if os.path.isdir(os.path.join(cache_dir, name)))
+
+
+def test_sources_with_the_same_name_keep_their_own_entries(tmp_path):
+    cache = DatasetCacheClass(str(tmp_path / "cache"))
+    first_path, second_path = str(tmp_path / "first" / "train.csv"), str(tmp_path / "second" / "train.csv")
+    write_csv(first_path, [(1.0, 2.0, 0), (3.0, 4.0, 1)])
+    write_csv(second_path, [(5.0, 6.0, 1)])
+
+    _, first_y = cache.load(first_path, LoaderClass())
+    second_X, second_y = cache.load(second_path, LoaderClass())
+
+    # building the second source didn't remove the entry of the first one
+    assert os.path.isdir(cache.entry_dir(first_path))
+    assert len(entry_names(cache.cache_dir)) == 2
+
+    np.testing.assert_array_equal(cache.load(first_path, LoaderClass())[0], [[1.0, 2.0], [3.0, 4.0]])
+    np.testing.assert_array_equal(first_y, [0, 1])
+    np.testing.assert_array_equal(second_X, [[5.0, 6.0]])
+    np.testing.assert_array_equal(second_y, [1])
+
+
+def test_changed_source_removes_only_its_own_old_entry(tmp_path):
+    cache = DatasetCacheClass(str(tmp_path / "cache"))
+    first_path, second_path = str(tmp_path / "first" / "train.csv"), str(tmp_path / "second" / "train.csv")
+    write_csv(first_path, [(1.0, 2.0, 0)])
+    write_csv(second_path, [(5.0, 6.0, 1)])
+    cache.load(first_path, LoaderClass())
+    cache.load(second_path, LoaderClass())
+    old_first_entry, second_entry = cache.entry_dir(first_path), cache.entry_dir(second_path)
+
+    write_csv(first_path, [(1.0, 2.0, 0), (7.0, 8.0, 1)])
+    X, _ = cache.load(first_path, LoaderClass())
+
+    assert len(X) == 2
+    assert not os.path.exists(old_first_entry)
+    assert os.path.isdir(second_entry)
+    assert entry_names(cache.cache_dir) == sorted([os.path.basename(cache.entry_dir(first_path)), os.path.basename(second_entry)])
+
+
+def test_build_in_progress_of_another_process_is_kept(tmp_path):
+    cache = DatasetCacheClass(str(tmp_path / "cache"))
+    dataset_path = str(tmp_path / "data" / "train.csv")
+    write_csv(dataset_path, [(1.0, 2.0, 0)])
+    foreign_tmp_dir = os.path.join(cache.cache_dir, "train-0123456789abcdef.99999.tmp")
+    os.makedirs(foreign_tmp_dir)
+
+    cache.load(dataset_path, LoaderClass())
+
+    assert os.path.isdir(foreign_tmp_dir)
+    assert not any(name.endswith(f".{os.getpid()}.tmp") for name in os.listdir(cache.cache_dir))
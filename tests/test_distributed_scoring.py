@@ -0,0 +1,80 @@
+import json
+
+import pytest
+
+from model.distributed_scoring import DistributedScoringClass, split_into_shards, shard_key
+from ec2_s3_managment.s3_class import S3ManagerClass
+from conftest import BUCKET_NAME
+
+JOB_PREFIX = "scoring/scoring_test"
+
+
+def test_shards_keep_key_order_and_every_file():
+    objects = [(f"s3://bucket/in/part_{index:02d}.csv", 10) for index in range(10)]
+    shards = split_into_shards(objects, 4)
+
+    assert len(shards) == 4
+    assert [key for shard in shards for key in shard] == [key for key, _ in objects]
+
+
+def test_shards_have_about_equal_bytes():
+    objects = [("a", 3), ("b", 6), ("c", 6), ("d", 5), ("e", 10), ("f", 11), ("g", 10)]
+    sizes = dict(objects)
+    shards = split_into_shards(objects, 5)
+
+    assert shards == [["a", "b"], ["c", "d"], ["e"], ["f"], ["g"]]
+    assert max(sum(sizes[key] for key in shard) for shard in shards) == 11
+
+
+def test_small_file_does_not_pull_a_big_one_into_its_shard():
+    assert split_into_shards([("small", 1), ("big", 100)], 8) == [["small"], ["big"]]
+
+
+def test_never_more_shards_than_files():
+    assert split_into_shards([("only", 5)], 3) == [["only"]]
+
+
+def put_json(s3_client, key, body):
+    s3_client.put_object(Bucket=BUCKET_NAME, Key=key, Body=json.dumps(body).encode("utf-8"))
+
+
+def write_job(s3_client, shard_rows):
+    """
+    Finished job with one shard per shard_rows item - (csv rows, worker index, confusion matrix of labels [0, 1])
+    """
+    put_json(s3_client, f"{JOB_PREFIX}/plan.json", {"run_index": 1, "input_prefix": "s3://bucket/in/", "n_workers": 2,
+                                                    "chunk_size": 100, "shards": [[f"in/{index}.csv"] for index in range(len(shard_rows))]})
+    for shard_index, (rows, worker_index, matrix) in enumerate(shard_rows):
+        s3_client.put_object(Bucket=BUCKET_NAME, Key=shard_key(JOB_PREFIX, shard_index, "csv"), Body="".join(rows).encode("utf-8"))
+        put_json(s3_client, shard_key(JOB_PREFIX, shard_index, "json"), {
+            "shard_index": shard_index, "worker_index": worker_index, "rows": len(rows), "seconds": 1.0,
+            "started_at": 100.0 + shard_index, "finished_at": 101.0 + shard_index, "classes": [0, 1],
+            "labels": [0, 1], "matrix": matrix,
+        })
+
+
+def test_merge_writes_shards_in_order_and_adds_matrices(s3_client):
+    write_job(s3_client, [
+        (["0,0.9,0.1\n", "1,0.2,0.8\n"], 0, [[1, 0], [0, 1]]),
+        (["1,0.3,0.7\n"], 1, [[0, 1], [0, 0]]),
+        (["0,0.6,0.4\n", "0,0.7,0.3\n"], 0, [[2, 0], [0, 0]]),
+    ])
+    distributed_scoring = DistributedScoringClass(run_index=1, s3_manager=S3ManagerClass(s3_client=s3_client))
+    summary = distributed_scoring.merge(JOB_PREFIX)
+
+    predictions = s3_client.get_object(Bucket=BUCKET_NAME, Key=f"{JOB_PREFIX}/predictions.csv")['Body'].read().decode("utf-8")
+    assert predictions.splitlines() == ["prediction,proba_0,proba_1", "0,0.9,0.1", "1,0.2,0.8", "1,0.3,0.7", "0,0.6,0.4", "0,0.7,0.3"]
+    assert summary["rows"] == 5
+    assert summary["metrics"]["confusion_matrix"] == [[3, 1], [0, 1]]
+    assert summary["workers"]["0"]["shards"] == 2 and summary["workers"]["0"]["rows"] == 4
+    # aggregate - first shard start to last shard end
+    assert summary["seconds"] == pytest.approx(3.0)
+
+
+def test_merge_fails_when_a_shard_is_missing(s3_client):
+    write_job(s3_client, [(["0,0.9,0.1\n"], 0, [[1, 0], [0, 0]]), (["1,0.1,0.9\n"], 1, [[0, 0], [0, 1]])])
+    s3_client.delete_object(Bucket=BUCKET_NAME, Key=shard_key(JOB_PREFIX, 1, "json"))
+    distributed_scoring = DistributedScoringClass(run_index=1, s3_manager=S3ManagerClass(s3_client=s3_client))
+
+    with pytest.raises(RuntimeError, match=r"\[1\]"):
+        distributed_scoring.merge(JOB_PREFIX)
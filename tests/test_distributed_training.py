@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+
+from model.distributed_training import split_estimators, derive_worker_seed, merge_partial_models
+from model.model_class import ModelClass
+from model.training_constants import N_ESTIMATORS, RANDOM_STATE
+
+N_WORKERS = 3
+
+
+def make_data(n_rows=300, n_features=5):
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(n_rows, n_features))
+    y = (X[:, 0] + X[:, 1] > 0).astype(int)
+    return X, y
+
+
+def train_partials(X, y, n_estimators=10, n_workers=N_WORKERS):
+    # same slices and seeds the workers use in DistributedTrainingClass.train_worker
+    partial_models = []
+    for worker_index, worker_estimators in enumerate(split_estimators(n_estimators, n_workers)):
+        model_instance = ModelClass(n_estimators=worker_estimators, random_state=derive_worker_seed(RANDOM_STATE, worker_index, n_workers))
+        model_instance.train_model(X, y)
+        partial_models.append(model_instance.model)
+    return partial_models
+
+
+@pytest.mark.parametrize("n_workers", [1, 2, 3, 7, N_ESTIMATORS])
+def test_split_sums_to_n_estimators(n_workers):
+    split = split_estimators(N_ESTIMATORS, n_workers)
+
+    assert sum(split) == N_ESTIMATORS
+    assert len(split) == n_workers
+    assert max(split) - min(split) <= 1
+
+
+def test_split_rejects_more_workers_than_trees():
+    with pytest.raises(ValueError):
+        split_estimators(4, 5)
+
+
+def test_every_worker_gets_its_own_reproducible_seed():
+    seeds = [derive_worker_seed(RANDOM_STATE, worker_index, 8) for worker_index in range(8)]
+
+    assert len(set(seeds)) == 8
+    assert seeds == [derive_worker_seed(RANDOM_STATE, worker_index, 8) for worker_index in range(8)]
+
+
+def test_merged_model_has_every_tree():
+    X, y = make_data()
+    partial_models = train_partials(X, y)
+    merged_model = merge_partial_models(partial_models)
+
+    assert merged_model.n_estimators == 10
+    assert len(merged_model.estimators_) == 10
+    # merging copies the first partial model, the partials themselves are left as they were
+    assert [len(partial_model.estimators_) for partial_model in partial_models] == [4, 3, 3]
+
+
+def test_merged_model_predicts_like_the_partials_combined():
+    X, y = make_data()
+    partial_models = train_partials(X, y)
+    merged_model = merge_partial_models(partial_models)
+
+    # forest probability is the mean over trees - partials weighted by their number of trees
+    combined_proba = sum(partial_model.predict_proba(X) * len(partial_model.estimators_) for partial_model in partial_models) / 10
+    np.testing.assert_allclose(merged_model.predict_proba(X), combined_proba)
+    np.testing.assert_array_equal(merged_model.predict(X), merged_model.classes_[combined_proba.argmax(axis=1)])
+
+
+def test_partials_of_different_features_are_not_merged():
+    X, y = make_data()
+    partial_models = train_partials(X, y, n_estimators=2, n_workers=1)
+    other_model = ModelClass(n_estimators=2).model.fit(X[:, :3], y)
+
+    with pytest.raises(ValueError):
+        merge_partial_models(partial_models + [other_model])
@@ -0,0 +1,122 @@
+import pytest
+from botocore.exceptions import ClientError
+
+from ec2_s3_managment.ec2_class import Ec2ManagerClass
+from ec2_s3_managment.fleet_waiter import FleetWaiterClass, SPOT_INTERRUPTION_REASON
+from ec2_s3_managment.resource_cache import ResourceCacheClass
+
+LAUNCH_RESOURCES = {"key_name": "key", "security_group_id": "sg-1", "instance_profile_arn": "arn:aws:iam::1:instance-profile/role"}
+CAPACITY_PLAN = {"instance_type": "medium", "fallback_types": [], "spot": True, "volume_gib": 20, "n_jobs": 4}
+
+
+class StubEc2ClientClass:
+    """
+    run_instances hands out i-0, i-1, ..., every instance is terminated on the first describe,
+    instances in interrupted end with a spot interruption StateReason, launches with a security group,
+    key pair or instance profile ARN in deleted fail like they do in AWS
+    """
+    def __init__(self, interrupted=(), deleted=()):
+        self.interrupted = set(interrupted)
+        self.deleted = set(deleted)
+        self.attempts = []
+        self.launches = []
+
+    def run_instances(self, **run_arguments):
+        self.attempts.append(run_arguments)
+        if run_arguments["SecurityGroupIds"][0] in self.deleted:
+            raise ClientError({"Error": {"Code": "InvalidGroup.NotFound", "Message": "The security group does not exist"}}, "RunInstances")
+        if run_arguments["KeyName"] in self.deleted:
+            raise ClientError({"Error": {"Code": "InvalidKeyPair.NotFound", "Message": "The key pair does not exist"}}, "RunInstances")
+        if run_arguments["IamInstanceProfile"]["Arn"] in self.deleted:
+            raise ClientError({"Error": {"Code": "InvalidParameterValue", "Message": "Invalid IAM Instance Profile ARN"}}, "RunInstances")
+        instance_id = f"i-{len(self.launches)}"
+        self.launches.append(run_arguments)
+        lifecycle = {"InstanceLifecycle": "spot"} if "InstanceMarketOptions" in run_arguments else {}
+        return {"Instances": [{"InstanceId": instance_id, "InstanceType": run_arguments["InstanceType"], **lifecycle}]}
+
+    def describe_instances(self, Filters, NextToken=None):
+        instances = []
+        for instance_id in Filters[0]["Values"]:
+            reason = SPOT_INTERRUPTION_REASON if instance_id in self.interrupted else "Client.InstanceInitiatedShutdown"
+            instances.append({"InstanceId": instance_id, "State": {"Name": "terminated"}, "StateReason": {"Code": reason}})
+        return {"Reservations": [{"Instances": instances}]}
+
+
+class StubIamClientClass:
+    def get_instance_profile(self, InstanceProfileName):
+        raise ClientError({"Error": {"Code": "NoSuchEntity", "Message": "Instance profile not found"}}, "GetInstanceProfile")
+
+
+def make_manager(ec2_client, monkeypatch, resource_cache=None):
+    ec2_manager = Ec2ManagerClass(resource_cache=resource_cache, ec2_client=ec2_client, iam_client=StubIamClientClass())
+    monkeypatch.setattr(ec2_manager, "prepare_launch_resources", lambda: LAUNCH_RESOURCES)
+    ec2_manager._fleet_waiter = FleetWaiterClass(ec2_client, min_interval=0.01, latency_log_path=None)
+    return ec2_manager
+
+
+def test_spot_interrupted_worker_is_relaunched_on_demand(monkeypatch):
+    ec2_client = StubEc2ClientClass(interrupted={"i-0"})
+    ec2_manager = make_manager(ec2_client, monkeypatch)
+
+    instance_ids = ec2_manager.start_training_workers(2, run_index=5, capacity_plan=CAPACITY_PLAN)
+    finished_ids = ec2_manager.wait_for_termination(instance_ids)
+
+    assert instance_ids == ["i-0", "i-1"]
+    assert finished_ids == ["i-2", "i-1"]
+    assert len(ec2_client.launches) == 3
+    relaunch = ec2_client.launches[2]
+    assert "InstanceMarketOptions" not in relaunch
+    assert relaunch["InstanceType"] == "medium"
+    # same worker, same slice of the forest
+    assert relaunch["UserData"] == ec2_client.launches[0]["UserData"]
+
+
+def test_finished_spot_instances_are_not_relaunched(monkeypatch):
+    ec2_client = StubEc2ClientClass()
+    ec2_manager = make_manager(ec2_client, monkeypatch)
+
+    instance_ids = ec2_manager.start_training_workers(2, run_index=5, capacity_plan=CAPACITY_PLAN)
+
+    assert ec2_manager.wait_for_termination(instance_ids) == instance_ids
+    assert len(ec2_client.launches) == 2
+    assert all("InstanceMarketOptions" in launch for launch in ec2_client.launches)
+
+
+def cached_launch_resources(resource_cache, fresh_resources):
+    # prepare_launch_resources stand-in - cached values first, fresh_resources once an entry is invalidated
+    return lambda: {name: resource_cache.resolve(cache_name, lambda: fresh_resources[name]) for name, cache_name in
+                    (("key_name", "key_pair"), ("security_group_id", "security_group_id"), ("instance_profile_arn", "instance_profile_arn"))}
+
+
+@pytest.mark.parametrize("deleted_resource, cache_name", [
+    ("security_group_id", "security_group_id"),
+    ("key_name", "key_pair"),
+    ("instance_profile_arn", "instance_profile_arn"),
+])
+def test_launch_on_deleted_cached_resource_resolves_it_again(deleted_resource, cache_name, monkeypatch, tmp_path):
+    resource_cache = ResourceCacheClass(scope="test", cache_path=str(tmp_path / "resources.json"))
+    for name, value in (("key_pair", "key"), ("security_group_id", "sg-1"), ("instance_profile_arn", LAUNCH_RESOURCES["instance_profile_arn"])):
+        resource_cache.set(name, value)
+    ec2_client = StubEc2ClientClass(deleted={LAUNCH_RESOURCES[deleted_resource]})
+    ec2_manager = make_manager(ec2_client, monkeypatch, resource_cache)
+    fresh_resources = {**LAUNCH_RESOURCES, deleted_resource: "recreated"}
+    monkeypatch.setattr(ec2_manager, "prepare_launch_resources", cached_launch_resources(resource_cache, fresh_resources))
+
+    assert ec2_manager.start_training_workers(1, run_index=5, capacity_plan=CAPACITY_PLAN) == ["i-0"]
+    assert len(ec2_client.attempts) == 2
+    assert resource_cache.get(cache_name) == "recreated"
+    # only the deleted resource was resolved again
+    assert ec2_manager._launches["i-0"]["launch_resources"] == fresh_resources
+
+
+def test_launch_is_retried_only_once(monkeypatch, tmp_path):
+    resource_cache = ResourceCacheClass(scope="test", cache_path=str(tmp_path / "resources.json"))
+    resource_cache.set("security_group_id", "sg-1")
+    # recreated group is gone too
+    ec2_client = StubEc2ClientClass(deleted={"sg-1", "recreated"})
+    ec2_manager = make_manager(ec2_client, monkeypatch, resource_cache)
+    monkeypatch.setattr(ec2_manager, "prepare_launch_resources", cached_launch_resources(resource_cache, {**LAUNCH_RESOURCES, "security_group_id": "recreated"}))
+
+    with pytest.raises(ClientError):
+        ec2_manager.start_training_workers(1, run_index=5, capacity_plan=CAPACITY_PLAN)
+    assert len(ec2_client.attempts) == 2
@@ -0,0 +1,89 @@
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from ec2_s3_managment.job_queue import JobQueueClass, PoolWorkerClass
+from conftest import BUCKET_NAME
+
+
+def test_only_one_worker_claims_a_job(s3_client):
+    job_queue = JobQueueClass(s3_client, BUCKET_NAME)
+    job_id = job_queue.submit({"training_mode": "single"})
+
+    with ThreadPoolExecutor(max_workers=10) as executor:
+        claimed = list(executor.map(lambda worker: job_queue.claim(job_id, f"worker_{worker}"), range(10)))
+
+    assert claimed.count(True) == 1
+    assert job_queue.unclaimed_jobs() == []
+
+
+def test_concurrent_workers_claim_every_job_once(s3_client):
+    job_queue = JobQueueClass(s3_client, BUCKET_NAME)
+    job_ids = [job_queue.submit({"training_mode": "single"}) for _ in range(6)]
+
+    def claim_all(worker):
+        specs = []
+        while True:
+            spec = job_queue.claim_next(f"worker_{worker}")
+            if spec is None:
+                return specs
+            specs.append(spec["job_id"])
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        claimed = [job_id for specs in executor.map(claim_all, range(4)) for job_id in specs]
+
+    assert sorted(claimed) == sorted(job_ids)
+
+
+def test_stale_claim_is_taken_over_once(s3_client):
+    job_queue = JobQueueClass(s3_client, BUCKET_NAME, lease_seconds=60)
+    job_id = job_queue.submit({"training_mode": "single"})
+    assert job_queue.claim(job_id, "dead_worker")
+    assert not job_queue.claim(job_id, "other_worker")
+
+    # dead worker's last heartbeat is older than the lease
+    claim_key = job_queue._key("claims", job_id)
+    claim = json.loads(s3_client.get_object(Bucket=BUCKET_NAME, Key=claim_key)['Body'].read())
+    claim["heartbeat_at"] -= 120
+    s3_client.put_object(Bucket=BUCKET_NAME, Key=claim_key, Body=json.dumps(claim).encode('utf-8'))
+    assert job_queue.unclaimed_jobs() == [job_id]
+
+    with ThreadPoolExecutor(max_workers=5) as executor:
+        taken_over = list(executor.map(lambda worker: job_queue.claim(job_id, f"worker_{worker}"), range(5)))
+    assert taken_over.count(True) == 1
+    assert not job_queue.heartbeat(job_id, "dead_worker")
+
+
+def test_heartbeat_keeps_the_claim_live(s3_client):
+    job_queue = JobQueueClass(s3_client, BUCKET_NAME, lease_seconds=0.5)
+    job_id = job_queue.submit({})
+    job_queue.claim(job_id, "worker")
+    time.sleep(0.3)
+    assert job_queue.heartbeat(job_id, "worker")
+    time.sleep(0.3)
+
+    assert job_queue.unclaimed_jobs() == []
+
+
+def test_complete_removes_spec_and_claim(s3_client):
+    job_queue = JobQueueClass(s3_client, BUCKET_NAME)
+    job_id = job_queue.submit({"training_mode": "single"})
+    worker = PoolWorkerClass(job_queue, lambda spec: {"run_index": 3}, "worker", idle_timeout=0, poll_interval=0.01)
+
+    assert worker.run() == 1
+    assert job_queue.get_result(job_id)["run_index"] == 3
+    assert job_queue.pending_jobs() == []
+    assert job_queue._list_job_ids("claims") == []
+
+
+def test_failed_job_is_completed_as_failed(s3_client):
+    job_queue = JobQueueClass(s3_client, BUCKET_NAME)
+    job_id = job_queue.submit({})
+
+    def run_job(spec):
+        raise ValueError("broken dataset")
+
+    PoolWorkerClass(job_queue, run_job, "worker", idle_timeout=0, poll_interval=0.01).run()
+    result = job_queue.get_result(job_id)
+    assert result["status"] == "failed"
+    assert "broken dataset" in result["error"]
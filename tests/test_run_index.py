@@ -0,0 +1,65 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from ec2_s3_managment.run_index import RunIndexAllocatorClass
+from ec2_s3_managment.ec2_s3_constants import RUN_MANIFEST_KEY
+from conftest import BUCKET_NAME
+
+
+def make_allocator(s3_client, tmp_path, name="worker"):
+    # every allocator has its own local cache, like separate machines
+    return RunIndexAllocatorClass(s3_client, BUCKET_NAME, cache_path=str(tmp_path / f"{name}_cache.json"))
+
+
+def read_manifest(s3_client):
+    return json.loads(s3_client.get_object(Bucket=BUCKET_NAME, Key=RUN_MANIFEST_KEY)['Body'].read())
+
+
+def test_manifest_is_seeded_from_existing_output_folders(s3_client, tmp_path):
+    for run_index in (1, 2, 7):
+        s3_client.put_object(Bucket=BUCKET_NAME, Key=f"Output_{run_index}/model.joblib", Body=b"model")
+    allocator = make_allocator(s3_client, tmp_path)
+
+    assert allocator.allocate() == 8
+    assert read_manifest(s3_client) == {"latest_index": 8, "latest_completed_index": 7}
+
+
+def test_concurrent_allocations_get_distinct_indexes(s3_client, tmp_path):
+    allocators = [make_allocator(s3_client, tmp_path, f"worker_{worker}") for worker in range(8)]
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        indexes = list(executor.map(lambda allocator: [allocator.allocate() for _ in range(3)], allocators))
+
+    all_indexes = [run_index for worker_indexes in indexes for run_index in worker_indexes]
+    assert sorted(all_indexes) == list(range(1, 25))
+    assert read_manifest(s3_client)["latest_index"] == 24
+
+
+def test_stale_cache_is_retried_after_conflict(s3_client, tmp_path):
+    first, second = make_allocator(s3_client, tmp_path, "first"), make_allocator(s3_client, tmp_path, "second")
+    assert first.allocate() == 1
+    assert second.allocate() == 2
+    # first's cached etag is stale now - its conditional put loses, manifest is re-read and the next index taken
+    assert first.allocate() == 3
+
+
+def test_mark_completed_only_moves_forward(s3_client, tmp_path):
+    allocator = make_allocator(s3_client, tmp_path)
+    first_index, second_index = allocator.allocate(), allocator.allocate()
+    allocator.mark_completed(second_index)
+    allocator.mark_completed(first_index)
+
+    assert allocator.get_latest_completed_index() == second_index
+
+
+def test_gives_up_after_max_retries(s3_client, tmp_path, monkeypatch):
+    allocator = make_allocator(s3_client, tmp_path)
+    allocator.allocate()
+    # every conditional put loses the race
+    monkeypatch.setattr(allocator, "_conditional_put", lambda manifest, etag: None)
+    monkeypatch.setattr("ec2_s3_managment.run_index.RUN_INDEX_MAX_RETRIES", 3)
+    monkeypatch.setattr("ec2_s3_managment.run_index.time.sleep", lambda seconds: None)
+
+    with pytest.raises(RuntimeError):
+        allocator.allocate()
@@ -0,0 +1,50 @@
+import os
+
+from ec2_s3_managment.s3_download import S3DownloadEngineClass
+from conftest import BUCKET_NAME
+
+
+def put_objects(s3_client, prefix, n_objects):
+    contents = {}
+    for index in range(n_objects):
+        key = f"{prefix}/folder_{index % 3}/file_{index:03d}.bin"
+        contents[key] = os.urandom(100 + index)
+        s3_client.put_object(Bucket=BUCKET_NAME, Key=key, Body=contents[key])
+    return contents
+
+
+def test_listing_pages_past_max_keys(s3_client, monkeypatch):
+    contents = put_objects(s3_client, "Output_3", 25)
+    # decoy folder with the same name start - must not be listed
+    s3_client.put_object(Bucket=BUCKET_NAME, Key="Output_31/model.joblib", Body=b"other run")
+    monkeypatch.setattr("ec2_s3_managment.s3_download.LIST_PAGE_SIZE", 4)
+    list_calls = []
+    list_objects_v2 = s3_client.list_objects_v2
+    monkeypatch.setattr(s3_client, "list_objects_v2", lambda **kwargs: list_calls.append(kwargs) or list_objects_v2(**kwargs))
+
+    objects = list(S3DownloadEngineClass(s3_client, BUCKET_NAME).list_objects("Output_3/"))
+
+    assert sorted(obj['Key'] for obj in objects) == sorted(contents)
+    assert len(list_calls) == 7 # 25 keys, 4 per page
+    assert all(kwargs['MaxKeys'] == 4 for kwargs in list_calls)
+
+
+def test_parallel_download_keeps_folder_structure_and_content(s3_client, tmp_path, monkeypatch):
+    contents = put_objects(s3_client, "Output_3", 30)
+    monkeypatch.setattr("ec2_s3_managment.s3_download.LIST_PAGE_SIZE", 7)
+    local_root = tmp_path / "local"
+
+    stats = S3DownloadEngineClass(s3_client, BUCKET_NAME, max_workers=8).download_prefix("Output_3/", str(local_root))
+
+    for key, data in contents.items():
+        assert (local_root / key).read_bytes() == data
+    assert stats["files"] == 30
+    assert stats["bytes"] == sum(len(data) for data in contents.values())
+    assert stats["seconds"] > 0
+    assert stats["bytes_per_sec"] == stats["bytes"] / stats["seconds"]
+
+
+def test_empty_prefix_downloads_nothing(s3_client, tmp_path):
+    stats = S3DownloadEngineClass(s3_client, BUCKET_NAME).download_prefix("Output_9/", str(tmp_path / "local"))
+
+    assert stats["files"] == 0 and stats["bytes"] == 0 and stats["bytes_per_sec"] == 0.0
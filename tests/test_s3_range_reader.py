@@ -0,0 +1,55 @@
+import io
+import os
+
+import pytest
+from botocore.exceptions import ClientError
+
+from ec2_s3_managment.s3_range_reader import S3RangeReaderClass, parse_s3_uri
+from conftest import BUCKET_NAME
+
+KEY = "data/train.bin"
+
+
+def put_random_object(s3_client, size):
+    data = os.urandom(size)
+    s3_client.put_object(Bucket=BUCKET_NAME, Key=KEY, Body=data)
+    return data
+
+
+def test_read_across_blocks_matches_the_object(s3_client):
+    data = put_random_object(s3_client, 10_500)
+
+    with S3RangeReaderClass(s3_client, BUCKET_NAME, KEY, block_size=1000, max_workers=4, prefetch_blocks=3) as raw_reader:
+        assert raw_reader.n_blocks == 11
+        read_data = io.BufferedReader(raw_reader, buffer_size=700).read()
+        bytes_fetched = raw_reader.bytes_fetched
+
+    assert read_data == data
+    # every block is fetched exactly once
+    assert bytes_fetched == len(data)
+
+
+def test_seek_reads_from_the_middle_of_a_block(s3_client):
+    data = put_random_object(s3_client, 5000)
+
+    with S3RangeReaderClass(s3_client, BUCKET_NAME, KEY, block_size=1000, max_workers=2) as raw_reader:
+        raw_reader.seek(2500)
+        assert raw_reader.read(1200) == data[2500:3000] # read stops at the block end
+        raw_reader.seek(-100, io.SEEK_END)
+        assert raw_reader.read() == data[-100:]
+
+
+def test_overwritten_object_fails_the_read(s3_client):
+    put_random_object(s3_client, 3000)
+
+    with S3RangeReaderClass(s3_client, BUCKET_NAME, KEY, block_size=1000, max_workers=1, prefetch_blocks=1) as raw_reader:
+        raw_reader.read(1000)
+        put_random_object(s3_client, 3000)
+        with pytest.raises(ClientError):
+            raw_reader.read(1000)
+
+
+def test_parse_s3_uri():
+    assert parse_s3_uri("s3://bucket/folder/file.csv") == ("bucket", "folder/file.csv")
+    with pytest.raises(ValueError):
+        parse_s3_uri("s3://bucket")
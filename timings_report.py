@@ -0,0 +1,104 @@
+"""
+Timing report - compares "timings" sections of metrics.json (see TracerClass) across Output_N runs
+
+Only metrics.json of every run is read from S3, nothing else is downloaded.
+
+Run from the project root:
+    python timings_report.py                                # last 5 completed runs
+    python timings_report.py 3 7 8                          # these runs
+    python timings_report.py --last 10 --metric cpu_seconds # wall_seconds, cpu_seconds, peak_rss_mb or bytes
+"""
+import json
+import argparse
+
+from botocore.exceptions import ClientError
+
+from ec2_s3_managment.s3_class import S3ManagerClass
+from ec2_s3_managment.ec2_s3_constants import METRICS_FILENAME
+
+METRICS = ("wall_seconds", "cpu_seconds", "peak_rss_mb", "bytes")
+
+
+def fetch_timings(s3_manager, run_index):
+    """
+    Returns:
+        dict: "timings" section of metrics.json of the run, None if the run has no metrics or no timings
+    """
+    key = S3ManagerClass.run_root(run_index) + f"/{METRICS_FILENAME}.json"
+    try:
+        response = s3_manager.s3_client.get_object(Bucket=s3_manager.bucket_name, Key=key)
+    except ClientError as e:
+        if e.response['Error']['Code'] in ('NoSuchKey', '404'):
+            return None
+        raise
+    return json.loads(response['Body'].read()).get("timings")
+
+
+def format_value(metric, value):
+    if value is None:
+        return "-"
+    if metric == "bytes":
+        return f"{value / 1e6:.2f}MB"
+    if metric == "peak_rss_mb":
+        return f"{value:.0f}MB"
+    return f"{value:.2f}s"
+
+
+def build_report(timings_by_run, metric):
+    """
+    Returns:
+        list: table rows - (span name, list of values, one per run - None if the run doesn't have the span)
+    """
+    span_names = []
+    for timings in timings_by_run.values():
+        span_names += [name for name in timings["spans"] if name not in span_names]
+
+    rows = []
+    for name in span_names:
+        values = [timings["spans"].get(name, {}).get(metric) for timings in timings_by_run.values()]
+        rows.append((name, values))
+    if metric in ("wall_seconds", "cpu_seconds"):
+        total_key = "total_" + metric
+        values = [timings.get(total_key) for timings in timings_by_run.values()]
+        rows.append(("total", values))
+    return rows
+
+
+def print_report(timings_by_run, metric):
+    header = f"{'span':<20}" + "".join(f"{'Output_' + str(run_index):>13}" for run_index in timings_by_run) + f"{'change':>9}"
+    print(f"\n{metric} per span\n")
+    print(header)
+    print("-" * len(header))
+    for name, values in build_report(timings_by_run, metric):
+        # change of the last run against the first one
+        first, last = values[0], values[-1]
+        change = f"{(last / first - 1) * 100:+.0f}%" if first and last is not None else "-"
+        print(f"{name:<20}" + "".join(f"{format_value(metric, value):>13}" for value in values) + f"{change:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("runs", type=int, nargs="*", help="Output_N indexes to compare, default last --last completed runs")
+    parser.add_argument("--last", type=int, default=5)
+    parser.add_argument("--metric", choices=METRICS, default="wall_seconds")
+    args = parser.parse_args()
+
+    s3_manager = S3ManagerClass()
+    run_indexes = args.runs or list(range(max(1, s3_manager.download_index - args.last + 1), s3_manager.download_index + 1))
+
+    timings_by_run = {}
+    for run_index in run_indexes:
+        timings = fetch_timings(s3_manager, run_index)
+        if timings is None:
+            print(f"Output_{run_index}: no timings in metrics.json, skipped")
+            continue
+        timings_by_run[run_index] = timings
+
+    if not timings_by_run:
+        print("nothing to compare")
+        return
+    print_report(timings_by_run, args.metric)
+
+
+if __name__ == "__main__":
+    main()